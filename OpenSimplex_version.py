@@ -4,13 +4,20 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
-from kivy.core.window import Window
 from kivy.graphics import Rectangle
 from kivy.graphics.texture import Texture
 from kivy.clock import Clock
 import math
+import os
+import sys
 import numpy as np
-import opensimplex  # Biblioteca alterada
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'True_version'))
+from colorize import Palette, render_pixels
+from heightmap import fbm_opensimplex
+from octavecache import OctaveCache
+from parallel import ParallelGenerator
+from background import BackgroundWorker
 
 class TerrainType:
     def __init__(self, minHeight, maxHeight, minColor, maxColor, lerpAdjustment=0):
@@ -21,15 +28,23 @@ class TerrainType:
         self.lerpAdjustment = lerpAdjustment
 
 class MyWidget(Widget):
-    def __init__(self, **kwargs):
+    def __init__(self, workers=None, **kwargs):
         super().__init__(**kwargs)
         self.scale = 0.007
         self.octaves = 7
         self.persistence = 0.5
         self.lacunarity = 2
 
-        # Inicializa o gerador de noise com uma seed
-        self.noise_gen = opensimplex.OpenSimplex(seed=42)
+        # Seed do gerador de noise
+        self.seed = 42
+        # Pool que divide a geração em faixas de linhas
+        self.generator = ParallelGenerator(workers=workers)
+        # Camadas de cada octave: mudar persistence ou octaves reaproveita as já calculadas
+        self.octave_cache = OctaveCache(max_bytes=256 * 1024 * 1024)
+        # A geração roda em segundo plano, mostrando antes prévias em que cada
+        # pixel cobre 8x8 e depois 2x2 pixels da janela
+        self.preview_steps = (8, 2)
+        self.worker = BackgroundWorker(schedule=lambda callback: Clock.schedule_once(lambda dt: callback()))
 
         self.waterTerrain = TerrainType(-1.0, -0.15, (0, 0, 0), (40, 255, 255)) 
         self.sandTerrain = TerrainType(-0.15, -0.1, (215, 192, 100), (255, 246, 120))
@@ -39,42 +54,122 @@ class MyWidget(Widget):
         self.snowTerrain = TerrainType(0.45, 1.0, (245, 245, 245), (255, 255, 255))
         
         self.height_map = []
+        # Mapa completo (resolução cheia) já calculado e os parâmetros dele; pode
+        # ser maior que a janela depois de ela diminuir
+        self.map_params = None
         self.generate_noise_texture()
         
+    def get_params(self):
+        return (self.scale, self.octaves, self.persistence, self.lacunarity, self.seed)
+
     def generate_noise_texture(self):
-        pixels = []
-        self.texture = Texture.create(size=(int(Window.width), int(Window.height)), colorfmt='rgb')
-        self.height_map = []
-        
-        for y in range(int(Window.height)):
-            row = []
-            for x in range(int(Window.width)):
-                # Cálculo do noise com múltiplas octaves
-                noise_value = 0
-                max_amplitude = 0
-                amplitude = 1.0
-                frequency = 1.0
-                
-                for _ in range(self.octaves):
-                    nx = x * self.scale * frequency
-                    ny = y * self.scale * frequency
-                    noise_value += self.noise_gen.noise2(nx, ny) * amplitude
-                    max_amplitude += amplitude
-                    amplitude *= self.persistence
-                    frequency *= self.lacunarity
-                
-                # Normaliza o valor entre -1 e 1
-                noise_value /= max_amplitude
-                
-                terrain_color = self.get_terrain_color(noise_value)
-                pixels.extend([int(c) for c in terrain_color])
-                row.append(noise_value)
-            self.height_map.append(row)
-        
-        self.texture.blit_buffer(bytes(pixels), colorfmt='rgb', bufferfmt='ubyte')
+        """Gera em segundo plano; uma nova chamada substitui a geração em andamento"""
+        size = (int(Window.width), int(Window.height))
+        self.worker.submit(self.render_levels, self.get_params(), size, Palette(self.terrain_types()))
+
+    def resize_noise_texture(self):
+        """Ajusta o mapa ao tamanho da janela reaproveitando o que já foi calculado.
+
+        O ruído só depende da posição absoluta do pixel: ao diminuir a janela o
+        mapa é só recortado, e ao aumentar só as faixas novas são geradas.
+        """
+        params = self.get_params()
+        if self.map_params != params:
+            self.generate_noise_texture()
+            return
+        width, height = int(Window.width), int(Window.height)
+        map_height, map_width = self.height_map.shape
+        if width <= map_width and height <= map_height:
+            # Substitui uma geração de faixas que ainda estivesse em andamento
+            self.worker.cancel()
+            self.show_window()
+        else:
+            self.worker.submit(self.extend_map, params, (width, height), Palette(self.terrain_types()),
+                               self.height_map, self.pixels)
+
+    def extend_map(self, job, params, size, palette, height_map, pixels):
+        """Tarefa de segundo plano: gera só as faixas à direita e acima do mapa atual"""
+        scale, octaves, persistence, lacunarity, seed = params
+        old_height, old_width = height_map.shape
+        width = max(size[0], old_width)
+        height = max(size[1], old_height)
+        new_map = np.empty((height, width), dtype=height_map.dtype)
+        new_pixels = np.empty((height, width, 3), dtype=np.uint8)
+        new_map[:old_height, :old_width] = height_map
+        new_pixels[:old_height, :old_width] = pixels
+        # Faixa da direita (todas as linhas) e faixa de cima (só as colunas antigas)
+        strips = [(old_width, 0, width - old_width, height), (0, old_height, old_width, height - old_height)]
+        for x0, y0, strip_width, strip_height in strips:
+            if strip_width == 0 or strip_height == 0:
+                continue
+            job.check()
+            strip, strip_pixels = self.generator.render(
+                fbm_opensimplex,
+                strip_width,
+                strip_height,
+                scale,
+                octaves,
+                persistence,
+                lacunarity,
+                seed=seed,
+                x0=x0,
+                y0=y0,
+                palette=palette
+            )
+            new_map[y0:y0 + strip_height, x0:x0 + strip_width] = strip
+            new_pixels[y0:y0 + strip_height, x0:x0 + strip_width] = strip_pixels
+        job.deliver(self.store_map, params, new_map, new_pixels)
+
+    def render_levels(self, job, params, size, palette):
+        """Tarefa de segundo plano: prévias grosseiras refinadas até a resolução cheia"""
+        scale, octaves, persistence, lacunarity, seed = params
+        width, height = size
+        for step in self.preview_steps + (1,):
+            job.check()
+            # Cada pixel da prévia cobre step x step pixels da janela
+            height_map = self.octave_cache.fbm(
+                'opensimplex',
+                -(-width // step),
+                -(-height // step),
+                scale * step,
+                octaves,
+                persistence,
+                lacunarity,
+                seed,
+                generator=self.generator
+            )
+            pixels = render_pixels(height_map, palette)
+            if step == 1:
+                job.deliver(self.store_map, params, height_map, pixels)
+            else:
+                job.deliver(self.show_pixels, height_map, pixels, step)
+
+    def store_map(self, params, height_map, pixels):
+        """Guarda o mapa de resolução cheia e mostra a parte que cabe na janela"""
+        self.map_params = params
+        self.height_map = height_map
+        self.pixels = pixels
+        self.show_window()
+
+    def show_window(self):
+        width, height = int(Window.width), int(Window.height)
+        self.show_pixels(self.height_map[:height, :width], self.pixels[:height, :width], 1)
+
+    def show_pixels(self, height_map, pixels, step):
+        height, width = height_map.shape
+        self.texture = Texture.create(size=(width, height), colorfmt='rgb')
+        self.texture.blit_buffer(np.ascontiguousarray(pixels).ravel(), colorfmt='rgb', bufferfmt='ubyte')
         self.canvas.clear()
         with self.canvas:
-            Rectangle(texture=self.texture, pos=(0, 0), size=(Window.width, Window.height))
+            Rectangle(texture=self.texture, pos=(0, 0), size=(width * step, height * step))
+
+    def shutdown(self):
+        self.worker.shutdown()
+        self.generator.shutdown()
+
+    def terrain_types(self):
+        return [self.waterTerrain, self.sandTerrain, self.grassTerrain,
+                self.forestTerrain, self.mountainTerrain, self.snowTerrain]
 
     def get_terrain_color(self, noise_value):
         if noise_value < self.waterTerrain.maxHeight:
@@ -124,6 +219,7 @@ class MyApp(App):
         self.control_panel.add_widget(regenerate_button)
 
         root.add_widget(self.control_panel)
+        self.resize_trigger = Clock.create_trigger(lambda dt: self.terrain_widget.resize_noise_texture(), 0.15)
         Window.bind(on_resize=self.on_window_resize)
         return root
 
@@ -195,9 +291,17 @@ class MyApp(App):
         label.text = f"Octaves: {new_value}"
         self.terrain_widget.generate_noise_texture()
 
-    def on_window_resize(self, instance, width, height):
+    def on_stop(self):
+        self.terrain_widget.shutdown()
 
-        self.terrain_widget.generate_noise_texture()
+    def on_window_resize(self, instance, width, height):
+        # Arrastar a borda gera dezenas de eventos; cada um adia o anterior,
+        # então só o último é tratado, 0.15 s depois de parar
+        self.resize_trigger.cancel()
+        self.resize_trigger()
 
 if __name__ == '__main__':
+    # Os workers dos pools importam este arquivo como __mp_main__; só aqui é
+    # importado kivy.core.window, que abre a janela
+    from kivy.core.window import Window
     MyApp().run()
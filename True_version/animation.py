@@ -0,0 +1,134 @@
+"""Terreno que evolui com o tempo, como fatias (x, y, t) de um ruído 3D.
+
+O ``Clock`` chama ``update_frame`` a cada quadro. Os buffers (alturas,
+pixels e os temporários do ruído e da iluminação), a textura e o retângulo
+do canvas são criados uma vez e reaproveitados; só mudam quando a resolução
+muda, e a ``Palette`` só quando as faixas do terreno mudam. Para manter ``target_fps``
+a resolução é ajustada: cada pixel da textura cobre ``step`` x ``step``
+pixels da tela, aumentando quando o quadro demora e diminuindo quando sobra
+tempo.
+"""
+import math
+import time
+
+import numpy as np
+from kivy.clock import Clock
+from kivy.graphics import Rectangle
+from kivy.graphics.texture import Texture
+from kivy.uix.widget import Widget
+
+from chunks import NORMAL_STRENGTH
+from colorize import Palette, RenderScratch, light_vector, render_pixels
+from gradnoise import fbm_noise, perlin_noise
+from heightmap import nyquist_octaves
+
+# Pixels da tela por pixel da textura que a adaptação pode escolher
+STEPS = (1, 2, 3, 4, 6, 8, 12, 16)
+
+
+class AnimatedTerrain(Widget):
+    """Anima a vista do ``source`` (um ``Terrain``), usando os parâmetros dele"""
+
+    def __init__(self, source, target_fps=30, speed=0.15, **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+        self.target_fps = target_fps
+        # Unidades de ruído por segundo no eixo do tempo
+        self.speed = speed
+        self.time = 0.0
+        self.step_index = STEPS.index(4)
+        # Média móvel do tempo de cálculo de um quadro
+        self.frame_seconds = None
+        self.height_map = None
+        self.pixels = None
+        # Cada octave antes da soma e os temporários de render_pixels
+        self.layer = None
+        self.scratch = None
+        self.texture = None
+        self.palette_key = None
+        self.palette = None
+        with self.canvas:
+            self.rect = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self.update_rect, size=self.update_rect)
+        self.event = None
+
+    def start(self):
+        if self.event is None:
+            self.event = Clock.schedule_interval(self.update_frame, 1.0 / self.target_fps)
+
+    def stop(self):
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+
+    def update_rect(self, *args):
+        self.rect.pos = self.pos
+        self.rect.size = self.size
+
+    def get_buffers(self, width, height):
+        """Buffers e textura da resolução atual, recriados só quando ela muda"""
+        if self.height_map is None or self.height_map.shape != (height, width):
+            self.height_map = np.empty((height, width), dtype=np.float32)
+            self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+            self.layer = np.empty((height, width), dtype=np.float32)
+            self.scratch = RenderScratch((height, width))
+            self.texture = Texture.create(size=(width, height), colorfmt='rgb')
+            self.texture.mag_filter = 'linear'
+            self.rect.texture = self.texture
+        return self.height_map, self.pixels
+
+    def get_palette(self):
+        """``Palette`` das faixas do terreno, recriada só quando elas mudam"""
+        key = self.source.get_palette_key()
+        if key != self.palette_key:
+            self.palette = Palette(self.source.terrain_types())
+            self.palette_key = key
+        return self.palette
+
+    def adapt_resolution(self, seconds):
+        """Ajusta ``step`` para o tempo de cálculo caber no quadro"""
+        if self.frame_seconds is None:
+            self.frame_seconds = seconds
+        else:
+            self.frame_seconds = 0.8 * self.frame_seconds + 0.2 * seconds
+        # Parte do quadro fica para o Kivy desenhar
+        budget = 0.7 / self.target_fps
+        if self.frame_seconds > budget and self.step_index < len(STEPS) - 1:
+            self.step_index += 1
+            self.frame_seconds = None
+        elif self.frame_seconds < budget * 0.4 and self.step_index > 0:
+            self.step_index -= 1
+            self.frame_seconds = None
+
+    def update_frame(self, dt):
+        start = time.perf_counter()
+        self.time += dt * self.speed
+        source = self.source
+        step = STEPS[self.step_index]
+        width = max(int(math.ceil(self.width / step)), 1)
+        height = max(int(math.ceil(self.height / step)), 1)
+        height_map, pixels = self.get_buffers(width, height)
+
+        with source.metrics.stage('animation', pixels=width * height,
+                                  nbytes=height_map.nbytes + pixels.nbytes):
+            # Mesma vista do terreno: pixels do mundo entre duas amostras
+            spacing = step / source.zoom
+            left = source.view_x - self.width / 2.0 / source.zoom
+            bottom = source.view_y - self.height / 2.0 / source.zoom
+            x = ((left + np.arange(width) * spacing) * source.scale)[np.newaxis, :]
+            y = ((bottom + np.arange(height) * spacing) * source.scale)[:, np.newaxis]
+            fbm_noise(perlin_noise, x, y, self.time, source.octaves, source.persistence,
+                      source.lacunarity,
+                      detail_octaves=nyquist_octaves(source.octaves, source.scale,
+                                                     source.lacunarity, spacing),
+                      out=height_map, layer=self.layer)
+            palette = self.get_palette()
+            light = (light_vector(source.light_angle), source.light_intensity,
+                     source.ambient_light, palette.max_heights[0])
+            render_pixels(height_map, palette, light, out=pixels,
+                          strength=NORMAL_STRENGTH / spacing, scratch=self.scratch)
+            # A textura existente recebe os pixels novos; o canvas não muda
+            self.texture.blit_buffer(pixels.ravel(), colorfmt='rgb', bufferfmt='ubyte')
+            self.canvas.ask_update()
+
+        self.adapt_resolution(time.perf_counter() - start)
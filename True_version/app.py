@@ -4,12 +4,23 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.core.window import Window
+from kivy.clock import Clock
 from terrain import Terrain
+from animation import AnimatedTerrain
+from biomes import DEFAULT_CONFIG, BiomeTable
+from erosion import Erosion
+import os
 
 class MyApp(App):
     def build(self):
         root = FloatLayout()
-        self.terrain_widget = Terrain(size_hint=(1, 1))
+        # Com TERRAIN_METRICS_LOG as medições também vão para esse arquivo;
+        # TERRAIN_CACHE_DIR troca a pasta do cache de heightmaps e
+        # TERRAIN_BIOMES o arquivo de biomas ("none" volta às faixas de altura)
+        biome_config = os.environ.get('TERRAIN_BIOMES', DEFAULT_CONFIG)
+        biomes = BiomeTable.load(biome_config) if biome_config != 'none' else None
+        self.terrain_widget = Terrain(size_hint=(1, 1), metrics_log=os.environ.get('TERRAIN_METRICS_LOG'),
+                                      cache_dir=os.environ.get('TERRAIN_CACHE_DIR'), biomes=biomes)
         root.add_widget(self.terrain_widget)
         self.control_panel = BoxLayout(orientation='vertical', size_hint=(None, None), size=(300, 200), spacing=5, padding=5)
         self.control_panel.pos_hint = {'y': 0.5, 'right': 1}
@@ -26,11 +37,32 @@ class MyApp(App):
         for name, value, dec, inc in controls:
             self.control_panel.add_widget(self.create_control_row(name, value, dec, inc))
         
-        regenerate_button = Button(text="Regenerate", size_hint=(1, None), height=40)
+        buttons = BoxLayout(orientation='horizontal', size_hint=(1, None), height=40, spacing=5)
+        regenerate_button = Button(text="Regenerate", size_hint=(0.3, 1))
         regenerate_button.bind(on_release=lambda instance: self.terrain_widget.generate_noise_texture())
-        self.control_panel.add_widget(regenerate_button)
+        buttons.add_widget(regenerate_button)
+        animate_button = Button(text="Animate", size_hint=(0.25, 1))
+        animate_button.bind(on_release=lambda instance: self.toggle_animation())
+        buttons.add_widget(animate_button)
+        erode_button = Button(text="Erode", size_hint=(0.2, 1))
+        erode_button.bind(on_release=lambda instance: self.toggle_erosion())
+        buttons.add_widget(erode_button)
+        stats_button = Button(text="Stats", size_hint=(0.25, 1))
+        stats_button.bind(on_release=lambda instance: self.toggle_stats())
+        buttons.add_widget(stats_button)
+        self.control_panel.add_widget(buttons)
         
         root.add_widget(self.control_panel)
+        
+        # Tempos das etapas, ao lado do painel de controle
+        self.stats_label = Label(text="", size_hint=(None, None), size=(300, 200), halign='left',
+                                 valign='top', font_size='12sp')
+        self.stats_label.text_size = self.stats_label.size
+        self.stats_event = None
+        # Vista animada por cima do terreno, com os mesmos parâmetros e a mesma vista
+        self.animation = None
+        # Os chunks já gerados continuam no cache: só os que passam a aparecer são gerados
+        self.resize_trigger = Clock.create_trigger(lambda dt: self.terrain_widget.update_zoom(), 0.15)
         Window.bind(on_resize=self.on_window_resize)
         return root
 
@@ -109,5 +141,50 @@ class MyApp(App):
         self.terrain_widget.set_sea_level(new_value)
         label.text = f"Sea Level: {new_value:.2f}"
 
+    def toggle_animation(self):
+        root = self.control_panel.parent
+        if self.animation is None:
+            self.animation = AnimatedTerrain(self.terrain_widget, size_hint=(1, 1))
+            # Logo acima do terreno, abaixo dos controles
+            root.add_widget(self.animation, index=len(root.children) - 1)
+            self.animation.start()
+        else:
+            self.animation.stop()
+            root.remove_widget(self.animation)
+            self.animation = None
+
+    def toggle_erosion(self):
+        terrain = self.terrain_widget
+        terrain.erosion = Erosion() if terrain.erosion is None else None
+        terrain.generate_noise_texture()
+
+    def toggle_stats(self):
+        root = self.control_panel.parent
+        if self.stats_event is None:
+            root.add_widget(self.stats_label)
+            self.update_stats(0)
+            self.stats_event = Clock.schedule_interval(self.update_stats, 0.5)
+        else:
+            self.stats_event.cancel()
+            self.stats_event = None
+            root.remove_widget(self.stats_label)
+
+    def update_stats(self, dt):
+        lines = []
+        for name, stats in self.terrain_widget.metrics.summary().items():
+            lines.append(f"{name:<9} {stats['last_ms']:7.1f} ms  {stats['mean_ms']:7.1f} ms avg  "
+                         f"{stats['mpx_per_s']:6.1f} Mpx/s")
+        self.stats_label.text = "\n".join(lines) or "No measurements yet"
+        self.stats_label.top = self.control_panel.top
+        self.stats_label.right = self.control_panel.x
+
+    def on_stop(self):
+        if self.animation is not None:
+            self.animation.stop()
+        self.terrain_widget.shutdown()
+
     def on_window_resize(self, instance, width, height):
-        self.terrain_widget.generate_noise_texture()
\ No newline at end of file
+        # Arrastar a borda gera dezenas de eventos; cada um adia o anterior,
+        # então só o último é tratado, 0.15 s depois de parar
+        self.resize_trigger.cancel()
+        self.resize_trigger()
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Execução de tarefas de geração fora da thread da interface.
+
+Só a tarefa mais nova importa: cada ``submit`` substitui a anterior, que
+para no próximo ``job.check()``. Os resultados voltam para a thread
+principal pela função ``schedule`` (no Kivy, via ``Clock``).
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Cancelled(Exception):
+    """A tarefa foi substituída por uma mais nova"""
+
+
+class Job:
+    def __init__(self, worker, generation):
+        self.worker = worker
+        self.generation = generation
+
+    @property
+    def cancelled(self):
+        return self.generation != self.worker.generation
+
+    def check(self):
+        """Interrompe a tarefa se ela já foi substituída"""
+        if self.cancelled:
+            raise Cancelled()
+
+    def deliver(self, callback, *args):
+        """Chama ``callback(*args)`` na thread principal, se a tarefa ainda for a atual"""
+        def run():
+            if not self.cancelled:
+                callback(*args)
+        self.worker.schedule(run)
+
+
+class BackgroundWorker:
+    """Uma thread que roda ``task(job, *args)``, sempre só a tarefa mais nova"""
+
+    def __init__(self, schedule=None):
+        # Sem ``schedule`` os resultados são entregues na própria thread de trabalho
+        self.schedule = schedule or (lambda callback: callback())
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def submit(self, task, *args):
+        with self.lock:
+            self.generation += 1
+            job = Job(self, self.generation)
+        return self.executor.submit(self._run, job, task, args)
+
+    def cancel(self):
+        """Descarta a tarefa em andamento e as que estão na fila"""
+        with self.lock:
+            self.generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _run(self, job, task, args):
+        # Substituída enquanto esperava na fila
+        if job.cancelled:
+            return
+        try:
+            task(job, *args)
+        except Cancelled:
+            pass
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,307 @@
+"""Benchmark das etapas da geração, sem janela.
+
+Mede separadamente o ruído, o clima e a classificação em biomas, a cor, as
+normais/iluminação e o empacotamento do buffer da textura, numa matriz de
+resoluções, octaves e backends. O resultado sai em JSON (megapixels/s e
+pico de memória por etapa) e pode ser comparado com um baseline salvo:
+    python benchmark.py --output base.json
+    python benchmark.py --baseline base.json   # sai com código 1 se piorar
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from biomes import BiomeTable, climate_fields
+from colorize import Palette, compute_normals, light_map, light_vector, shade, terrain_bands
+from erosion import Erosion
+from heightmap import fbm_perlin
+from parallel import ParallelGenerator
+from render import BACKENDS
+
+SEA_LEVEL = -0.15
+# Etapas rápidas são repetidas até somar pelo menos este tempo
+MIN_SECONDS = 0.2
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the terrain generation stages.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024],
+                        help="square map sizes in pixels")
+    parser.add_argument('--octaves', type=int, nargs='+', default=[4, 8])
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the fastest counts")
+    parser.add_argument('--output', help="write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', help="JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative loss of throughput or growth of memory")
+    parser.add_argument('--erosion', action='store_true',
+                        help="benchmark the erosion stage against the per-cell reference instead")
+    parser.add_argument('--erosion-size', type=int, default=2048)
+    parser.add_argument('--reference-size', type=int, default=48)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for tiled erosion")
+    return parser
+
+
+def stages(backend, size, octaves):
+    """Etapas na ordem do pipeline; cada uma lê e escreve no dicionário ``state``"""
+    fbm = BACKENDS[backend]
+    palette = Palette(terrain_bands(SEA_LEVEL))
+    biomes = BiomeTable.load()
+    light_dir = light_vector(45)
+
+    def noise(state):
+        state['height_map'] = fbm(size, size, 0.005, octaves, 0.6, 2.0)
+
+    def climate(state):
+        state['climate'] = climate_fields(fbm, size, size, 0.005, biomes.climate)
+
+    def classify(state):
+        state['biome_ids'] = biomes.classify(state['height_map'], *state['climate'], SEA_LEVEL)
+
+    def colorize(state):
+        state['colors'] = palette.colorize(state['height_map'])
+
+    def lighting(state):
+        height_map = state['height_map']
+        normal_x, normal_y = compute_normals(height_map)
+        total_light = light_map(normal_x, normal_y, light_dir, 0.8, 0.6,
+                                flat=height_map < np.float64(SEA_LEVEL))
+        state['pixels'] = shade(state['colors'], total_light)
+
+    def packing(state):
+        # A cópia que o blit_buffer da textura faz do array
+        state['buffer'] = state['pixels'].tobytes()
+
+    return [('noise', noise), ('climate', climate), ('biomes', classify), ('colorize', colorize),
+            ('lighting', lighting), ('packing', packing)]
+
+
+def measure(stage, state, repeat):
+    """Melhor tempo de pelo menos ``repeat`` execuções e o pico de memória de uma delas"""
+    best = float('inf')
+    runs = 0
+    total = 0.0
+    while runs < repeat or total < MIN_SECONDS:
+        start = time.perf_counter()
+        stage(state)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+    # O tracemalloc deixa tudo mais lento, então o pico é medido à parte
+    tracemalloc.start()
+    try:
+        stage(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(args):
+    results = []
+    for backend, size, octaves in itertools.product(args.backends, args.sizes, args.octaves):
+        state = {}
+        for name, stage in stages(backend, size, octaves):
+            seconds, peak = measure(stage, state, args.repeat)
+            results.append({
+                'backend': backend,
+                'size': size,
+                'octaves': octaves,
+                'stage': name,
+                'seconds': seconds,
+                'mpx_per_s': size * size / seconds / 1e6,
+                'peak_bytes': peak,
+            })
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+
+# Erosão célula a célula, a implementação direta das mesmas regras de ``erosion``
+NEIGHBORS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def _neighbor_values(grid, row, col):
+    height, width = len(grid), len(grid[0])
+    return [grid[min(max(row + dr, 0), height - 1)][min(max(col + dc, 0), width - 1)]
+            for dr, dc in NEIGHBORS]
+
+
+def _receive(grid, flows, row, col):
+    """Soma o que cada vizinho (dentro do mapa) mandou para (row, col)"""
+    height, width = len(grid), len(grid[0])
+    for direction, (dr, dc) in enumerate(NEIGHBORS):
+        # O vizinho do lado oposto manda nesta direção
+        r, c = row - dr, col - dc
+        if 0 <= r < height and 0 <= c < width:
+            grid[row][col] += flows[r][c][direction]
+
+
+def thermal_reference(heights, iterations, talus, rate):
+    heights = [list(map(float, row)) for row in heights]
+    for _ in range(iterations):
+        flows = []
+        moved = []
+        for row in range(len(heights)):
+            flows.append([])
+            moved.append([])
+            for col in range(len(heights[0])):
+                drops = [heights[row][col] - n for n in _neighbor_values(heights, row, col)]
+                excess = [max(drop - talus, 0.0) for drop in drops]
+                amount = max(max(drops) - talus, 0.0) * (rate * 0.5)
+                total = sum(excess)
+                flows[-1].append([e * amount / total if total > 0 else 0.0 for e in excess])
+                moved[-1].append(amount)
+        heights = [[h - m for h, m in zip(hrow, mrow)] for hrow, mrow in zip(heights, moved)]
+        for row in range(len(heights)):
+            for col in range(len(heights[0])):
+                _receive(heights, flows, row, col)
+    return heights
+
+
+def hydraulic_reference(heights, iterations, rain, capacity, erosion_rate, deposition_rate,
+                        evaporation):
+    rows, cols = len(heights), len(heights[0])
+    heights = [list(map(float, row)) for row in heights]
+    water = [[0.0] * cols for _ in range(rows)]
+    sediment = [[0.0] * cols for _ in range(rows)]
+    for _ in range(iterations):
+        water = [[w + rain for w in row] for row in water]
+        level = [[h + w for h, w in zip(hrow, wrow)] for hrow, wrow in zip(heights, water)]
+        water_flows = [[None] * cols for _ in range(rows)]
+        sediment_flows = [[None] * cols for _ in range(rows)]
+        for row in range(rows):
+            for col in range(cols):
+                drops = [max(level[row][col] - n, 0.0) for n in _neighbor_values(level, row, col)]
+                steepest = max(drops)
+                outflow = min(water[row][col], steepest * 0.5)
+                change = capacity * outflow * steepest - sediment[row][col]
+                change *= erosion_rate if change > 0 else deposition_rate
+                heights[row][col] -= change
+                sediment[row][col] += change
+                leaving = outflow / water[row][col] * sediment[row][col] if water[row][col] > 0 else 0.0
+                total = sum(drops)
+                water_flows[row][col] = [d * outflow / total if total > 0 else 0.0 for d in drops]
+                sediment_flows[row][col] = [d * leaving / total if total > 0 else 0.0 for d in drops]
+                water[row][col] -= outflow
+                sediment[row][col] -= leaving
+        for row in range(rows):
+            for col in range(cols):
+                _receive(water, water_flows, row, col)
+                _receive(sediment, sediment_flows, row, col)
+        water = [[w * (1 - evaporation) for w in row] for row in water]
+    return [[h + s for h, s in zip(hrow, srow)] for hrow, srow in zip(heights, sediment)]
+
+
+def erosion_reference(erosion, heights):
+    heights = thermal_reference(heights, erosion.thermal_iterations, erosion.talus,
+                                erosion.thermal_rate)
+    return hydraulic_reference(heights, erosion.hydraulic_iterations, erosion.rain,
+                               erosion.capacity, erosion.erosion_rate, erosion.deposition_rate,
+                               erosion.evaporation)
+
+
+def run_erosion(args):
+    """Erosão vetorizada contra a referência célula a célula, e a versão em tiles"""
+    erosion = Erosion()
+    results = []
+
+    size = args.reference_size
+    heights = fbm_perlin(size, size, 0.005, 8, 0.6, 2.0).astype(np.float64)
+    start = time.perf_counter()
+    reference = np.array(erosion_reference(erosion, heights.tolist()))
+    reference_seconds = time.perf_counter() - start
+    seconds, _ = measure(lambda state: erosion.apply(heights), {}, args.repeat)
+    error = float(np.abs(erosion.apply(heights) - reference).max())
+    for name, elapsed in (('reference', reference_seconds), ('vectorized', seconds)):
+        results.append({'stage': f'erosion_{name}', 'size': size, 'seconds': elapsed,
+                        'mpx_per_s': size * size / elapsed / 1e6})
+    results[-1]['speedup'] = reference_seconds / seconds
+    results[-1]['max_error'] = error
+
+    size = args.erosion_size
+    heights = fbm_perlin(size, size, 0.005, 8, 0.6, 2.0)
+    start = time.perf_counter()
+    whole = erosion.apply(heights)
+    results.append({'stage': 'erosion_vectorized', 'size': size,
+                    'seconds': time.perf_counter() - start})
+    generator = ParallelGenerator(workers=args.workers)
+    try:
+        start = time.perf_counter()
+        tiled = erosion.apply(heights, executor=generator.get_executor())
+        results.append({'stage': 'erosion_tiled', 'size': size, 'workers': generator.workers,
+                        'seconds': time.perf_counter() - start,
+                        'identical': bool(np.array_equal(whole, tiled))})
+    finally:
+        generator.shutdown()
+    for result in results[-2:]:
+        result['mpx_per_s'] = size * size / result['seconds'] / 1e6
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'erosion': erosion.key(), 'results': results}
+
+
+def result_key(result):
+    return result['backend'], result['size'], result['octaves'], result['stage']
+
+
+def compare(report, baseline, tolerance):
+    """Lista das regressões de ``report`` em relação ao ``baseline``"""
+    previous = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        label = '{} {}px {} octaves {}'.format(*result_key(result))
+        if result['mpx_per_s'] < old['mpx_per_s'] * (1 - tolerance):
+            regressions.append(f"{label}: {result['mpx_per_s']:.2f} Mpx/s, "
+                               f"baseline {old['mpx_per_s']:.2f} Mpx/s")
+        if result['peak_bytes'] > old['peak_bytes'] * (1 + tolerance):
+            regressions.append(f"{label}: peak {result['peak_bytes']} bytes, "
+                               f"baseline {old['peak_bytes']} bytes")
+    return regressions
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.erosion:
+        print(json.dumps(run_erosion(args), indent=2))
+        return 0
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    for result in report['results']:
+        print('{:<12} {:>5}px {:>2} octaves  {:<9} {:8.2f} Mpx/s  {:8.1f} MB'.format(
+            *result_key(result), result['mpx_per_s'], result['peak_bytes'] / 1e6), file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+            for line in regressions:
+                print('  ' + line, file=sys.stderr)
+            return 1
+        print(f"\nNo regressions against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Biomas a partir da altura, da temperatura e da umidade, definidos num arquivo JSON.
+
+Cada eixo é dividido em faixas por uma lista de limites, e uma tabela
+(altura x temperatura x umidade) diz o bioma de cada combinação, como o
+diagrama de Whittaker. A classificação devolve um array ``uint8`` com o
+índice do bioma de cada pixel. Ela não faz busca nem ``if`` por bioma: a
+faixa de cada eixo sai de uma tabela de consulta (``BinLookup``) e o bioma de
+um acesso à tabela, então o custo por pixel é o mesmo com 6 ou 200 biomas.
+
+As faixas de altura são relativas ao nível do mar, como em ``terrain_bands``:
+``height_steps`` são os incrementos de cada limite sobre o anterior,
+começando do nível do mar.
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'biomes.json')
+
+
+class Biome:
+    def __init__(self, name, minColor, maxColor):
+        self.name = name
+        self.minColor = minColor
+        self.maxColor = maxColor
+
+
+class BinLookup:
+    """Faixa de cada valor entre limites crescentes, sem busca binária.
+
+    O intervalo dos limites é dividido em células menores que a menor
+    distância entre eles, então cada célula tem no máximo um limite. A faixa
+    é a de início da célula (tabelada) mais uma comparação com o limite
+    dentro dela: o mesmo resultado de ``np.searchsorted(edges, v, 'right')``.
+    Limites muito próximos precisariam de células demais; acima de
+    ``MAX_CELLS`` a faixa sai do próprio ``searchsorted``.
+    """
+
+    MAX_CELLS = 1 << 16
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError(f"Expected strictly increasing bin edges, got {list(edges)}")
+        self.bins = len(self.edges) + 1
+        self.before = None
+        if not len(self.edges):
+            return
+        self.low = self.edges[0]
+        span = self.edges[-1] - self.low
+        gap = np.diff(self.edges).min() if len(self.edges) > 1 else 1.0
+        self.scale = 1.0 / gap
+        # Dobra a resolução até os limites caírem em células diferentes
+        while span * self.scale < self.MAX_CELLS:
+            cells = self.cell(self.edges)
+            if len(self.edges) == 1 or np.all(np.diff(cells) > 0):
+                break
+            self.scale *= 2
+        else:
+            return
+        count = int(math.floor(span * self.scale)) + 1
+        # Limites que ficam antes de cada célula e o limite dentro dela
+        self.before = np.zeros(count, dtype=np.uint8 if self.bins <= 256 else np.intp)
+        self.before[cells[:-1] + 1] = 1
+        np.cumsum(self.before, out=self.before)
+        self.inside = np.full(count, np.inf)
+        self.inside[cells] = self.edges
+
+    def cell(self, values):
+        cells = np.subtract(values, self.low, dtype=np.float64)
+        cells *= self.scale
+        np.floor(cells, out=cells)
+        np.clip(cells, 0, math.floor((self.edges[-1] - self.low) * self.scale), out=cells)
+        return cells.astype(np.intp)
+
+    def __call__(self, values):
+        """Índice da faixa (0 a ``bins - 1``) de cada valor"""
+        if not len(self.edges):
+            return np.zeros(np.shape(values), dtype=np.intp)
+        if self.before is None:
+            return np.searchsorted(self.edges, np.asarray(values, dtype=np.float64), side='right')
+        cells = self.cell(values)
+        bins = np.take(self.before, cells).astype(np.intp)
+        # Comparação em float64, como o if/elif com floats do Python
+        bins += np.asarray(values, dtype=np.float64) >= np.take(self.inside, cells)
+        return bins
+
+
+class BiomeTable:
+    """Biomas, limites de cada eixo e a tabela (altura, temperatura, umidade) -> bioma"""
+
+    def __init__(self, biomes, height_steps, temperature_levels, moisture_levels, table,
+                 climate=None):
+        if not 0 < len(biomes) <= 256:
+            raise ValueError(f"Expected between 1 and 256 biomes, got {len(biomes)}")
+        self.biomes = biomes
+        self.height_steps = list(height_steps)
+        self.temperature = BinLookup(temperature_levels)
+        self.moisture = BinLookup(moisture_levels)
+        # Parâmetros dos ruídos de temperatura e umidade
+        self.climate = dict(climate or {})
+        self.table = np.asarray(table, dtype=np.uint8)
+        shape = (len(self.height_steps) + 1, self.temperature.bins, self.moisture.bins)
+        if self.table.shape != shape:
+            raise ValueError(f"Expected a biome table of shape {shape}, got {self.table.shape}")
+        self.min_colors = np.array([b.minColor for b in biomes], dtype=np.float64)
+        self.max_colors = np.array([b.maxColor for b in biomes], dtype=np.float64)
+        self.heights = {}
+        self._key = (tuple((b.name, b.minColor, b.maxColor) for b in biomes),
+                     tuple(self.height_steps), tuple(self.temperature.edges),
+                     tuple(self.moisture.edges), self.table.tobytes(),
+                     tuple(sorted(self.climate.items())))
+
+    @classmethod
+    def load(cls, path=DEFAULT_CONFIG):
+        """Lê a configuração; a tabela usa os nomes dos biomas"""
+        with open(path) as file:
+            config = json.load(file)
+        biomes = [Biome(b['name'], tuple(b['min_color']), tuple(b['max_color']))
+                  for b in config['biomes']]
+        ids = {biome.name: index for index, biome in enumerate(biomes)}
+        try:
+            table = [[[ids[name] for name in row] for row in zone] for zone in config['table']]
+        except KeyError as error:
+            raise ValueError(f"Expected a biome defined in 'biomes', got {error}") from None
+        return cls(biomes, config['height_steps'], config['temperature_levels'],
+                   config['moisture_levels'], table, config.get('climate'))
+
+    def key(self):
+        """Tudo de que os ids e as cores dependem, menos o nível do mar"""
+        return self._key
+
+    def height_lookup(self, sea_level):
+        """``BinLookup`` das faixas de altura e os limites de cada faixa (de -1 a 1)"""
+        lookup = self.heights.get(sea_level)
+        if lookup is None:
+            # Somados um a um, como em terrain_bands, para dar os mesmos floats
+            edges = []
+            level = sea_level
+            for step in self.height_steps:
+                level += step
+                edges.append(level)
+            bounds = np.array([-1.0] + edges + [1.0])
+            lookup = (BinLookup(edges), bounds[:-1], bounds[1:] - bounds[:-1])
+            self.heights = {sea_level: lookup}
+        return lookup
+
+    def classify(self, height_map, temperature, moisture, sea_level, out=None):
+        """Índice (uint8) do bioma de cada pixel.
+
+        A temperatura cai com a altura acima do mar, conforme ``lapse_rate``.
+        """
+        heights, _, _ = self.height_lookup(sea_level)
+        lapse_rate = self.climate.get('lapse_rate', 0.0)
+        if lapse_rate:
+            altitude = np.subtract(height_map, sea_level, dtype=np.float64)
+            np.maximum(altitude, 0, out=altitude)
+            altitude *= -lapse_rate
+            altitude += temperature
+            temperature = altitude
+        index = heights(height_map)
+        index *= self.temperature.bins
+        index += self.temperature(temperature)
+        index *= self.moisture.bins
+        index += self.moisture(moisture)
+        return np.take(self.table.ravel(), index, out=out)
+
+    def colorize(self, height_map, biome_ids, sea_level, out=None):
+        """Cor base (uint8, HxWx3): a cor do bioma interpolada pela altura na faixa,
+        como ``Palette.colorize``"""
+        if out is None:
+            out = np.empty(height_map.shape + (3,), dtype=np.uint8)
+        heights, lows, spans = self.height_lookup(sea_level)
+        zone = heights(height_map)
+        factor = height_map - np.take(lows, zone)
+        factor /= np.take(spans, zone)
+        np.clip(factor, 0.0, 1.0, out=factor)
+        for c in range(3):
+            color1 = self.min_colors[:, c]
+            channel = np.take(self.max_colors[:, c] - color1, biome_ids)
+            channel *= factor
+            channel += np.take(color1, biome_ids)
+            out[..., c] = channel
+        return out
+
+
+def climate_fields(fbm, width, height, scale, climate, x0=0, y0=0):
+    """Temperatura e umidade (float32) na grade do heightmap, com ruídos de
+    frequência ``climate['scale']`` vezes a do terreno e seeds próprias"""
+    fields = []
+    for seed in (climate.get('temperature_seed', 7), climate.get('moisture_seed', 13)):
+        fields.append(fbm(width, height, scale * climate.get('scale', 0.25),
+                          climate.get('octaves', 4), climate.get('persistence', 0.5),
+                          climate.get('lacunarity', 2.0), seed, x0=x0, y0=y0))
+    return fields
@@ -0,0 +1,196 @@
+"""Mundo infinito dividido em chunks quadrados, com cache LRU limitado por memória.
+
+Cada chunk é endereçado por (chunk_x, chunk_y, lod). No nível de detalhe
+``lod`` um pixel do chunk cobre ``2 ** lod`` pixels do mundo. Como o fBm é
+contínuo na posição, chunks vizinhos se encaixam sem emendas.
+"""
+from functools import partial
+
+import numpy as np
+
+from heightmap import fbm_perlin, nyquist_octaves
+from biomes import climate_fields
+from colorize import compute_normals
+from diskcache import DiskCache
+from lrucache import LRUCache
+from metrics import NULL_METRICS, Metrics
+from octavecache import OctaveCache
+from parallel import attach
+
+# Intensidade do relevo nas normais, por pixel do mundo
+NORMAL_STRENGTH = 50.0
+
+
+class Chunk:
+    """Pedaço do mundo com heightmap, normais e os buffers de cor"""
+
+    def __init__(self, key, height_map, normals, climate=None):
+        self.key = key
+        self.height_map = height_map
+        self.normals = normals
+        # Temperatura e umidade, e o bioma de cada pixel (calculado ao colorir)
+        self.climate = climate
+        self.biome_ids = None if climate is None else np.empty(height_map.shape, dtype=np.uint8)
+        self.base_colors = np.empty(height_map.shape + (3,), dtype=np.uint8)
+        self.pixels = np.empty(height_map.shape + (3,), dtype=np.uint8)
+        # Parâmetros com que base_colors e pixels foram calculados
+        self.palette_key = None
+        self.light_key = None
+        # Textura da interface, criada por quem desenha o chunk
+        self.texture = None
+
+    @property
+    def nbytes(self):
+        nbytes = (self.height_map.nbytes + self.normals[0].nbytes + self.normals[1].nbytes
+                  + self.base_colors.nbytes + self.pixels.nbytes)
+        if self.climate is not None:
+            nbytes += self.climate[0].nbytes + self.climate[1].nbytes + self.biome_ids.nbytes
+        return nbytes
+
+
+def generate_chunk(chunk_x, chunk_y, lod, size, scale, octaves, persistence, lacunarity, base=42,
+                   generator=None, resolution=None, metrics=NULL_METRICS, disk_cache=None,
+                   octave_cache=None, erosion=None, climate=None):
+    """Gera o chunk (chunk_x, chunk_y, lod) com ``size`` x ``size`` pixels.
+
+    Com ``resolution`` menor que ``size`` o chunk cobre a mesma área com menos
+    pixels (prévia de baixa resolução). Quando as amostras ficam a mais de um
+    pixel do mundo, as octaves acima do limite de Nyquist não são calculadas.
+    Com um ``ParallelGenerator`` o heightmap é dividido entre os workers dele.
+    O tempo do ruído e das normais é registrado em ``metrics``. Com um
+    ``DiskCache`` o heightmap é lido dele quando os mesmos parâmetros já
+    foram gerados antes; com um ``OctaveCache`` só as octaves que ainda não
+    estão nele são calculadas. Com uma ``Erosion`` o ruído é gerado com a
+    margem que a erosão enxerga e erodido antes das normais; cortada a
+    margem, chunks vizinhos continuam se encaixando sem emendas. As prévias
+    não são erodidas. Com ``climate`` (os parâmetros ``climate`` de uma
+    ``BiomeTable``) o chunk também recebe os campos de temperatura e umidade.
+    """
+    resolution = resolution or size
+    if resolution < size:
+        # A prévia é trocada pelo chunk completo logo em seguida; a margem da
+        # erosão custaria quase o chunk inteiro para um resultado descartado
+        erosion = None
+    # Pixels do mundo entre duas amostras
+    spacing = 2 ** lod * size / resolution
+    detail_octaves = octaves
+    if spacing > 1:
+        detail_octaves = nyquist_octaves(octaves, scale, lacunarity, spacing)
+    if octave_cache is not None:
+        fbm = partial(octave_cache.fbm, 'perlin', generator=generator)
+    elif generator is not None:
+        fbm = partial(generator.heightmap, fbm_perlin)
+    else:
+        fbm = fbm_perlin
+    pixels = (resolution + 2) ** 2
+    # Pixels além da borda de 1 pixel que a erosão precisa ver
+    margin = erosion.margin if erosion is not None else 0
+    halo = None
+    if disk_cache is not None:
+        cache_key = disk_cache.key('perlin', scale, octaves, persistence, lacunarity, base,
+                                   size, resolution, chunk_x, chunk_y, lod,
+                                   erosion.key() if erosion is not None else None)
+        with metrics.stage('cache_read', pixels=pixels) as record:
+            halo = disk_cache.get(cache_key)
+            record['nbytes'] = halo.nbytes if halo is not None else 0
+    if halo is None:
+        # Uma borda de 1 pixel para as normais da beirada usarem os vizinhos reais
+        with metrics.stage('noise', pixels=(resolution + 2 + 2 * margin) ** 2) as record:
+            halo = fbm(
+                resolution + 2 + 2 * margin,
+                resolution + 2 + 2 * margin,
+                scale * spacing,
+                octaves,
+                persistence,
+                lacunarity,
+                base,
+                x0=chunk_x * resolution - 1 - margin,
+                y0=chunk_y * resolution - 1 - margin,
+                detail_octaves=detail_octaves
+            )
+            record['nbytes'] = halo.nbytes
+        if erosion is not None:
+            with metrics.stage('erosion', pixels=halo.size, nbytes=halo.nbytes):
+                executor = generator.get_executor() if generator is not None else None
+                halo = erosion.apply(halo, spacing=spacing, executor=executor)
+            halo = halo[margin:-margin, margin:-margin].copy() if margin else halo
+        if disk_cache is not None:
+            disk_cache.put(cache_key, halo)
+    with metrics.stage('normals', pixels=pixels) as record:
+        normal_x, normal_y = compute_normals(halo, strength=NORMAL_STRENGTH / spacing)
+        record['nbytes'] = normal_x.nbytes + normal_y.nbytes
+    fields = None
+    if climate is not None:
+        with metrics.stage('climate', pixels=2 * resolution ** 2) as record:
+            fields = climate_fields(fbm, resolution, resolution, scale * spacing, climate,
+                                    x0=chunk_x * resolution, y0=chunk_y * resolution)
+            record['nbytes'] = fields[0].nbytes + fields[1].nbytes
+    inner = (slice(1, -1), slice(1, -1))
+    return Chunk((chunk_x, chunk_y, lod), halo[inner].copy(),
+                 (normal_x[inner].copy(), normal_y[inner].copy()), fields)
+
+
+def chunk_specs(resolution, climate=False):
+    """(forma, tipo) dos arrays de um chunk, na ordem de ``chunk_arrays``"""
+    shape = (resolution, resolution)
+    specs = [(shape, np.float32), (shape, np.float64), (shape, np.float64)]
+    if climate:
+        specs += [(shape, np.float32), (shape, np.float32)]
+    return specs
+
+
+def chunk_arrays(chunk):
+    """Heightmap, normais e, se houver, temperatura e umidade do chunk"""
+    arrays = [chunk.height_map, *chunk.normals]
+    if chunk.climate is not None:
+        arrays += list(chunk.climate)
+    return arrays
+
+
+def assemble_chunk(key, arrays):
+    """Chunk a partir dos arrays de ``chunk_arrays``; os buffers de cor são novos"""
+    climate = (arrays[3], arrays[4]) if len(arrays) > 3 else None
+    return Chunk(key, arrays[0], (arrays[1], arrays[2]), climate)
+
+
+# Caches de cada processo do pool, mantidos entre as tarefas
+_worker_caches = {}
+
+
+def generate_chunk_task(args, kwargs, buffers, cache_dir=None, cache_bytes=0, octave_bytes=0):
+    """Worker: ``generate_chunk(*args, **kwargs)`` inteiro num processo do pool.
+
+    Os arrays do chunk são escritos em ``buffers`` (os de uma ``SharedArrays``
+    com ``chunk_specs``); só os registros de tempo voltam pelo pool, para o
+    ``Metrics`` de quem pediu. O processo guarda o próprio ``DiskCache`` (em
+    ``cache_dir``, se dado) e ``OctaveCache`` (com ``octave_bytes``) entre as
+    tarefas.
+    """
+    caches = _worker_caches.get((cache_dir, cache_bytes, octave_bytes))
+    if caches is None:
+        caches = _worker_caches[cache_dir, cache_bytes, octave_bytes] = (
+            DiskCache(cache_dir, cache_bytes) if cache_dir else None,
+            OctaveCache(octave_bytes) if octave_bytes else None)
+    metrics = Metrics()
+    chunk = generate_chunk(*args, metrics=metrics, disk_cache=caches[0], octave_cache=caches[1],
+                           **kwargs)
+    arrays, blocks = attach(buffers)
+    try:
+        for array, source in zip(arrays, chunk_arrays(chunk)):
+            array[...] = source
+    finally:
+        # As views precisam sumir antes de fechar a memória compartilhada
+        del arrays
+        for block in blocks:
+            block.close()
+    return metrics.take()
+
+
+class ChunkCache(LRUCache):
+    """Cache LRU de chunks; descarta os menos usados acima de ``max_bytes``"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    def put(self, chunk):
+        super().put(chunk.key, chunk)
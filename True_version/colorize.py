@@ -0,0 +1,204 @@
+"""Coloração e iluminação do heightmap sobre arrays inteiros.
+
+Reproduz pixel a pixel o resultado de ``get_terrain_color``,
+``calculate_normal`` e ``apply_lighting`` do ``Terrain``.
+"""
+import math
+import numpy as np
+
+
+class TerrainType:
+    def __init__(self, minHeight, maxHeight, minColor, maxColor, lerpAdjustment=0):
+        self.minHeight = minHeight
+        self.maxHeight = maxHeight
+        self.minColor = minColor
+        self.maxColor = maxColor
+        self.lerpAdjustment = lerpAdjustment
+
+
+def terrain_bands(sea_level):
+    """As faixas de terreno (da água à neve) para um nível do mar"""
+    water = TerrainType(-1.0, sea_level, (0, 0, 0), (40, 255, 255))
+    sand_max = sea_level + 0.05
+    sand = TerrainType(sea_level, sand_max, (215, 192, 100), (255, 246, 120))
+    grass_max = sand_max + 0.25
+    grass = TerrainType(sand_max, grass_max, (20, 150, 40), (100, 200, 50))
+    forest_max = grass_max + 0.1
+    forest = TerrainType(grass_max, forest_max, (34, 139, 34), (85, 160, 85))
+    mountain_max = forest_max + 0.15
+    mountain = TerrainType(forest_max, mountain_max, (120, 100, 60), (180, 160, 100))
+    snow = TerrainType(mountain_max, 1.0, (245, 245, 245), (255, 255, 255))
+    return [water, sand, grass, forest, mountain, snow]
+
+
+class Palette:
+    """Tabela com os limites e cores de cada TerrainType, indexada pela faixa"""
+
+    def __init__(self, terrains):
+        # A última faixa pega tudo acima do limite da penúltima
+        self.thresholds = np.array([t.maxHeight for t in terrains[:-1]], dtype=np.float64)
+        self.min_heights = np.array([t.minHeight for t in terrains], dtype=np.float64)
+        self.max_heights = np.array([t.maxHeight for t in terrains], dtype=np.float64)
+        self.min_colors = np.array([t.minColor for t in terrains], dtype=np.float64)
+        self.max_colors = np.array([t.maxColor for t in terrains], dtype=np.float64)
+
+    def band_index(self, height_map):
+        """Índice da primeira faixa com altura < maxHeight, como no if/elif"""
+        return np.searchsorted(self.thresholds, height_map, side='right')
+
+    def colorize(self, height_map, out=None, scratch=None):
+        """Cor base (uint8, HxWx3) de cada pixel; com ``scratch`` (uma
+        ``RenderScratch``) as contas não alocam arrays"""
+        if out is None:
+            out = np.empty(height_map.shape + (3,), dtype=np.uint8)
+        if scratch is None:
+            band = self.band_index(height_map)
+            low = np.take(self.min_heights, band)
+            factor = height_map - low
+            span = np.take(self.max_heights - self.min_heights, band)
+        else:
+            # Conta os limites <= altura, o mesmo que o searchsorted. Com
+            # mode='clip' o take escreve direto em ``out``, sem buffer
+            band = scratch.band
+            band[...] = 0
+            for threshold in self.thresholds:
+                band += np.greater_equal(height_map, threshold, out=scratch.mask)
+            factor = np.take(self.min_heights, band, out=scratch.factor, mode='clip')
+            np.subtract(height_map, factor, out=factor)
+            span = np.take(self.max_heights - self.min_heights, band, out=scratch.channel,
+                           mode='clip')
+        factor /= span
+        # Fora da faixa vale a cor do extremo, o que equivale a limitar o fator
+        np.clip(factor, 0.0, 1.0, out=factor)
+        for c in range(3):
+            color1 = self.min_colors[:, c]
+            if scratch is None:
+                channel = np.take(self.max_colors[:, c] - color1, band)
+                channel *= factor
+                channel += np.take(color1, band)
+            else:
+                channel = np.take(self.max_colors[:, c] - color1, band, out=scratch.channel,
+                                  mode='clip')
+                channel *= factor
+                channel += np.take(color1, band, out=scratch.offset, mode='clip')
+            out[..., c] = channel
+        return out
+
+
+class RenderScratch:
+    """Arrays temporários de ``render_pixels`` para uma forma de heightmap.
+
+    Quem desenha a mesma resolução a cada quadro guarda um e passa em
+    ``scratch``; assim colorir e iluminar não alocam nada.
+    """
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.heights = np.empty(self.shape, dtype=np.float64)
+        self.band = np.empty(self.shape, dtype=np.intp)
+        self.mask = np.empty(self.shape, dtype=bool)
+        self.factor = np.empty(self.shape, dtype=np.float64)
+        self.channel = np.empty(self.shape, dtype=np.float64)
+        self.offset = np.empty(self.shape, dtype=np.float64)
+        self.normal_x = np.empty(self.shape, dtype=np.float64)
+        self.normal_y = np.empty(self.shape, dtype=np.float64)
+        self.light = np.empty(self.shape, dtype=np.float64)
+
+
+def light_vector(light_angle):
+    """Vetor de direção da luz baseado no ângulo em graus"""
+    angle = math.radians(light_angle)
+    return (math.cos(angle), math.sin(angle), 0.5)
+
+
+def compute_normals(height_map, strength=50.0, out=None):
+    """Componentes x e y das normais do terreno (a componente z é sempre 1).
+
+    Não dependem do nível do mar: a água é achatada só em ``light_map``, então
+    o resultado pode ser guardado enquanto o heightmap não mudar. ``out`` é
+    um par de arrays float64 que recebe as componentes.
+    """
+    # As diferenças são feitas em float64 mesmo com o heightmap em float32
+    height_map = np.asarray(height_map, dtype=np.float64)
+    if out is None:
+        normal_x = np.zeros_like(height_map)
+        normal_y = np.zeros_like(height_map)
+        normal_x[:, 1:-1] = -((height_map[:, :-2] - height_map[:, 2:]) * strength)
+        normal_y[1:-1, :] = -((height_map[:-2, :] - height_map[2:, :]) * strength)
+        return normal_x, normal_y
+    normal_x, normal_y = out
+    normal_x[:, [0, -1]] = 0
+    normal_y[[0, -1], :] = 0
+    for normal, low, high, inner in (
+            (normal_x, height_map[:, :-2], height_map[:, 2:], normal_x[:, 1:-1]),
+            (normal_y, height_map[:-2, :], height_map[2:, :], normal_y[1:-1, :])):
+        np.subtract(low, high, out=inner)
+        inner *= strength
+        np.negative(inner, out=inner)
+    return normal_x, normal_y
+
+
+def light_map(normal_x, normal_y, light_dir, light_intensity, ambient_light, flat=None,
+              out=None, scratch=None):
+    """Fator de luz total (ambiente + difusa de Lambert) de cada pixel.
+
+    ``flat`` marca os pixels com normal (0, 0, 1), como a água. Com ``out``
+    (float64) e ``scratch`` (uma ``RenderScratch``) nada é alocado.
+    """
+    if out is None:
+        diffuse = normal_x * light_dir[0] + normal_y * light_dir[1] + light_dir[2]
+    else:
+        diffuse = np.multiply(normal_x, light_dir[0], out=out)
+        diffuse += np.multiply(normal_y, light_dir[1],
+                               out=scratch.channel if scratch is not None else None)
+        diffuse += light_dir[2]
+    if flat is not None:
+        np.copyto(diffuse, light_dir[2], where=flat)
+    np.maximum(diffuse, 0.0, out=diffuse)
+    diffuse *= light_intensity
+    np.minimum(diffuse, 1.0, out=diffuse)
+    if out is None:
+        return ambient_light + (1 - ambient_light) * diffuse
+    diffuse *= 1 - ambient_light
+    diffuse += ambient_light
+    return diffuse
+
+
+def render_pixels(height_map, palette, light=None, out=None, strength=50.0, scratch=None):
+    """Pixels (HxWx3 uint8) do heightmap: cor da ``palette`` e, se ``light`` for
+    (light_dir, light_intensity, ambient_light, water_level), iluminação com
+    normais de intensidade ``strength``. Com ``out`` e ``scratch`` (uma
+    ``RenderScratch`` da forma do heightmap) nada é alocado."""
+    if scratch is not None:
+        # Em float64, como as contas de cor e das normais fariam de qualquer forma
+        np.copyto(scratch.heights, height_map)
+        height_map = scratch.heights
+    out = palette.colorize(height_map, out=out, scratch=scratch)
+    if light is not None:
+        light_dir, light_intensity, ambient_light, water_level = light
+        if scratch is None:
+            normal_x, normal_y = compute_normals(height_map, strength)
+            flat = height_map < np.float64(water_level)
+            total_light = light_map(normal_x, normal_y, light_dir, light_intensity,
+                                    ambient_light, flat=flat)
+        else:
+            normal_x, normal_y = compute_normals(height_map, strength,
+                                                 out=(scratch.normal_x, scratch.normal_y))
+            flat = np.less(height_map, np.float64(water_level), out=scratch.mask)
+            total_light = light_map(normal_x, normal_y, light_dir, light_intensity,
+                                    ambient_light, flat=flat, out=scratch.light, scratch=scratch)
+        shade(out, total_light, out=out, scratch=scratch)
+    return out
+
+
+def shade(colors, total_light, out=None, scratch=None):
+    """Aplica a luz às cores base; ``out`` pode ser o próprio ``colors``"""
+    if out is None:
+        out = np.empty_like(colors)
+    for c in range(3):
+        channel = np.multiply(colors[..., c], total_light,
+                              out=scratch.channel if scratch is not None else None)
+        np.minimum(channel, 255, out=channel)
+        # A conversão para uint8 trunca, como o int() do caminho escalar
+        out[..., c] = channel
+    return out
@@ -0,0 +1,119 @@
+"""Cache em disco de arrays gerados, endereçado pelo hash dos parâmetros.
+
+Cada array é um ``.npy`` cujo nome é o SHA-256 dos parâmetros que o geraram
+(ruído, semente, backend, resolução...), então parâmetros iguais levam ao
+mesmo arquivo mesmo entre execuções. Acima de ``max_bytes`` os arquivos
+usados há mais tempo (pela data de modificação, atualizada a cada leitura)
+são apagados.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+# Muda quando o formato ou a geração mudam, invalidando o cache antigo
+VERSION = 1
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'procedural-terrain')
+
+
+class DiskCache:
+    """Arrays em ``directory``, limitados a ``max_bytes`` com descarte LRU"""
+
+    def __init__(self, directory=None, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.nbytes = sum(size for _, _, size in self.entries())
+
+    @staticmethod
+    def key(*parts):
+        """Hash dos parâmetros; floats entram pelo repr, que é exato"""
+        text = repr((VERSION,) + parts)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npy')
+
+    def entries(self):
+        """(mtime, caminho, bytes) de cada arquivo do cache.
+
+        Outros processos (os workers do pool têm cada um o seu ``DiskCache``
+        no mesmo diretório) podem apagar arquivos durante a listagem; esses
+        ficam de fora.
+        """
+        entries = []
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.npy'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        """Array guardado em ``key``, ou None"""
+        path = self.path(key)
+        try:
+            array = np.load(path)
+            # Marca como usado agora para o descarte LRU
+            os.utime(path)
+        except (FileNotFoundError, ValueError, EOFError):
+            return None
+        return array
+
+    def put(self, key, array):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escreve num temporário e renomeia, para ninguém ler um arquivo pela metade
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.save(file, array)
+            size = os.path.getsize(temp_path)
+            with self.lock:
+                try:
+                    old_size = os.path.getsize(path)
+                except FileNotFoundError:
+                    old_size = 0
+                os.replace(temp_path, path)
+                self.nbytes += size - old_size
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Apaga os arquivos usados há mais tempo até caber em ``max_bytes``"""
+        with self.lock:
+            entries = sorted(self.entries())
+            self.nbytes = sum(size for _, _, size in entries)
+            for _, path, size in entries:
+                if self.nbytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self.nbytes -= size
+
+    def clear(self):
+        with self.lock:
+            for _, path, _ in self.entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.nbytes = 0
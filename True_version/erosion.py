@@ -0,0 +1,186 @@
+"""Erosão térmica e hidráulica do heightmap, em grade e vetorizada.
+
+Cada iteração é um estêncil de raio 2 (um pixel troca material com os 4
+vizinhos, e o que ele recebe depende dos vizinhos deles), então ``k``
+iterações só enxergam ``2 * k`` pixels em volta. Isso permite dividir o mapa
+em tiles com essa borda (halo), rodar ``k`` iterações em cada tile, em
+paralelo, e trocar as bordas de novo: o resultado é idêntico ao do mapa
+inteiro de uma vez.
+"""
+import numpy as np
+
+# Alcance de uma iteração, em pixels
+RADIUS = 2
+
+
+def _drops(values, clip=False):
+    """Quanto cada pixel está acima do vizinho (acima, abaixo, esquerda,
+    direita); fora do mapa conta como 0, então nada sai pelas beiradas"""
+    drops = np.zeros((4,) + values.shape, dtype=values.dtype)
+    np.subtract(values[1:], values[:-1], out=drops[0, 1:])
+    np.negative(drops[0, 1:], out=drops[1, :-1])
+    np.subtract(values[:, 1:], values[:, :-1], out=drops[2, :, 1:])
+    np.negative(drops[2, :, 1:], out=drops[3, :, :-1])
+    if clip:
+        np.maximum(drops, 0, out=drops)
+    return drops
+
+
+def _spread(target, flows):
+    """Soma a cada pixel o que os vizinhos mandaram para ele; ``flows`` segue a
+    ordem de ``_drops`` (para cima, para baixo, esquerda, direita)"""
+    up, down, left, right = flows
+    target[:-1] += up[1:]
+    target[1:] += down[:-1]
+    target[:, :-1] += left[:, 1:]
+    target[:, 1:] += right[:, :-1]
+
+
+def _proportional(weights, amount, out=None):
+    """Divide ``amount`` entre as 4 direções proporcionalmente a ``weights``"""
+    total = weights[0] + weights[1]
+    total += weights[2]
+    total += weights[3]
+    # Os pesos não são negativos: onde o total é 0 a parte fica 0
+    share = np.divide(amount, total, out=total, where=total > 0)
+    return np.multiply(weights, share, out=out)
+
+
+def _steepest(drops):
+    steepest = np.maximum(drops[0], drops[1])
+    np.maximum(steepest, drops[2], out=steepest)
+    np.maximum(steepest, drops[3], out=steepest)
+    return steepest
+
+
+def thermal_step(state, talus, rate):
+    """Uma iteração de erosão térmica sobre ``state`` = [altura], no lugar.
+
+    Onde a diferença para um vizinho passa de ``talus`` o material desliza
+    morro abaixo, dividido entre os vizinhos mais baixos.
+    """
+    height = state[0]
+    excess = _drops(height)
+    excess -= talus
+    np.maximum(excess, 0, out=excess)
+    # Metade do excesso, para não inverter a inclinação
+    moved = _steepest(excess)
+    moved *= rate * 0.5
+    flows = _proportional(excess, moved, out=excess)
+    height -= moved
+    _spread(height, flows)
+
+
+def hydraulic_step(state, rain, capacity, erosion_rate, deposition_rate, evaporation):
+    """Uma iteração de erosão hidráulica em grade sobre ``state`` = [altura, água, sedimento].
+
+    Chove em todo o mapa; a água escorre para os vizinhos mais baixos levando
+    sedimento, arranca material onde carrega menos do que a capacidade do
+    fluxo e deposita onde carrega mais.
+    """
+    height, water, sediment = state
+    water += rain
+    drops = _drops(height + water, clip=True)
+    steepest = _steepest(drops)
+    outflow = np.minimum(water, steepest * 0.5)
+
+    # Capacidade de transporte cresce com o fluxo e com a inclinação
+    change = outflow * capacity
+    change *= steepest
+    change -= sediment
+    change *= np.where(change > 0, erosion_rate, deposition_rate).astype(change.dtype)
+    height -= change
+    sediment += change
+
+    leaving = np.divide(outflow, water, out=steepest, where=water > 0)
+    leaving[water <= 0] = 0
+    leaving *= sediment
+    water_flows = _proportional(drops, outflow)
+    sediment_flows = _proportional(drops, leaving, out=drops)
+    water -= outflow
+    sediment -= leaving
+    _spread(water, water_flows)
+    _spread(sediment, sediment_flows)
+    water *= 1 - evaporation
+
+
+def _run_steps(step, state, iterations, params):
+    """Worker: ``iterations`` passos de ``step`` num tile (com halo)"""
+    for _ in range(iterations):
+        step(state, *params)
+    return state
+
+
+def simulate(step, state, iterations, params, executor=None, tile=512, exchange=8):
+    """Roda ``iterations`` passos de ``step`` sobre ``state`` (canais, H, W).
+
+    Com ``executor`` o mapa é dividido em tiles de ``tile`` pixels que rodam
+    em paralelo ``exchange`` iterações de cada vez, com halo de
+    ``RADIUS * exchange`` pixels; o resultado é o mesmo do mapa inteiro.
+    """
+    _, height, width = state.shape
+    if executor is None or (height <= tile and width <= tile):
+        return _run_steps(step, state, iterations, params)
+    done = 0
+    while done < iterations:
+        count = min(exchange, iterations - done)
+        halo = RADIUS * count
+        tiles = []
+        for y0 in range(0, height, tile):
+            for x0 in range(0, width, tile):
+                y1, x1 = min(y0 + tile, height), min(x0 + tile, width)
+                top, left = max(y0 - halo, 0), max(x0 - halo, 0)
+                bottom, right = min(y1 + halo, height), min(x1 + halo, width)
+                future = executor.submit(_run_steps, step, state[:, top:bottom, left:right].copy(),
+                                         count, params)
+                tiles.append((future, y0, y1, x0, x1, top, left))
+        # Os tiles leem o estado antigo; o novo é montado à parte
+        new_state = np.empty_like(state)
+        for future, y0, y1, x0, x1, top, left in tiles:
+            new_state[:, y0:y1, x0:x1] = future.result()[:, y0 - top:y1 - top, x0 - left:x1 - left]
+        state = new_state
+        done += count
+    return state
+
+
+class Erosion:
+    """Parâmetros da erosão aplicada depois do ruído e antes da cor"""
+
+    def __init__(self, thermal_iterations=30, hydraulic_iterations=30, talus=0.012,
+                 thermal_rate=0.5, rain=0.002, capacity=4.0, erosion_rate=0.3,
+                 deposition_rate=0.3, evaporation=0.05):
+        self.thermal_iterations = thermal_iterations
+        self.hydraulic_iterations = hydraulic_iterations
+        self.talus = talus
+        self.thermal_rate = thermal_rate
+        self.rain = rain
+        self.capacity = capacity
+        self.erosion_rate = erosion_rate
+        self.deposition_rate = deposition_rate
+        self.evaporation = evaporation
+
+    def key(self):
+        """Tudo de que o resultado depende"""
+        return (self.thermal_iterations, self.hydraulic_iterations, self.talus, self.thermal_rate,
+                self.rain, self.capacity, self.erosion_rate, self.deposition_rate, self.evaporation)
+
+    @property
+    def margin(self):
+        """Pixels em volta de uma região que influenciam o resultado dentro dela"""
+        return RADIUS * (self.thermal_iterations + self.hydraulic_iterations)
+
+    def apply(self, height_map, spacing=1.0, executor=None, tile=512, exchange=8):
+        """Heightmap erodido (novo array do mesmo tipo).
+
+        ``spacing`` é a distância entre amostras em pixels do mundo: o
+        ``talus`` é uma inclinação por pixel, então cresce junto com ela.
+        """
+        state = height_map[np.newaxis].copy()
+        state = simulate(thermal_step, state, self.thermal_iterations,
+                         (self.talus * spacing, self.thermal_rate), executor, tile, exchange)
+        state = np.concatenate([state, np.zeros((2,) + height_map.shape, dtype=state.dtype)])
+        state = simulate(hydraulic_step, state, self.hydraulic_iterations,
+                         (self.rain, self.capacity, self.erosion_rate, self.deposition_rate,
+                          self.evaporation), executor, tile, exchange)
+        # O sedimento ainda em suspensão se deposita onde está
+        return state[0] + state[2]
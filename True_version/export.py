@@ -0,0 +1,371 @@
+"""Exportação do terreno para motores de jogo, em faixas de tiles.
+
+Gera numa pasta:
+    heightmap.png        alturas em PNG de 16 bits, tons de cinza
+    normals.png          normal map (espaço tangente, convenção OpenGL)
+    tiles/lod<L>/tile_<tx>_<ty>.glb / .obj
+                         malha de cada tile em cada nível de detalhe
+    export.json          tamanhos, escalas e nomes dos arquivos
+
+Exemplo:
+    python export.py mundo --width 16384 --height 16384 --tile 256 --lods 4
+
+O mundo é percorrido de cima para baixo, uma faixa de ``--tile`` linhas por
+vez: as imagens recebem as linhas da faixa e os tiles dela viram malhas. A
+memória depende só da largura e de ``--tile``. Os buffers (vértices, normais,
+índices e até o texto do OBJ) saem direto dos arrays, sem laço por vértice.
+
+Nas malhas o eixo Y é a altura (``--height-scale`` unidades de -1 a 1), X é o
+x do mundo e -Z o y do mundo, em ``--cell-size`` unidades por pixel. Tiles
+vizinhos dividem a linha de vértices da borda, então se encaixam; no nível
+de detalhe L cada vértice pula ``2 ** L`` pixels.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from heightstore import BORDER, heightmap_size, open_heightmap
+from parallel import ParallelGenerator
+from pngstream import PNGWriter
+from render import add_noise_arguments, check_noise_arguments, noise_arguments
+
+MESH_FORMATS = ('glb', 'obj')
+
+# Tipos de componente e alvos de buffer do glTF
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Export heightmap, normal map and tiled meshes.")
+    parser.add_argument('output', help="output directory")
+    add_noise_arguments(parser)
+    parser.add_argument('--heightmap', metavar='PATH',
+                        help="export a saved .npy heightmap instead of generating one "
+                             "(its size replaces --width/--height)")
+    parser.add_argument('--tile', type=int, default=256, help="tile size in pixels")
+    parser.add_argument('--lods', type=int, default=3, help="levels of detail per tile")
+    parser.add_argument('--meshes', nargs='*', choices=MESH_FORMATS, default=['glb'],
+                        help="mesh formats to write (none for images only)")
+    parser.add_argument('--cell-size', type=float, default=1.0, help="world units per pixel")
+    parser.add_argument('--height-scale', type=float, default=100.0,
+                        help="world units from height -1 to 1")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def generated_rows(args, generator):
+    """Função (y, linhas) -> alturas dessas linhas do mundo, com uma coluna a
+    mais à esquerda e duas à direita (borda das normais e último vértice)"""
+    fbm, noise_args, seed_kwargs = noise_arguments(args)
+
+    def rows(y, count):
+        return generator.heightmap(fbm, args.width + 3, count, *noise_args, x0=args.x0 - 1, y0=y,
+                                   **seed_kwargs)
+    return rows
+
+
+def stored_rows(height_map):
+    """Como ``generated_rows``, lendo um heightmap salvo; além da borda do
+    arquivo repete a última linha ou coluna"""
+    height, width = height_map.shape
+    columns = np.clip(np.arange(-1, width - 2 * BORDER + 2) + BORDER, 0, width - 1)
+
+    def rows(y, count):
+        lines = np.clip(np.arange(y, y + count) + BORDER, 0, height - 1)
+        # Só as linhas pedidas saem do arquivo
+        return np.asarray(height_map[lines])[:, columns]
+    return rows
+
+
+def encode_heights(heights):
+    """Alturas de -1 a 1 em uint16 (0 a 65535)"""
+    values = np.clip(heights, -1.0, 1.0).astype(np.float64)
+    values += 1.0
+    values *= 65535 / 2.0
+    return np.rint(values).astype(np.uint16)
+
+
+def gradients(halo, height_scale, cell_size):
+    """Inclinação (dY/dx, dY/dy) nos pixels internos de ``halo``, em unidades do mundo"""
+    halo = np.asarray(halo, dtype=np.float64)
+    factor = height_scale / 2.0 / (2.0 * cell_size)
+    slope_x = halo[1:-1, 2:] - halo[1:-1, :-2]
+    slope_x *= factor
+    slope_y = halo[2:, 1:-1] - halo[:-2, 1:-1]
+    slope_y *= factor
+    return slope_x, slope_y
+
+
+def encode_normals(slope_x, slope_y):
+    """Normal map RGB (uint8) no espaço tangente: x para a direita, y para cima"""
+    normals = np.empty(slope_x.shape + (3,), dtype=np.float64)
+    np.negative(slope_x, out=normals[..., 0])
+    np.negative(slope_y, out=normals[..., 1])
+    normals[..., 2] = 1.0
+    normals /= np.sqrt(np.square(normals).sum(axis=-1, keepdims=True))
+    normals += 1.0
+    normals *= 255 / 2.0
+    return np.rint(normals).astype(np.uint8)
+
+
+@lru_cache(maxsize=8)
+def grid_triangles(size):
+    """Índices (2 * (size - 1)², 3) dos triângulos de uma grade size x size,
+    no sentido anti-horário visto de cima"""
+    index = np.arange(size * size, dtype=np.uint32).reshape(size, size)
+    a, b = index[:-1, :-1], index[:-1, 1:]
+    c, d = index[1:, :-1], index[1:, 1:]
+    triangles = np.stack([np.stack([a, b, c], axis=-1), np.stack([b, d, c], axis=-1)], axis=2)
+    triangles = triangles.reshape(-1, 3)
+    if size * size <= 65536:
+        triangles = triangles.astype(np.uint16)
+    return triangles
+
+
+def tile_mesh(heights, slope_x, slope_y, x, y, step, args):
+    """Vértices (N, 3), normais (N, 3), coordenadas de textura (N, 2) e
+    triângulos de um tile, com as amostras de ``heights`` a cada ``step``.
+
+    ``heights`` e as inclinações cobrem o tile com o último vértice; (x, y) é
+    o pixel do mundo do primeiro vértice, relativo ao início da exportação.
+    """
+    heights = heights[::step, ::step]
+    size = heights.shape[0]
+    rows, columns = np.indices(heights.shape, dtype=np.float64) * step
+    positions = np.empty(heights.shape + (3,), dtype=np.float32)
+    positions[..., 0] = (columns + x) * args.cell_size
+    positions[..., 1] = heights * (args.height_scale / 2.0)
+    positions[..., 2] = -(rows + y) * args.cell_size
+
+    normals = np.empty(heights.shape + (3,), dtype=np.float64)
+    np.negative(slope_x[::step, ::step], out=normals[..., 0])
+    normals[..., 1] = 1.0
+    # -Z é o y do mundo
+    normals[..., 2] = slope_y[::step, ::step]
+    normals /= np.sqrt(np.square(normals).sum(axis=-1, keepdims=True))
+
+    # As imagens têm a linha 0 em cima, no maior y do mundo
+    uv = np.empty(heights.shape + (2,), dtype=np.float32)
+    uv[..., 0] = (columns + x + 0.5) / args.width
+    uv[..., 1] = 1.0 - (rows + y + 0.5) / args.height
+    return (positions.reshape(-1, 3), normals.astype(np.float32).reshape(-1, 3),
+            uv.reshape(-1, 2), grid_triangles(size))
+
+
+def write_glb(path, positions, normals, uv, triangles):
+    """Malha num glTF binário (.glb): JSON e um buffer com os arrays como estão"""
+    arrays = [positions, normals, uv, triangles]
+    views = []
+    offset = 0
+    for array in arrays:
+        views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': array.nbytes,
+                      'target': ELEMENT_ARRAY_BUFFER if array is triangles else ARRAY_BUFFER})
+        # Cada bloco começa alinhado a 4 bytes
+        offset += (array.nbytes + 3) // 4 * 4
+    index_type = UNSIGNED_SHORT if triangles.dtype == np.uint16 else UNSIGNED_INT
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'Procedural-Terrain export.py'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{
+            'attributes': {'POSITION': 0, 'NORMAL': 1, 'TEXCOORD_0': 2},
+            'indices': 3,
+            'mode': 4,
+        }]}],
+        'accessors': [
+            {'bufferView': 0, 'componentType': FLOAT, 'count': len(positions), 'type': 'VEC3',
+             'min': positions.min(axis=0).tolist(), 'max': positions.max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': FLOAT, 'count': len(normals), 'type': 'VEC3'},
+            {'bufferView': 2, 'componentType': FLOAT, 'count': len(uv), 'type': 'VEC2'},
+            {'bufferView': 3, 'componentType': index_type, 'count': triangles.size,
+             'type': 'SCALAR'},
+        ],
+        'bufferViews': views,
+        'buffers': [{'byteLength': offset}],
+    }
+    header = json.dumps(gltf, separators=(',', ':')).encode()
+    header += b' ' * (-len(header) % 4)
+    with open(path, 'wb') as file:
+        file.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(header) + 8 + offset))
+        file.write(struct.pack('<I4s', len(header), b'JSON'))
+        file.write(header)
+        file.write(struct.pack('<I4s', offset, b'BIN\x00'))
+        for array in arrays:
+            # O glTF é little-endian
+            data = array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+            file.write(data)
+            file.write(b'\x00' * (-len(data) % 4))
+
+
+def ascii_numbers(values, decimals=0):
+    """Texto de cada valor em ponto fixo, com sinal e zeros à esquerda, como
+    colunas de bytes (N, largura) que todas as linhas compartilham"""
+    values = np.asarray(values)
+    scaled = np.rint(np.abs(values.astype(np.float64)) * 10 ** decimals).astype(np.int64)
+    digits = max(len(str(int(scaled.max(initial=0)))), decimals + 1)
+    width = 1 + digits + (1 if decimals else 0)
+    text = np.empty((len(values), width), dtype=np.uint8)
+    text[:, 0] = np.where(values < 0, ord('-'), ord('+'))
+    position = width - 1
+    for digit in range(digits):
+        if decimals and digit == decimals:
+            text[:, position] = ord('.')
+            position -= 1
+        text[:, position] = scaled % 10
+        text[:, position] += ord('0')
+        scaled //= 10
+        position -= 1
+    return text
+
+
+def ascii_lines(prefix, columns):
+    """Linhas ``prefix c0 c1 ...`` montadas das colunas de ``ascii_numbers``"""
+    count = len(columns[0])
+    parts = [np.broadcast_to(np.frombuffer(prefix.encode(), dtype=np.uint8), (count, len(prefix)))]
+    space = np.broadcast_to(np.frombuffer(b' ', dtype=np.uint8), (count, 1))
+    for column in columns:
+        parts += [space, column]
+    parts.append(np.broadcast_to(np.frombuffer(b'\n', dtype=np.uint8), (count, 1)))
+    return np.concatenate(parts, axis=1).tobytes()
+
+
+def write_obj(path, positions, normals, uv, triangles):
+    """Malha em Wavefront OBJ; o texto é montado como bytes a partir dos arrays"""
+    faces = triangles.astype(np.int64) + 1
+    with open(path, 'wb') as file:
+        file.write(b'# Procedural-Terrain export.py\n')
+        file.write(ascii_lines('v', [ascii_numbers(positions[:, axis], 4) for axis in range(3)]))
+        # No OBJ o v = 0 é a base da imagem; no glTF, o topo
+        file.write(ascii_lines('vt', [ascii_numbers(uv[:, 0], 6), ascii_numbers(1.0 - uv[:, 1], 6)]))
+        file.write(ascii_lines('vn', [ascii_numbers(normals[:, axis], 6) for axis in range(3)]))
+        # Cada canto usa o mesmo índice para posição, textura e normal
+        corners = []
+        for corner in range(3):
+            index = ascii_numbers(faces[:, corner])[:, 1:]
+            slash = np.full((len(faces), 1), ord('/'), dtype=np.uint8)
+            corners.append(np.concatenate([index, slash, index, slash, index], axis=1))
+        file.write(ascii_lines('f', corners))
+
+
+WRITERS = {'glb': write_glb, 'obj': write_obj}
+
+
+def tile_path(output, lod, tile_x, tile_y, mesh_format):
+    return os.path.join(output, 'tiles', f'lod{lod}', f'tile_{tile_x}_{tile_y}.{mesh_format}')
+
+
+def check_tiling(args):
+    """ValueError se o mapa não se divide em tiles de ``--tile`` com ``--lods`` níveis"""
+    tile = args.tile
+    if tile < 1:
+        raise ValueError(f"Expected a positive tile size, got {tile}")
+    if args.width % tile or args.height % tile:
+        raise ValueError(f"Expected width and height that are multiples of the tile size {tile}, "
+                         f"got {args.width}x{args.height}")
+    if args.lods < 1:
+        raise ValueError(f"Expected at least 1 level of detail, got {args.lods}")
+    if tile % 2 ** (args.lods - 1):
+        raise ValueError(f"Expected a tile size divisible by {2 ** (args.lods - 1)} "
+                         f"for {args.lods} levels of detail, got {tile}")
+
+
+def export(args, rows):
+    """Escreve imagens e malhas faixa a faixa; devolve o manifesto"""
+    check_tiling(args)
+    tile = args.tile
+    for lod in range(args.lods):
+        os.makedirs(os.path.join(args.output, 'tiles', f'lod{lod}'), exist_ok=True)
+    tiles_x, tiles_y = args.width // tile, args.height // tile
+    heightmap_writer = PNGWriter(os.path.join(args.output, 'heightmap.png'), args.width, args.height,
+                                 channels=1, bit_depth=16)
+    normal_writer = PNGWriter(os.path.join(args.output, 'normals.png'), args.width, args.height)
+    start = time.perf_counter()
+    with heightmap_writer, normal_writer:
+        # De cima para baixo, a ordem das linhas nas imagens
+        for tile_y in reversed(range(tiles_y)):
+            y = tile_y * tile
+            # Linhas do tile mais o último vértice, com uma de borda de cada lado
+            halo = rows(args.y0 + y - 1, tile + 3)
+            slope_x, slope_y = gradients(halo, args.height_scale, args.cell_size)
+            inner = halo[1:-1, 1:-1]
+            heightmap_writer.write_rows(encode_heights(inner[tile - 1::-1, :args.width]))
+            normal_writer.write_rows(encode_normals(slope_x[tile - 1::-1, :args.width],
+                                                    slope_y[tile - 1::-1, :args.width]))
+            for tile_x in range(tiles_x if args.meshes else 0):
+                x = tile_x * tile
+                area = (slice(None), slice(x, x + tile + 1))
+                for lod in range(args.lods):
+                    mesh = tile_mesh(inner[area], slope_x[area], slope_y[area], x, y, 2 ** lod,
+                                     args)
+                    for mesh_format in args.meshes:
+                        WRITERS[mesh_format](tile_path(args.output, lod, tile_x, tile_y,
+                                                       mesh_format), *mesh)
+            if not args.quiet:
+                done = (tiles_y - tile_y) * tile * args.width
+                elapsed = time.perf_counter() - start
+                print(f"\r{done / (args.width * args.height):6.1%}  "
+                      f"{done / elapsed / 1e6:8.2f} Mpx/s", end='', file=sys.stderr, flush=True)
+
+    manifest = {
+        'width': args.width,
+        'height': args.height,
+        'tile': tile,
+        'tiles': [tiles_x, tiles_y],
+        'lods': args.lods,
+        'cell_size': args.cell_size,
+        'height_scale': args.height_scale,
+        # height = valor / 65535 * 2 - 1; a linha 0 da imagem é o maior y
+        'heightmap': 'heightmap.png',
+        'normal_map': 'normals.png',
+        'meshes': {mesh_format: os.path.relpath(tile_path(args.output, '{lod}', '{x}', '{y}',
+                                                          mesh_format), args.output)
+                   for mesh_format in args.meshes},
+    }
+    with open(os.path.join(args.output, 'export.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_noise_arguments(parser, args)
+    if args.heightmap:
+        height_map = open_heightmap(args.heightmap)
+        args.width, args.height = heightmap_size(height_map)
+        args.y0 = 0
+    try:
+        check_tiling(args)
+    except ValueError as error:
+        parser.error(str(error))
+    os.makedirs(args.output, exist_ok=True)
+    generator = ParallelGenerator(workers=args.workers, band_rows=None)
+    if args.heightmap:
+        rows = stored_rows(height_map)
+    else:
+        rows = generated_rows(args, generator)
+    start = time.perf_counter()
+    try:
+        export(args, rows)
+    finally:
+        generator.shutdown()
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"\n{args.width}x{args.height} in {elapsed:.1f}s -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
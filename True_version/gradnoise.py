@@ -0,0 +1,297 @@
+"""Ruído de gradiente Perlin e OpenSimplex em 2D e 3D, só com NumPy.
+
+Diferente das funções de ``heightmap``, que reproduzem bit a bit o
+``pnoise2`` e o ``opensimplex.noise2`` usados pelas versões antigas, estas
+aceitam qualquer seed de 64 bits, calculam em float32 ou float64 e recebem
+arrays de coordenadas de qualquer forma (com broadcasting entre elas).
+
+As tabelas e constantes são as de ``heightmap``, mas os kernels não podem
+ser os mesmos: os de lá seguem a ordem das contas em float32 do C (e o
+``repeat`` e a leitura além da permutação do ``pnoise2``) para o fBm, o
+cache em disco e as comparações com a referência darem os mesmos bits. Aqui
+as contas são reorganizadas por eixo, o que muda o arredondamento.
+"""
+import itertools
+from functools import lru_cache
+
+import numpy as np
+
+from heightmap import (GRAD3, GRADIENTS2, NORM_CONSTANT2, PERM, SQUISH_CONSTANT2,
+                       STRETCH_CONSTANT2, opensimplex_perm)
+
+# Constantes do OpenSimplex por dimensão: estica a grade, desfaz o esticamento
+# e normaliza o resultado para [-1, 1]
+STRETCH = {2: STRETCH_CONSTANT2, 3: -1.0 / 6}
+SQUISH = {2: SQUISH_CONSTANT2, 3: 1.0 / 3}
+NORM = {2: NORM_CONSTANT2, 3: 103}
+
+GRADIENTS3 = np.array([
+    -11, 4, 4, -4, 11, 4, -4, 4, 11,
+    11, 4, 4, 4, 11, 4, 4, 4, 11,
+    -11, -4, 4, -4, -11, 4, -4, -4, 11,
+    11, -4, 4, 4, -11, 4, 4, -4, 11,
+    -11, 4, -4, -4, 11, -4, -4, 4, -11,
+    11, 4, -4, 4, 11, -4, 4, 4, -11,
+    -11, -4, -4, -4, -11, -4, -4, -4, -11,
+    11, -4, -4, 4, -11, -4, 4, -4, -11,
+]).reshape(-1, 3)
+
+# Vértices da grade esticada, relativos à célula do ponto, que podem ficar a
+# menos do raio do kernel (atenuação 2 - d² > 0). Somar todos eles dá o mesmo
+# valor que os ramos do algoritmo original, sem nenhum ``if`` por ponto.
+OFFSETS = {
+    2: [(-1, 1), (0, 0), (0, 1), (0, 2), (1, -1), (1, 0), (1, 1), (2, 0)],
+    3: [(-1, 0, 1), (-1, 1, 0), (-1, 1, 1), (0, -1, 1), (0, 0, 0), (0, 0, 1), (0, 0, 2),
+        (0, 1, -1), (0, 1, 0), (0, 1, 1), (0, 1, 2), (0, 2, 0), (0, 2, 1), (1, -1, 0),
+        (1, -1, 1), (1, 0, -1), (1, 0, 0), (1, 0, 1), (1, 0, 2), (1, 1, -1), (1, 1, 0),
+        (1, 1, 1), (1, 2, 0), (2, 0, 0), (2, 0, 1), (2, 1, 0)],
+}
+
+
+def check_seed(seed):
+    """A seed como int do Python, que precisa caber em 64 bits com sinal"""
+    seed = int(seed)
+    if not -2 ** 63 <= seed < 2 ** 63:
+        raise ValueError(f"Expected a 64-bit seed, got {seed}")
+    return seed
+
+
+@lru_cache(maxsize=16)
+def perlin_tables(seed, dims, dtype):
+    """Permutação (512 entradas) e o gradiente do último hash de cada índice i.
+
+    Em 3D o gradiente é o de ``perm[i]``; em 2D, como o ``pnoise2`` passa o
+    hash mais uma vez pela permutação, o de ``perm[perm[i]]``. Com ``seed``
+    None é a permutação de referência do Perlin, a mesma do
+    ``pnoise2``/``pnoise3``; senão é embaralhada a partir da seed.
+    """
+    if seed is None:
+        base = PERM[:256]
+    else:
+        base = opensimplex_perm(check_seed(seed))
+    perm = np.concatenate([base, base]).astype(np.intp)
+    hashes = perm[perm] if dims == 2 else perm
+    return perm, GRAD3[hashes & 15, :dims].T.astype(dtype)
+
+
+@lru_cache(maxsize=16)
+def opensimplex_tables(seed, dims, dtype):
+    """Permutação da seed e o gradiente de ``perm[i]`` para cada índice i, por dimensão"""
+    perm = opensimplex_perm(check_seed(seed)).astype(np.intp)
+    if dims == 2:
+        gradients = GRADIENTS2.reshape(-1, 2)[(perm & 0x0E) // 2]
+    else:
+        gradients = GRADIENTS3[perm % len(GRADIENTS3)]
+    return perm, gradients.T.astype(dtype)
+
+
+def _coordinates(x, y, z, dtype):
+    coords = [x, y] if z is None else [x, y, z]
+    return [np.asarray(c, dtype=dtype) for c in coords]
+
+
+def _perlin_axis(c):
+    """Célula (0 a 255), posição dentro dela e curva de suavização de cada coordenada"""
+    floor = np.floor(c)
+    t = c - floor
+    return floor.astype(np.intp) & 255, t, t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _is_grid(coords):
+    """Se as coordenadas são uma linha de x (1, W), uma coluna de y (H, 1) e
+    um z único, como nas grades do fBm"""
+    x, y = coords[:2]
+    return (x.ndim == 2 and x.shape[0] == 1 and y.ndim == 2 and y.shape[1] == 1
+            and (len(coords) == 2 or coords[2].size == 1))
+
+
+def _perlin_grid(perm, gradients, coords, out):
+    """Ruído de Perlin numa grade de ``_is_grid``, separado por eixo.
+
+    Com z único a interpolação em z entra nas tabelas de gradiente (por
+    índice do hash de x e y), então o 3D custa o mesmo que o 2D. Numa célula
+    de linhas fixa a interpolação em x não depende de y: tudo é calculado uma
+    vez por (célula de linhas, coluna), e o valor em cada linha é
+    ``S0 + ty * T0 + vy * E + vy * ty * F``. Por pixel sobram quatro cópias
+    de linha e três multiplicações com soma.
+    """
+    x, y = coords[0][0], coords[1][:, 0]
+    ix, tx, ux = _perlin_axis(x)
+    iy, ty, vy = _perlin_axis(y)
+    gx, gy = gradients[:2]
+    constant = None
+    if len(coords) == 3:
+        # Hash de x e y k -> gradientes de perm[k] + iz e perm[k] + iz + 1
+        iz, tz, wz = _perlin_axis(coords[2].reshape(()))
+        g0 = gradients[:, perm + iz]
+        g1 = gradients[:, perm + iz + 1]
+        gx = g0[0] + wz * (g1[0] - g0[0])
+        gy = g0[1] + wz * (g1[1] - g0[1])
+        constant = g0[2] * tz + wz * (g1[2] * (tz - 1) - g0[2] * tz)
+    # Só as células de linhas que aparecem; cada linha aponta para a sua
+    cells, row_cell = np.unique(iy, return_inverse=True)
+    # Hash dos cantos de baixo; os de cima (y + 1) usam as tabelas deslocadas
+    hashes = [perm[ix + corner][np.newaxis, :] + cells[:, np.newaxis] for corner in (0, 1)]
+    sums = []
+    for dy in (0, 1):
+        lows = []
+        slopes = []
+        for corner, h in enumerate(hashes):
+            # Termo de x (mais o de z) e o coeficiente de ty do canto
+            low = np.take(gx[dy:], h)
+            low *= tx - corner
+            if constant is not None:
+                low += np.take(constant[dy:], h)
+            lows.append(low)
+            slopes.append(np.take(gy[dy:], h))
+        for low, high in (lows, slopes):
+            high -= low
+            high *= ux
+            low += high
+        sums.append((lows[0], slopes[0]))
+    # lerp(vy, S0 + ty * T0, S1 + (ty - 1) * T1) separado nos termos por linha
+    (s0, t0), (s1, t1) = sums
+    e = s1 - s0
+    e -= t1
+    f = t1 - t0
+    ty = ty[:, np.newaxis]
+    vy = vy[:, np.newaxis]
+    if out is None:
+        out = np.empty((len(y), len(x)), dtype=x.dtype)
+    np.take(s0, row_cell, axis=0, out=out, mode='clip')
+    row = np.empty_like(out)
+    for table, weight in ((t0, ty), (e, vy), (f, vy * ty)):
+        np.take(table, row_cell, axis=0, out=row, mode='clip')
+        row *= weight
+        out += row
+    return out
+
+
+def perlin_noise(x, y, z=None, seed=None, dtype=np.float64, out=None):
+    """Ruído de Perlin 2D (ou 3D, com ``z``) nas coordenadas dadas.
+
+    Com ``seed`` None e coordenadas em [0, 1024) o resultado é o do
+    ``pnoise2``/``pnoise3`` com uma octave (a menos da precisão). ``out``
+    recebe o resultado. Numa grade (x numa linha, y numa coluna e z único) o
+    trabalho é separado por eixo; com outros arrays cada ponto é calculado
+    por inteiro.
+    """
+    dtype = np.dtype(dtype)
+    coords = _coordinates(x, y, z, dtype)
+    perm, gradients = perlin_tables(seed, len(coords), dtype)
+    if _is_grid(coords):
+        return _perlin_grid(perm, gradients, coords, out)
+    cells = []
+    fractions = []
+    fades = []
+    for c in coords:
+        cell, t, fade = _perlin_axis(c)
+        cells.append(cell)
+        fractions.append(t)
+        fades.append(fade)
+
+    # Produto escalar do gradiente de cada canto com a distância até ele
+    values = []
+    for corner in itertools.product((0, 1), repeat=len(coords)):
+        # O último passo do hash já cai na tabela de gradientes
+        h = cells[0] + corner[0]
+        for cell, offset in zip(cells[1:], corner[1:]):
+            h = perm[h] + cell + offset
+        value = gradients[0][h] * (fractions[0] - corner[0])
+        for axis in range(1, len(coords)):
+            value = value + gradients[axis][h] * (fractions[axis] - corner[axis])
+        values.append(value)
+
+    # Interpola os cantos eixo a eixo, do último para o primeiro
+    for fade in reversed(fades[1:]):
+        values = [low + fade * (high - low) for low, high in zip(values[0::2], values[1::2])]
+    low, high = values
+    if out is None:
+        return low + fades[0] * (high - low)
+    np.subtract(high, low, out=out)
+    out *= fades[0]
+    out += low
+    return out
+
+
+def opensimplex_noise(x, y, z=None, seed=0, dtype=np.float64, out=None):
+    """Ruído OpenSimplex 2D (ou 3D, com ``z``) nas coordenadas dadas.
+
+    Com a mesma seed segue o ``OpenSimplex(seed).noise2`` do pacote
+    ``opensimplex`` (a menos do arredondamento). Em 3D a diferença para o
+    ``noise3`` chega a ~1e-4: o original deixa de fora alguns vértices na borda
+    do kernel, que aqui entram e deixam o ruído contínuo. ``out`` recebe o
+    resultado.
+    """
+    dtype = np.dtype(dtype)
+    coords = _coordinates(x, y, z, dtype)
+    dims = len(coords)
+    perm, gradients = opensimplex_tables(seed, dims, dtype)
+    shape = np.broadcast_shapes(*(c.shape for c in coords))
+    # Pelo menos 1D, para as contas in-place funcionarem também com escalares
+    coords = [np.atleast_1d(c) for c in np.broadcast_arrays(*coords)]
+
+    # Célula da grade esticada e a posição do ponto relativa a ela
+    stretch = sum(coords) * STRETCH[dims]
+    cells = [np.floor(c + stretch) for c in coords]
+    squish = sum(cells) * SQUISH[dims]
+    deltas = [c - (cell + squish) for c, cell in zip(coords, cells)]
+    cells = [cell.astype(np.intp) for cell in cells]
+
+    if out is None:
+        value = np.zeros(coords[0].shape, dtype=dtype)
+    else:
+        value = out.reshape(coords[0].shape)
+        value[...] = 0
+    for offset in OFFSETS[dims]:
+        shift = sum(offset) * SQUISH[dims]
+        d = [delta - (o + shift) for delta, o in zip(deltas, offset)]
+        attn = 2 - sum(component * component for component in d)
+        np.maximum(attn, 0, out=attn)
+        attn *= attn
+        attn *= attn
+        h = (cells[0] + offset[0]) & 0xFF
+        for cell, o in zip(cells[1:], offset[1:]):
+            h = (perm[h] + cell + o) & 0xFF
+        extrapolated = sum(gradients[axis][h] * d[axis] for axis in range(dims))
+        value += attn * extrapolated
+    value /= NORM[dims]
+    return value.reshape(shape) if out is None else out
+
+
+def fbm_noise(noise, x, y, z, octaves, persistence, lacunarity, seed=None, dtype=np.float32,
+              detail_octaves=None, out=None, layer=None):
+    """Soma de octaves de ``noise`` (``perlin_noise`` ou ``opensimplex_noise``).
+
+    Normaliza como ``fbm_perlin``: com ``detail_octaves`` só as primeiras
+    octaves são somadas, mas a divisão continua sendo pela soma de todas as
+    amplitudes. ``out`` recebe o resultado e ``layer`` (da mesma forma) cada
+    octave antes da soma, para reaproveitar os buffers.
+    """
+    if octaves < 1:
+        raise ValueError("Expected octaves value > 0")
+    if detail_octaves is None:
+        detail_octaves = octaves
+    x, y, z = (np.asarray(c, dtype=dtype) for c in (x, y, z))
+    shape = np.broadcast_shapes(x.shape, y.shape, z.shape)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"Expected an output of shape {shape}, got {out.shape}")
+    if layer is not None and layer.shape != shape:
+        raise ValueError(f"Expected a layer buffer of shape {shape}, got {layer.shape}")
+    out[...] = 0
+    frequency = 1.0
+    amplitude = 1.0
+    max_amplitude = 0.0
+    for octave in range(octaves):
+        if octave < detail_octaves:
+            layer = noise(x * frequency, y * frequency, z * frequency, seed=seed, dtype=dtype,
+                          out=layer)
+            layer *= amplitude
+            out += layer
+        max_amplitude += amplitude
+        amplitude *= persistence
+        frequency *= lacunarity
+    out /= max_amplitude
+    return out
@@ -0,0 +1,368 @@
+"""Motor de heightmap sem dependência do Kivy.
+
+Calcula grades inteiras de fBm (Perlin ou OpenSimplex) como arrays NumPy,
+reproduzindo os resultados de ``noise.pnoise2`` e ``opensimplex.noise2``.
+"""
+import numpy as np
+
+# Tabelas do módulo C ``noise`` (_noise.h)
+_PERM_BASE = [
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140,
+    36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120,
+    234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177, 33,
+    88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133,
+    230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161,
+    1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130,
+    116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227,
+    47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44,
+    154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98,
+    108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14,
+    239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121,
+    50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243,
+    141, 128, 195, 78, 66, 215, 61, 156, 180,
+]
+
+GRAD3 = np.array([
+    [1, 1, 0], [-1, 1, 0], [1, -1, 0], [-1, -1, 0],
+    [1, 0, 1], [-1, 0, 1], [1, 0, -1], [-1, 0, -1],
+    [0, 1, 1], [0, -1, 1], [0, 1, -1], [0, -1, -1],
+    [1, 0, -1], [-1, 0, -1], [0, -1, 1], [0, 1, 1]], dtype=np.float64)
+
+GRAD4 = np.array([
+    [0, 1, 1, 1], [0, 1, 1, -1], [0, 1, -1, 1], [0, 1, -1, -1],
+    [0, -1, 1, 1], [0, -1, 1, -1], [0, -1, -1, 1], [0, -1, -1, -1],
+    [1, 0, 1, 1], [1, 0, 1, -1], [1, 0, -1, 1], [1, 0, -1, -1],
+    [-1, 0, 1, 1], [-1, 0, 1, -1], [-1, 0, -1, 1], [-1, 0, -1, -1],
+    [1, 1, 0, 1], [1, 1, 0, -1], [1, -1, 0, 1], [1, -1, 0, -1],
+    [-1, 1, 0, 1], [-1, 1, 0, -1], [-1, -1, 0, 1], [-1, -1, 0, -1],
+    [1, 1, 1, 0], [1, 1, -1, 0], [1, -1, 1, 0], [1, -1, -1, 0],
+    [-1, 1, 1, 0], [-1, 1, -1, 0], [-1, -1, 1, 0], [-1, -1, -1, 0]], dtype=np.float32)
+
+# Com base > 0 o pnoise2 lê além do fim de PERM, nos bytes de GRAD4 que o
+# compilador coloca logo em seguida. Anexamos esses bytes para reproduzir
+# exatamente o mesmo hash.
+PERM = np.concatenate([
+    np.array(_PERM_BASE * 2, dtype=np.intp),
+    np.frombuffer(GRAD4.astype('<f4').tobytes(), dtype=np.uint8).astype(np.intp),
+])
+
+# Componentes do gradiente de cada entrada de PERM, para evitar um segundo
+# acesso indireto em grad2
+_PERM_GX = GRAD3[PERM & 15, 0].astype(np.float32)
+_PERM_GY = GRAD3[PERM & 15, 1].astype(np.float32)
+
+# Constantes do OpenSimplex (pacote ``opensimplex``)
+STRETCH_CONSTANT2 = -0.211324865405187
+SQUISH_CONSTANT2 = 0.366025403784439
+NORM_CONSTANT2 = 47
+GRADIENTS2 = np.array([
+    5, 2, 2, 5,
+    -5, 2, -2, 5,
+    5, -2, 2, -5,
+    -5, -2, -2, -5,
+], dtype=np.float64)
+
+
+def perlin2(x, y, repeatx=1024.0, repeaty=1024.0, base=0):
+    """Ruído de Perlin 2D sobre arrays, equivalente ao ``noise2`` do módulo C.
+
+    As contas são feitas em float32, como no C, então o resultado é idêntico.
+    ``x`` e ``y`` seguem as regras de broadcasting do NumPy: passar uma linha
+    (1, W) e uma coluna (H, 1) calcula a grade inteira fazendo o trabalho
+    por eixo só uma vez.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+
+    i = np.floor(np.fmod(x, np.float32(repeatx))).astype(np.intp)
+    j = np.floor(np.fmod(y, np.float32(repeaty))).astype(np.intp)
+    ii = np.fmod(i + 1, repeatx).astype(np.intp)
+    jj = np.fmod(j + 1, repeaty).astype(np.intp)
+    i = (i & 255) + base
+    j = (j & 255) + base
+    ii = (ii & 255) + base
+    jj = (jj & 255) + base
+
+    x = x - np.floor(x)
+    y = y - np.floor(y)
+    x1 = x - 1
+    y1 = y - 1
+    fx = x * x * x * (x * (x * 6 - 15) + 10)
+    fy = y * y * y * (y * (y * 6 - 15) + 10)
+
+    A = PERM[i]
+    B = PERM[ii]
+
+    def grad2(h, gx, gy):
+        value = _PERM_GX[h]
+        value *= gx
+        term = _PERM_GY[h]
+        term *= gy
+        value += term
+        return value
+
+    # lerp(t, a, b) = a + t * (b - a), em buffers reaproveitados
+    low = grad2(PERM[A + j], x, y)
+    tmp = grad2(PERM[B + j], x1, y)
+    tmp -= low
+    tmp *= fx
+    low += tmp
+    high = grad2(PERM[A + jj], x, y1)
+    tmp = grad2(PERM[B + jj], x1, y1)
+    tmp -= high
+    tmp *= fx
+    high += tmp
+    high -= low
+    high *= fy
+    low += high
+    return low
+
+
+def _overflow(value):
+    """Simula o estouro de um inteiro de 64 bits com sinal"""
+    value &= 0xFFFFFFFFFFFFFFFF
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def opensimplex_perm(seed):
+    """Tabela de permutação do OpenSimplex para uma seed (igual ao pacote ``opensimplex``)"""
+    perm = np.zeros(256, dtype=np.int64)
+    source = list(range(256))
+    for _ in range(3):
+        seed = _overflow(seed * 6364136223846793005 + 1442695040888963407)
+    for i in range(255, -1, -1):
+        seed = _overflow(seed * 6364136223846793005 + 1442695040888963407)
+        r = int((seed + 31) % (i + 1))
+        if r < 0:
+            r += i + 1
+        perm[i] = source[r]
+        source[r] = source[i]
+    return perm
+
+
+def _extrapolate2(perm, xsb, ysb, dx, dy):
+    index = perm[(perm[xsb & 0xFF] + ysb) & 0xFF] & 0x0E
+    return GRADIENTS2[index] * dx + GRADIENTS2[index + 1] * dy
+
+
+def _contribution(perm, xsb, ysb, dx, dy):
+    attn = 2 - dx * dx - dy * dy
+    attn = np.where(attn > 0, attn, 0.0)
+    attn *= attn
+    return attn * attn * _extrapolate2(perm, xsb, ysb, dx, dy)
+
+
+def opensimplex2(x, y, perm):
+    """Ruído OpenSimplex 2D sobre arrays, equivalente ao ``OpenSimplex.noise2``"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Coloca as coordenadas na grade esticada
+    stretch_offset = (x + y) * STRETCH_CONSTANT2
+    xs = x + stretch_offset
+    ys = y + stretch_offset
+    xsb = np.floor(xs)
+    ysb = np.floor(ys)
+    squish_offset = (xsb + ysb) * SQUISH_CONSTANT2
+    dx0 = x - (xsb + squish_offset)
+    dy0 = y - (ysb + squish_offset)
+    xins = xs - xsb
+    yins = ys - ysb
+    in_sum = xins + yins
+    xsb = xsb.astype(np.int64)
+    ysb = ysb.astype(np.int64)
+
+    # Contribuições (1,0) e (0,1)
+    value = _contribution(perm, xsb + 1, ysb, dx0 - 1 - SQUISH_CONSTANT2, dy0 - SQUISH_CONSTANT2)
+    value += _contribution(perm, xsb, ysb + 1, dx0 - SQUISH_CONSTANT2, dy0 - 1 - SQUISH_CONSTANT2)
+
+    lower = in_sum <= 1
+    x_major = xins > yins
+    sq2 = 2 * SQUISH_CONSTANT2
+
+    # Triângulo em (0,0)
+    zins = 1 - in_sum
+    near0 = (zins > xins) | (zins > yins)
+    lo_xsv = np.where(near0, np.where(x_major, xsb + 1, xsb - 1), xsb + 1)
+    lo_ysv = np.where(near0, np.where(x_major, ysb - 1, ysb + 1), ysb + 1)
+    lo_dx = np.where(near0, np.where(x_major, dx0 - 1, dx0 + 1), dx0 - 1 - sq2)
+    lo_dy = np.where(near0, np.where(x_major, dy0 + 1, dy0 - 1), dy0 - 1 - sq2)
+
+    # Triângulo em (1,1)
+    zins = 2 - in_sum
+    near1 = (zins < xins) | (zins < yins)
+    hi_xsv = np.where(near1, np.where(x_major, xsb + 2, xsb), xsb)
+    hi_ysv = np.where(near1, np.where(x_major, ysb, ysb + 2), ysb)
+    hi_dx = np.where(near1, np.where(x_major, dx0 - 2 - sq2, dx0 - sq2), dx0)
+    hi_dy = np.where(near1, np.where(x_major, dy0 - sq2, dy0 - 2 - sq2), dy0)
+
+    xsv_ext = np.where(lower, lo_xsv, hi_xsv)
+    ysv_ext = np.where(lower, lo_ysv, hi_ysv)
+    dx_ext = np.where(lower, lo_dx, hi_dx)
+    dy_ext = np.where(lower, lo_dy, hi_dy)
+
+    # Contribuição (0,0) ou (1,1)
+    xsb = np.where(lower, xsb, xsb + 1)
+    ysb = np.where(lower, ysb, ysb + 1)
+    dx0 = np.where(lower, dx0, dx0 - 1 - sq2)
+    dy0 = np.where(lower, dy0, dy0 - 1 - sq2)
+    value += _contribution(perm, xsb, ysb, dx0, dy0)
+
+    # Vértice extra
+    value += _contribution(perm, xsv_ext, ysv_ext, dx_ext, dy_ext)
+    return value / NORM_CONSTANT2
+
+
+def _pixel_grid(width, height, x0=0, y0=0):
+    xs = np.arange(x0, x0 + width, dtype=np.float64)
+    ys = np.arange(y0, y0 + height, dtype=np.float64)
+    return np.meshgrid(xs, ys)
+
+
+# Linhas calculadas por vez, para os temporários caberem no cache
+BLOCK_ROWS = 32
+
+
+def nyquist_octaves(octaves, scale, lacunarity, spacing=1.0):
+    """Quantas octaves ficam abaixo do limite de Nyquist (meio ciclo por amostra)
+    quando as amostras estão a ``spacing`` pixels umas das outras"""
+    count = 0
+    frequency = scale * spacing
+    while count < octaves and frequency < 0.5:
+        count += 1
+        frequency *= lacunarity
+    return max(count, 1)
+
+
+def new_heightmap(width, height, out=None):
+    """Array float32 (height, width) para o heightmap, ou ``out`` se foi dado
+    (por exemplo um memmap de ``heightstore``)"""
+    if out is None:
+        return np.empty((height, width), dtype=np.float32)
+    if out.shape != (height, width):
+        raise ValueError(f"Expected an output of shape {(height, width)}, got {out.shape}")
+    return out
+
+
+def fbm_perlin(width, height, scale, octaves, persistence, lacunarity, base=42, x0=0, y0=0,
+               detail_octaves=None, out=None):
+    """Grade (height, width) igual a ``pnoise2(x*scale, y*scale, ...)`` pixel a pixel.
+
+    Com ``detail_octaves`` só as primeiras octaves são somadas, mas a
+    normalização continua sendo a de ``octaves`` (usado nos níveis de detalhe).
+    O resultado é float32, sem perda: o pnoise2 já calcula em float.
+    """
+    if detail_octaves is None:
+        detail_octaves = octaves
+    if octaves < 1:
+        raise ValueError("Expected octaves value > 0")
+    # pnoise2 recebe floats de 32 bits; as coordenadas são separáveis por eixo
+    x = (np.arange(x0, x0 + width, dtype=np.float64) * scale).astype(np.float32)[np.newaxis, :]
+    y = (np.arange(y0, y0 + height, dtype=np.float64) * scale).astype(np.float32)[:, np.newaxis]
+    height_map = new_heightmap(width, height, out)
+    for row in range(0, height, BLOCK_ROWS):
+        rows = y[row:row + BLOCK_ROWS]
+        freq = np.float32(1.0)
+        amp = np.float32(1.0)
+        max_amp = np.float32(0.0)
+        total = np.zeros((len(rows), width), dtype=np.float32)
+        for octave in range(octaves):
+            if octave < detail_octaves:
+                repeat = np.float32(1024) * freq
+                layer = perlin2(x * freq, rows * freq, repeat, repeat, base)
+                layer *= amp
+                total += layer
+            max_amp += amp
+            freq *= np.float32(lacunarity)
+            amp *= np.float32(persistence)
+        if octaves > 1:
+            total /= max_amp
+        height_map[row:row + BLOCK_ROWS] = total
+    return height_map
+
+
+def perlin_layer(width, height, scale, octave, lacunarity, base=42, x0=0, y0=0):
+    """Octave ``octave`` de ``fbm_perlin``, sem o peso da persistence"""
+    freq = np.float32(1.0)
+    for _ in range(octave):
+        freq *= np.float32(lacunarity)
+    x = (np.arange(x0, x0 + width, dtype=np.float64) * scale).astype(np.float32)[np.newaxis, :]
+    y = (np.arange(y0, y0 + height, dtype=np.float64) * scale).astype(np.float32)[:, np.newaxis]
+    repeat = np.float32(1024) * freq
+    layer = np.empty((height, width), dtype=np.float32)
+    for row in range(0, height, BLOCK_ROWS):
+        layer[row:row + BLOCK_ROWS] = perlin2(x * freq, y[row:row + BLOCK_ROWS] * freq,
+                                              repeat, repeat, base)
+    return layer
+
+
+def sum_perlin_layers(layers, octaves, persistence, out=None):
+    """Soma as camadas de ``perlin_layer`` como ``fbm_perlin``, com o mesmo
+    arredondamento; menos camadas que ``octaves`` equivale a ``detail_octaves``"""
+    height, width = layers[0].shape
+    total = np.zeros((height, width), dtype=np.float32)
+    amp = np.float32(1.0)
+    max_amp = np.float32(0.0)
+    for octave in range(octaves):
+        if octave < len(layers):
+            total += layers[octave] * amp
+        max_amp += amp
+        amp *= np.float32(persistence)
+    if octaves > 1:
+        total /= max_amp
+    height_map = new_heightmap(width, height, out)
+    height_map[...] = total
+    return height_map
+
+
+def opensimplex_layer(width, height, scale, octave, lacunarity, seed=42, x0=0, y0=0):
+    """Octave ``octave`` de ``fbm_opensimplex`` (float64), sem o peso da persistence"""
+    frequency = 1.0
+    for _ in range(octave):
+        frequency *= lacunarity
+    px, py = _pixel_grid(width, height, x0, y0)
+    return opensimplex2(px * scale * frequency, py * scale * frequency, opensimplex_perm(seed))
+
+
+def sum_opensimplex_layers(layers, octaves, persistence, out=None):
+    """Soma as camadas de ``opensimplex_layer`` como ``fbm_opensimplex``"""
+    height, width = layers[0].shape
+    total = np.zeros((height, width), dtype=np.float64)
+    max_amplitude = 0
+    amplitude = 1.0
+    for octave in range(octaves):
+        if octave < len(layers):
+            total += layers[octave] * amplitude
+        max_amplitude += amplitude
+        amplitude *= persistence
+    height_map = new_heightmap(width, height, out)
+    np.divide(total, max_amplitude, out=height_map, casting='same_kind')
+    return height_map
+
+
+def fbm_opensimplex(width, height, scale, octaves, persistence, lacunarity, seed=42, x0=0, y0=0,
+                    detail_octaves=None, out=None):
+    """Soma de octaves OpenSimplex, como em ``MyWidget.generate_noise_texture``.
+
+    A soma é feita em float64 e guardada em float32.
+    """
+    if detail_octaves is None:
+        detail_octaves = octaves
+    perm = opensimplex_perm(seed)
+    px, py = _pixel_grid(width, height, x0, y0)
+    total = np.zeros((height, width), dtype=np.float64)
+    max_amplitude = 0
+    amplitude = 1.0
+    frequency = 1.0
+    for octave in range(octaves):
+        if octave < detail_octaves:
+            total += opensimplex2(px * scale * frequency, py * scale * frequency, perm) * amplitude
+        max_amplitude += amplitude
+        amplitude *= persistence
+        frequency *= lacunarity
+    height_map = new_heightmap(width, height, out)
+    np.divide(total, max_amplitude, out=height_map, casting='same_kind')
+    return height_map
@@ -0,0 +1,34 @@
+"""Heightmaps float32 guardados em arquivos ``.npy`` mapeados na memória.
+
+O arquivo é um ``.npy`` comum: outras ferramentas abrem com
+``np.load(path, mmap_mode='r')`` na hora, sem gerar o mapa de novo, e só as
+páginas lidas vão para a memória, então o mapa pode ser maior que a RAM.
+
+Em volta do mapa fica uma borda de ``BORDER`` pixel com as alturas vizinhas
+do mundo: um mapa de W x H pixels é um array (H + 2, W + 2). Assim as normais
+da beirada, recalculadas do arquivo, usam os mesmos vizinhos da geração.
+"""
+import numpy as np
+
+BORDER = 1
+
+
+def create_heightmap(path, width, height):
+    """Cria ``path`` com um heightmap (height, width) float32, mais a borda, e devolve o memmap"""
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                     shape=(height + 2 * BORDER, width + 2 * BORDER))
+
+
+def open_heightmap(path, mode='r'):
+    """Abre um heightmap salvo, com a borda; ``mode='r+'`` permite alterar o arquivo"""
+    height_map = np.load(path, mmap_mode=mode)
+    if height_map.ndim != 2 or height_map.dtype != np.float32 or min(height_map.shape) <= 2 * BORDER:
+        raise ValueError(f"{path} is not a float32 heightmap "
+                         f"(got {height_map.dtype} with shape {height_map.shape})")
+    return height_map
+
+
+def heightmap_size(height_map):
+    """Largura e altura do mapa, sem a borda"""
+    height, width = height_map.shape
+    return width - 2 * BORDER, height - 2 * BORDER
@@ -0,0 +1,138 @@
+"""Teste de carga do ``tileserver`` em localhost.
+
+Exemplo:
+    python loadtest.py --start-server --requests 2000 --concurrency 32 --tiles 64
+
+Cada conexão (``--concurrency`` delas, com keep-alive) pede tiles sorteados
+entre ``--tiles`` tiles distintos, então há pedidos simultâneos do mesmo tile
+e pedidos de tiles já prontos. No fim mostra vazão, percentis de latência
+vistos pelo cliente e as estatísticas do próprio servidor (``/stats``).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from metrics import percentile
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load-test the terrain tile server.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="tile server address")
+    parser.add_argument('--requests', type=int, default=1000, help="total tile requests")
+    parser.add_argument('--concurrency', type=int, default=16, help="parallel connections")
+    parser.add_argument('--tiles', type=int, default=64, help="distinct tiles to choose from")
+    parser.add_argument('--zoom', type=int, default=8)
+    parser.add_argument('--format', choices=['png', 'npy'], default='png')
+    parser.add_argument('--query', default='', help="extra query string, e.g. 'octaves=6&seed=7'")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random tile choice")
+    parser.add_argument('--start-server', action='store_true',
+                        help="start tileserver.py on the --url port for the test and stop it after")
+    parser.add_argument('--server-args', default='',
+                        help="extra tileserver.py arguments with --start-server")
+    return parser
+
+
+async def fetch(reader, writer, host, target):
+    """Um GET numa conexão keep-alive; devolve (status, corpo)"""
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {name.lower(): value.strip() for name, _, value in
+               (line.partition(':') for line in lines[1:] if line)}
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, body
+
+
+async def client(host, port, targets, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while targets:
+            target = targets.pop()
+            start = time.perf_counter()
+            status, _ = await fetch(reader, writer, host, target)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def wait_for_server(host, port, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"No tile server on {host}:{port} after {timeout:.0f}s")
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            return
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname or '127.0.0.1', url.port or 80
+    await wait_for_server(host, port)
+    rng = random.Random(args.seed)
+    # Tiles vizinhos, como os de uma vista de mapa
+    side = max(int(args.tiles ** 0.5), 1)
+    tiles = [(x, y) for y in range(side) for x in range(side)][:args.tiles]
+    query = f"?{args.query}" if args.query else ''
+    targets = [f"/tiles/{args.zoom}/{x}/{y}.{args.format}{query}"
+               for x, y in (rng.choice(tiles) for _ in range(args.requests))]
+    latencies = []
+    statuses = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, targets, latencies, statuses)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, body = await fetch(reader, writer, host, '/stats')
+    finally:
+        writer.close()
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'seconds': elapsed,
+        'requests_per_s': len(latencies) / elapsed,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'latency_ms': {name: percentile(latencies, fraction) * 1000 for name, fraction in
+                       (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('max', 1.0))},
+        'server': json.loads(body),
+    }
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = None
+    if args.start_server:
+        port = urlsplit(args.url).port or 80
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tileserver.py')
+        server = subprocess.Popen([sys.executable, script, '--port', str(port)]
+                                  + args.server_args.split())
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            # Com SIGTERM o servidor fecha o pool e espera as gravações
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, indent=2))
+    return 0 if set(report['statuses']) == {'200'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Cache LRU limitado pelo tamanho em bytes dos valores.
+
+Base dos caches em memória: chunks (``ChunkCache``), camadas de octaves
+(``OctaveCache``) e tiles prontos do ``tileserver``.
+"""
+from collections import OrderedDict
+
+
+def array_bytes(value):
+    return value.nbytes
+
+
+class LRUCache:
+    """Valores até ``max_bytes`` (medidos por ``size``), descartando os menos usados"""
+
+    def __init__(self, max_bytes, size=array_bytes):
+        self.max_bytes = max_bytes
+        self.size = size
+        self.nbytes = 0
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.nbytes -= self.size(old)
+        self.items[key] = value
+        self.nbytes += self.size(value)
+        self.evict()
+
+    def evict(self):
+        # O valor mais recente fica mesmo se sozinho passar do limite
+        while self.nbytes > self.max_bytes and len(self.items) > 1:
+            _, evicted = self.items.popitem(last=False)
+            self.nbytes -= self.size(evicted)
+
+    def clear(self):
+        self.items.clear()
+        self.nbytes = 0
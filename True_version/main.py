@@ -1,4 +1,5 @@
-from app import MyApp
-
 if __name__ == '__main__':
-    MyApp().run()
\ No newline at end of file
+    # Os workers dos pools importam este arquivo como __mp_main__; a interface
+    # (e a janela que kivy.core.window abre ao ser importado) fica só aqui
+    from app import MyApp
+    MyApp().run()
@@ -0,0 +1,108 @@
+"""Medição do tempo de cada etapa da geração e do desenho.
+
+Cada ``with metrics.stage('nome', pixels=...)`` guarda um registro com o
+tempo de parede, os pixels e os bytes alocados numa janela dos registros mais
+recentes. Pode ser usado em qualquer thread. Com ``log_path`` cada registro
+também vai, como uma linha JSON, para um arquivo de análise posterior.
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, fraction):
+    """Valor de ``values`` (já ordenados) abaixo do qual fica ``fraction`` deles"""
+    if not values:
+        return 0.0
+    rank = math.ceil(fraction * len(values)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class Metrics:
+    """Janela dos ``capacity`` registros mais recentes de cada etapa"""
+
+    def __init__(self, capacity=256, log_path=None):
+        self.capacity = capacity
+        self.records = {}
+        self.lock = threading.Lock()
+        self.log = open(log_path, 'a') if log_path else None
+
+    @contextmanager
+    def stage(self, name, pixels=0, nbytes=0):
+        """Mede o bloco ``with``; o registro devolvido pode receber ``nbytes`` no fim"""
+        record = {'stage': name, 'pixels': pixels, 'nbytes': nbytes}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['time'] = time.time()
+            self.add(record)
+
+    def add(self, record):
+        with self.lock:
+            records = self.records.get(record['stage'])
+            if records is None:
+                records = self.records[record['stage']] = deque(maxlen=self.capacity)
+            records.append(record)
+            if self.log is not None:
+                self.log.write(json.dumps(record) + '\n')
+                self.log.flush()
+
+    def recent(self, name):
+        """Cópia dos registros guardados da etapa ``name``"""
+        with self.lock:
+            return list(self.records.get(name, ()))
+
+    def summary(self):
+        """Por etapa: número de registros, último, média e percentis 50/90/99 do
+        tempo (ms), Mpx/s e bytes"""
+        with self.lock:
+            stages = {name: list(records) for name, records in self.records.items()}
+        summary = {}
+        for name, records in stages.items():
+            seconds = sum(record['seconds'] for record in records)
+            pixels = sum(record['pixels'] for record in records)
+            ordered = sorted(record['seconds'] for record in records)
+            summary[name] = {
+                'count': len(records),
+                'last_ms': records[-1]['seconds'] * 1000,
+                'mean_ms': seconds / len(records) * 1000,
+                'p50_ms': percentile(ordered, 0.50) * 1000,
+                'p90_ms': percentile(ordered, 0.90) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000,
+                'mpx_per_s': pixels / seconds / 1e6 if seconds > 0 else 0.0,
+                'nbytes': sum(record['nbytes'] for record in records),
+            }
+        return summary
+
+    def take(self):
+        """Remove e devolve todos os registros, para repassá-los a outro ``Metrics``"""
+        with self.lock:
+            records = [record for records in self.records.values() for record in records]
+            self.records.clear()
+        return records
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def close(self):
+        with self.lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+
+
+class NullMetrics:
+    """Mesma interface de ``Metrics`` sem guardar nada, para quando não há medição"""
+
+    @contextmanager
+    def stage(self, name, pixels=0, nbytes=0):
+        yield {}
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,64 @@
+"""Cache das camadas de cada octave do fBm.
+
+Uma camada só depende da escala, da lacunarity, da semente, da grade e do
+número da octave; a persistence só muda os pesos da soma. Com as camadas
+guardadas, mudar a persistence é só somar de novo, e aumentar ``octaves``
+calcula apenas a camada nova. O resultado é idêntico ao de ``fbm_perlin`` e
+``fbm_opensimplex``.
+"""
+import threading
+
+import numpy as np
+
+from heightmap import (opensimplex_layer, perlin_layer, sum_opensimplex_layers,
+                       sum_perlin_layers)
+from lrucache import LRUCache
+
+# Função da camada, função da soma e tipo das camadas de cada backend
+BACKENDS = {
+    'perlin': (perlin_layer, sum_perlin_layers, np.float32),
+    'opensimplex': (opensimplex_layer, sum_opensimplex_layers, np.float64),
+}
+
+
+class OctaveCache(LRUCache):
+    """Camadas de octaves guardadas até ``max_bytes``, descartando as menos usadas"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        super().__init__(max_bytes)
+        self.lock = threading.Lock()
+
+    def layer(self, backend, width, height, scale, octave, lacunarity, seed, x0=0, y0=0,
+              generator=None):
+        """Camada ``octave``, do cache ou calculada (por faixas, com um ``ParallelGenerator``)"""
+        key = (backend, width, height, scale, octave, lacunarity, seed, x0, y0)
+        with self.lock:
+            layer = self.get(key)
+            if layer is not None:
+                return layer
+        layer_function, _, dtype = BACKENDS[backend]
+        if generator is None:
+            layer = layer_function(width, height, scale, octave, lacunarity, seed, x0=x0, y0=y0)
+        else:
+            layer = generator.heightmap(layer_function, width, height, scale, octave, lacunarity,
+                                        seed, x0=x0, y0=y0, dtype=dtype)
+        with self.lock:
+            self.put(key, layer)
+        return layer
+
+    def fbm(self, backend, width, height, scale, octaves, persistence, lacunarity, seed=42,
+            x0=0, y0=0, detail_octaves=None, generator=None, out=None):
+        """Mesmo resultado de ``fbm_perlin``/``fbm_opensimplex``, somando camadas guardadas"""
+        if octaves < 1:
+            raise ValueError("Expected octaves value > 0")
+        if detail_octaves is None:
+            detail_octaves = octaves
+        layers = [self.layer(backend, width, height, scale, octave, lacunarity, seed, x0, y0,
+                             generator)
+                  for octave in range(min(detail_octaves, octaves))]
+        _, sum_layers, _ = BACKENDS[backend]
+        return sum_layers(layers, octaves, persistence, out=out)
+
+    def clear(self):
+        with self.lock:
+            super().clear()
@@ -0,0 +1,187 @@
+"""Geração em paralelo por faixas de linhas.
+
+Cada faixa é calculada por um worker de um ``ProcessPoolExecutor`` (ou de um
+pool de threads) e escrita direto num buffer em memória compartilhada, então
+nada volta serializado pelo pool. Como cada linha do fBm é independente das
+outras, o resultado é idêntico ao da geração em um único processo.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from colorize import render_pixels
+
+
+def attach(buffers):
+    """Arrays de destino do worker e os blocos compartilhados a fechar.
+
+    Cada buffer é um array ou o (nome, forma, tipo) de um bloco de ``SharedArrays``.
+    """
+    arrays = []
+    blocks = []
+    for buffer in buffers:
+        if isinstance(buffer, np.ndarray):
+            arrays.append(buffer)
+        else:
+            name, shape, dtype = buffer
+            block = shared_memory.SharedMemory(name=name)
+            blocks.append(block)
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    return arrays, blocks
+
+
+def _render_band(buffers, *args):
+    """Worker: preenche uma faixa dos buffers (arrays ou memória compartilhada)"""
+    arrays, blocks = attach(buffers)
+    try:
+        _fill_band(arrays, *args)
+    finally:
+        # As views precisam sumir antes de fechar a memória compartilhada
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def _fill_band(arrays, fbm, width, height, row_start, row_end, args, kwargs, palette, light):
+    """Calcula as linhas [row_start, row_end) do heightmap e, se pedido, dos pixels"""
+    x0 = kwargs.pop('x0', 0)
+    y0 = kwargs.pop('y0', 0)
+    # Uma linha extra de cada lado (dentro da imagem) para as normais
+    halo_start = max(row_start - 1, 0) if light is not None else row_start
+    halo_end = min(row_end + 1, height) if light is not None else row_end
+    band = fbm(width, halo_end - halo_start, *args, x0=x0, y0=y0 + halo_start, **kwargs)
+    inner = slice(row_start - halo_start, row_end - halo_start)
+    arrays[0][row_start:row_end] = band[inner]
+    if palette is not None:
+        arrays[1][row_start:row_end] = render_pixels(band, palette, light)[inner]
+
+
+class SharedArrays:
+    """Arrays em memória compartilhada, criados por quem recebe o resultado.
+
+    ``buffers`` vai para os workers, que escrevem nos arrays via ``attach``;
+    ``copy`` devolve cópias locais e ``release`` libera os blocos.
+    """
+
+    def __init__(self, specs):
+        self.specs = specs
+        self.blocks = []
+        try:
+            for shape, dtype in specs:
+                nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+                self.blocks.append(shared_memory.SharedMemory(create=True, size=nbytes))
+        except BaseException:
+            self.release()
+            raise
+        self.buffers = [(block.name, shape, dtype)
+                        for (shape, dtype), block in zip(specs, self.blocks)]
+
+    def copy(self):
+        return [np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+                for (shape, dtype), block in zip(self.specs, self.blocks)]
+
+    def release(self):
+        # Pode ser chamado de novo (por exemplo ao terminar uma tarefa cancelada)
+        blocks, self.blocks = self.blocks, []
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+# Módulos que o forkserver importa antes de criar os workers
+WORKER_MODULES = ['heightmap', 'colorize', 'parallel', 'chunks']
+
+
+def process_context():
+    """Contexto do multiprocessing para os pools de processos.
+
+    Sem fork: o pool pode nascer numa thread de segundo plano, e o fork
+    copiaria travas presas por outras threads do processo. O forkserver
+    carrega só ``WORKER_MODULES``, não o ``__main__`` (por padrão ele o
+    importaria, e com ele a interface do Kivy).
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(WORKER_MODULES)
+    return context
+
+
+class ParallelGenerator:
+    """Divide a geração em faixas de ``band_rows`` linhas entre ``workers`` workers.
+
+    Com ``band_rows=None`` cada chamada é dividida numa faixa por worker, o
+    melhor para grades de poucas linhas, como as strips de ``render.py``.
+    Com ``use_processes=False`` usa threads (o NumPy libera o GIL na maior
+    parte das contas). Com ``workers`` igual a 1 tudo roda no próprio processo.
+    """
+
+    def __init__(self, workers=None, use_processes=True, band_rows=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.band_rows = band_rows
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            if self.use_processes:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=process_context())
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def heightmap(self, fbm, width, height, *args, **kwargs):
+        """``fbm(width, height, *args, **kwargs)`` calculado por faixas"""
+        height_map, _ = self.render(fbm, width, height, *args, **kwargs)
+        return height_map
+
+    def render(self, fbm, width, height, *args, palette=None, light=None, dtype=np.float32, **kwargs):
+        """Heightmap (do tipo ``dtype``) e, com ``palette``, os pixels (HxWx3 uint8) da grade.
+
+        ``light`` é a tupla (light_dir, light_intensity, ambient_light,
+        water_level); sem ela os pixels ficam com a cor base, sem iluminação.
+        """
+        specs = [((height, width), dtype)]
+        if palette is not None:
+            specs.append(((height, width, 3), np.uint8))
+        band_rows = self.band_rows or max(-(-height // self.workers), 1)
+        bands = [(row, min(row + band_rows, height)) for row in range(0, height, band_rows)]
+
+        if self.workers <= 1 or len(bands) <= 1:
+            arrays = [np.empty(shape, dtype=dtype) for shape, dtype in specs]
+            _fill_band(arrays, fbm, width, height, 0, height, args, dict(kwargs), palette, light)
+            return arrays[0], arrays[1] if palette is not None else None
+
+        if self.use_processes:
+            arrays = self._run_shared(specs, bands, fbm, width, height, args, kwargs, palette, light)
+        else:
+            arrays = [np.empty(shape, dtype=dtype) for shape, dtype in specs]
+            self._run_bands(arrays, bands, fbm, width, height, args, kwargs, palette, light)
+        return arrays[0], arrays[1] if palette is not None else None
+
+    def _run_bands(self, buffers, bands, fbm, width, height, args, kwargs, palette, light):
+        executor = self.get_executor()
+        futures = [executor.submit(_render_band, buffers, fbm, width, height, start, end,
+                                   args, dict(kwargs), palette, light)
+                   for start, end in bands]
+        for future in futures:
+            future.result()
+
+    def _run_shared(self, specs, bands, fbm, width, height, args, kwargs, palette, light):
+        """Workers escrevem em memória compartilhada; devolve uma cópia local"""
+        shared = SharedArrays(specs)
+        try:
+            self._run_bands(shared.buffers, bands, fbm, width, height, args, kwargs, palette,
+                            light)
+            return shared.copy()
+        finally:
+            shared.release()
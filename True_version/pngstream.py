@@ -0,0 +1,84 @@
+"""Escrita de PNG em faixas de linhas, sem manter a imagem inteira na memória."""
+import io
+import struct
+import zlib
+
+import numpy as np
+
+# Tipo de cor do PNG para cada número de canais
+COLOR_TYPES = {1: 0, 3: 2, 4: 6}
+
+
+class PNGWriter:
+    """Escreve um PNG de ``width`` x ``height`` recebendo as linhas aos poucos.
+
+    As linhas chegam de cima para baixo como arrays (linhas, width[, canais])
+    de uint8, ou de uint16 para PNG de 16 bits. ``path`` também pode ser um
+    arquivo já aberto (um ``io.BytesIO``, por exemplo), que não é fechado.
+    """
+
+    def __init__(self, path, width, height, channels=3, bit_depth=8, level=6):
+        self.own_file = not hasattr(path, 'write')
+        self.file = open(path, 'wb') if self.own_file else path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(level)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth,
+                                              COLOR_TYPES[channels], 0, 0, 0))
+
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows)
+        count = rows.shape[0]
+        if self.rows_written + count > self.height:
+            raise ValueError("More rows than the image height")
+        # PNG guarda amostras de 16 bits em big-endian
+        dtype = '>u2' if self.bit_depth == 16 else np.uint8
+        data = np.ascontiguousarray(rows, dtype=dtype).reshape(count, -1).view(np.uint8)
+        # Cada linha começa com o byte do filtro (0, nenhum)
+        filtered = np.zeros((count, data.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 1:] = data
+        compressed = self.compressor.compress(filtered.tobytes())
+        if compressed:
+            self.write_chunk(b'IDAT', compressed)
+        self.rows_written += count
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.close_file()
+            raise ValueError(f"Expected {self.height} rows, got {self.rows_written}")
+        self.write_chunk(b'IDAT', self.compressor.flush())
+        self.write_chunk(b'IEND', b'')
+        self.close_file()
+
+    def close_file(self):
+        if self.own_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.close_file()
+
+
+def encode_png(image, level=6):
+    """Bytes do PNG de uma imagem inteira (altura, largura[, canais]), uint8 ou uint16"""
+    buffer = io.BytesIO()
+    channels = image.shape[2] if image.ndim == 3 else 1
+    bit_depth = 16 if image.dtype == np.uint16 else 8
+    with PNGWriter(buffer, image.shape[1], image.shape[0], channels, bit_depth, level) as writer:
+        writer.write_rows(image)
+    return buffer.getvalue()
@@ -0,0 +1,181 @@
+"""Renderização sem janela de mapas grandes, gravados em faixas de linhas.
+
+Exemplo:
+    python render.py mapa.png --width 32768 --height 32768 --workers 32
+
+A memória usada depende só da largura e de ``--strip-rows``, não da altura.
+Com ``--save-heightmap`` as alturas também vão para um ``.npy`` mapeado na
+memória, que depois pode ser recolorido com ``--heightmap`` sem gerar de novo:
+    python render.py mapa.png --save-heightmap mapa.npy
+    python render.py mapa_alto.png --heightmap mapa.npy --sea-level 0.1
+"""
+import argparse
+import sys
+import time
+
+from colorize import Palette, light_vector, render_pixels, terrain_bands
+from heightmap import fbm_opensimplex, fbm_perlin
+from heightstore import create_heightmap, heightmap_size, open_heightmap
+from parallel import ParallelGenerator
+from pngstream import PNGWriter
+
+BACKENDS = {'perlin': fbm_perlin, 'opensimplex': fbm_opensimplex}
+
+
+def add_noise_arguments(parser):
+    """Área do mundo e parâmetros do ruído, comuns aos comandos que geram mapas"""
+    parser.add_argument('--width', type=int, default=4096)
+    parser.add_argument('--height', type=int, default=4096)
+    parser.add_argument('--x0', type=int, default=0, help="world x of the left column")
+    parser.add_argument('--y0', type=int, default=0, help="world y of the bottom row")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='perlin')
+    parser.add_argument('--scale', type=float, default=0.005)
+    parser.add_argument('--octaves', type=int, default=8)
+    parser.add_argument('--persistence', type=float, default=0.6)
+    parser.add_argument('--lacunarity', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=42, help="seed (the pnoise2 base for perlin)")
+
+
+def check_noise_arguments(parser, args):
+    """Sai com ``parser.error`` se os parâmetros do ruído não servem"""
+    # O seed é a base do pnoise2, que só tem 256 permutações
+    if args.backend == 'perlin' and not 0 <= args.seed < 256:
+        parser.error(f"--seed must be in [0, 256) for the perlin backend, got {args.seed}")
+    if args.octaves < 1:
+        parser.error(f"--octaves must be at least 1, got {args.octaves}")
+
+
+def noise_arguments(args):
+    """Função de ruído e os argumentos (depois da largura e da altura) pedidos na linha de comando"""
+    seed_arg = 'base' if args.backend == 'perlin' else 'seed'
+    return (BACKENDS[args.backend], (args.scale, args.octaves, args.persistence, args.lacunarity),
+            {seed_arg: args.seed})
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render a terrain map to disk without a window.")
+    parser.add_argument('output', help="output file")
+    parser.add_argument('--format', choices=['png', 'raw'], default=None,
+                        help="png or raw RGB bytes (default: from the file extension)")
+    add_noise_arguments(parser)
+    parser.add_argument('--sea-level', type=float, default=-0.15)
+    parser.add_argument('--light-angle', type=float, default=45)
+    parser.add_argument('--light-intensity', type=float, default=0.8)
+    parser.add_argument('--ambient-light', type=float, default=0.6)
+    parser.add_argument('--no-lighting', action='store_true')
+    parser.add_argument('--strip-rows', type=int, default=64, help="rows generated per strip")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--save-heightmap', metavar='PATH',
+                        help="also store the float32 heights in this .npy file")
+    parser.add_argument('--heightmap', metavar='PATH',
+                        help="color a saved .npy heightmap instead of generating one "
+                             "(its size replaces --width/--height)")
+    parser.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def get_lighting(args):
+    """Paleta e a tupla ``light`` de ``render_pixels`` pedidas na linha de comando"""
+    bands = terrain_bands(args.sea_level)
+    light = None
+    if not args.no_lighting:
+        light = (light_vector(args.light_angle), args.light_intensity, args.ambient_light,
+                 bands[0].maxHeight)
+    return Palette(bands), light
+
+
+def render_strips(args, generator, store=None):
+    """Gera as faixas de cima para baixo, cada uma como array (linhas, width, 3).
+
+    Com ``store`` (de ``create_heightmap``, do tamanho da imagem) as alturas
+    de cada faixa, com a borda, são guardadas nele, na linha ``y - y0 + 1``
+    do mundo.
+    """
+    fbm, noise_args, seed_kwargs = noise_arguments(args)
+    palette, light = get_lighting(args)
+
+    top = args.y0 + args.height
+    while top > args.y0:
+        rows = min(args.strip_rows, top - args.y0)
+        # Uma borda de 1 pixel para as normais da beirada da faixa usarem os vizinhos reais
+        heights, pixels = generator.render(
+            fbm,
+            args.width + 2,
+            rows + 2,
+            *noise_args,
+            x0=args.x0 - 1,
+            y0=top - rows - 1,
+            palette=palette,
+            light=light,
+            **seed_kwargs
+        )
+        if store is not None:
+            # As linhas de borda se sobrepõem às das faixas vizinhas com os mesmos valores
+            store[top - rows - args.y0:top - args.y0 + 2] = heights
+        # O y do mundo cresce para cima; a imagem é escrita de cima para baixo
+        yield pixels[-2:0:-1, 1:-1]
+        top -= rows
+
+
+def recolor_strips(args, height_map):
+    """Como ``render_strips``, mas lendo as alturas de um heightmap salvo"""
+    palette, light = get_lighting(args)
+    _, top = heightmap_size(height_map)
+    while top > 0:
+        rows = min(args.strip_rows, top)
+        # As linhas top - rows a top + 1 do arquivo são a faixa e a borda dela
+        pixels = render_pixels(height_map[top - rows:top + 2], palette, light)
+        yield pixels[-2:0:-1, 1:-1]
+        top -= rows
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_noise_arguments(parser, args)
+    if args.strip_rows < 1:
+        parser.error(f"--strip-rows must be at least 1, got {args.strip_rows}")
+    output_format = args.format or ('png' if args.output.lower().endswith('.png') else 'raw')
+    generator = ParallelGenerator(workers=args.workers, band_rows=None)
+    store = None
+    if args.heightmap:
+        height_map = open_heightmap(args.heightmap)
+        args.width, args.height = heightmap_size(height_map)
+        strips = recolor_strips(args, height_map)
+    else:
+        if args.save_heightmap:
+            store = create_heightmap(args.save_heightmap, args.width, args.height)
+        strips = render_strips(args, generator, store)
+    total_pixels = args.width * args.height
+    done = 0
+    start = time.perf_counter()
+
+    if output_format == 'png':
+        writer = PNGWriter(args.output, args.width, args.height)
+        write = writer.write_rows
+    else:
+        writer = open(args.output, 'wb')
+        write = lambda strip: writer.write(strip.tobytes())
+    try:
+        for strip in strips:
+            write(strip)
+            done += strip.shape[0] * strip.shape[1]
+            if not args.quiet:
+                elapsed = time.perf_counter() - start
+                print(f"\r{done / total_pixels:6.1%}  {done / elapsed / 1e6:8.2f} Mpx/s",
+                      end='', file=sys.stderr, flush=True)
+        writer.close()
+        if store is not None:
+            store.flush()
+    finally:
+        generator.shutdown()
+
+    elapsed = time.perf_counter() - start
+    if not args.quiet:
+        print(f"\n{args.width}x{args.height} in {elapsed:.1f}s "
+              f"({total_pixels / elapsed / 1e6:.2f} Mpx/s) -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,18 +2,21 @@ from kivy.uix.widget import Widget
 from kivy.graphics import Rectangle
 from kivy.graphics.texture import Texture
 from kivy.core.window import Window
-from noise import pnoise2
-import math 
-class TerrainType:
-    def __init__(self, minHeight, maxHeight, minColor, maxColor, lerpAdjustment=0):
-        self.minHeight = minHeight
-        self.maxHeight = maxHeight
-        self.minColor = minColor
-        self.maxColor = maxColor
-        self.lerpAdjustment = lerpAdjustment
-
+from kivy.clock import Clock
+from background import BackgroundWorker
+from chunks import ChunkCache, assemble_chunk, chunk_specs, generate_chunk, generate_chunk_task
+from diskcache import DiskCache
+from erosion import Erosion
+from octavecache import OctaveCache
+from parallel import ParallelGenerator, SharedArrays
+from colorize import Palette, TerrainType, light_map, light_vector, shade, terrain_bands
+from metrics import Metrics
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+import math
+import numpy as np
 class Terrain(Widget):
-    def __init__(self, **kwargs):
+    def __init__(self, workers=None, metrics_log=None, cache_dir=None, biomes=None, **kwargs):
         super().__init__(**kwargs)
         self.scale = 0.005
         self.octaves = 8
@@ -29,34 +32,53 @@ class Terrain(Widget):
         self.update_terrain_ranges()
          
         self.zoom = 1.0  
-        self.tex_factor = 2.0  
-        self.offset_x = 0.5
-        self.offset_y = 0.5
+        self.min_zoom = 0.125
+        self.max_zoom = 10.0
+        # Centro da vista, em pixels do mundo
+        self.view_x = float(Window.width)
+        self.view_y = float(Window.height)
         self.last_touch_pos = None
-        self.height_map = []
+        
+        # Mundo em chunks. No nível de detalhe lod cada pixel de chunk cobre
+        # 2 ** lod pixels do mundo (lod negativo ao aproximar)
+        self.chunk_size = 256
+        self.lod = 0
+        self.chunk_cache = ChunkCache(max_bytes=256 * 1024 * 1024)
+        # Heightmaps já gerados ficam em disco entre execuções
+        self.disk_cache = DiskCache(cache_dir)
+        # Camadas de cada octave: mudar persistence ou octaves reaproveita as já calculadas
+        self.octave_cache = OctaveCache(max_bytes=256 * 1024 * 1024)
+        # Erosão aplicada a cada chunk (uma ``Erosion``), ou None para o ruído puro
+        self.erosion = None
+        # Com uma ``BiomeTable`` a cor vem do bioma (altura, temperatura e
+        # umidade); sem ela, só das faixas de altura
+        self.biomes = biomes
+        self.chunk_rects = {}
+        self.noise_key = None
+        # Pool que gera vários chunks ao mesmo tempo, ou divide um chunk em faixas de linhas
+        self.generator = ParallelGenerator(workers=workers)
+        # Chunks que faltam são gerados em segundo plano; enquanto isso aparecem
+        # prévias de baixa resolução, refinadas até a resolução cheia
+        self.preview_resolutions = (self.chunk_size // 16, self.chunk_size // 4)
+        self.chunk_previews = {}
+        self.pending_chunks = set()
+        self.worker = BackgroundWorker(schedule=lambda callback: Clock.schedule_once(lambda dt: callback()))
+        # Tempo de cada etapa; com metrics_log também num arquivo JSON lines
+        self.metrics = Metrics(log_path=metrics_log)
         self.generate_noise_texture()
     
     def calculate_normal(self, x, y, strength=50.0):
         """Calcula a normal do terreno em um ponto específico"""
         
-        if self.height_map[y][x] < self.waterTerrain.maxHeight:
+        if self.height_at(x, y) < self.waterTerrain.maxHeight:
             return (0, 0, 1)
-        if x <= 0 or x >= len(self.height_map[0])-1:
-            dx = 0
-        else:
-            dx = (self.height_map[y][x-1] - self.height_map[y][x+1]) * strength
-            
-        if y <= 0 or y >= len(self.height_map)-1:
-            dy = 0
-        else:
-            dy = (self.height_map[y-1][x] - self.height_map[y+1][x]) * strength
-            
+        dx = (self.height_at(x-1, y) - self.height_at(x+1, y)) * strength
+        dy = (self.height_at(x, y-1) - self.height_at(x, y+1)) * strength
         return (-dx, -dy, 1.0)
 
     def get_light_vector(self):
         """Calcula o vetor de direção da luz baseado no ângulo"""
-        angle = math.radians(self.light_angle)
-        return (math.cos(angle), math.sin(angle), 0.5)
+        return light_vector(self.light_angle)
 
     def apply_lighting(self, color, normal):
         """Aplica iluminação à cor base"""
@@ -67,65 +89,235 @@ class Terrain(Widget):
         return tuple(min(int(c * total_light), 255) for c in color)
 
     def update_terrain_ranges(self):
-        self.waterTerrain = TerrainType(-1.0, self.sea_level, (0, 0, 0), (40, 255, 255))
-        sand_max = self.sea_level + 0.05
-        self.sandTerrain = TerrainType(self.sea_level, sand_max, (215, 192, 100), (255, 246, 120))
-        grass_max = sand_max + 0.25
-        self.grassTerrain = TerrainType(sand_max, grass_max, (20, 150, 40), (100, 200, 50))
-        forest_max = grass_max + 0.1
-        self.forestTerrain = TerrainType(grass_max, forest_max, (34, 139, 34), (85, 160, 85))
-        mountain_max = forest_max + 0.15
-        self.mountainTerrain = TerrainType(forest_max, mountain_max, (120, 100, 60), (180, 160, 100))
-        self.snowTerrain = TerrainType(mountain_max, 1.0, (245, 245, 245), (255, 255, 255))
+        (self.waterTerrain, self.sandTerrain, self.grassTerrain,
+         self.forestTerrain, self.mountainTerrain, self.snowTerrain) = terrain_bands(self.sea_level)
+
+    def terrain_types(self):
+        return [self.waterTerrain, self.sandTerrain, self.grassTerrain,
+                self.forestTerrain, self.mountainTerrain, self.snowTerrain]
 
     def set_sea_level(self, new_level):
         self.sea_level = new_level
         self.update_terrain_ranges()
+        # O heightmap não depende do nível do mar: os chunks só são recoloridos
+        if self.noise_key is not None:
+            self.update_zoom()
+
+    def set_lighting(self, light_angle=None, light_intensity=None, ambient_light=None):
+        if light_angle is not None:
+            self.light_angle = light_angle
+        if light_intensity is not None:
+            self.light_intensity = light_intensity
+        if ambient_light is not None:
+            self.ambient_light = ambient_light
+        if self.noise_key is not None:
+            self.update_zoom()
+
+    def get_noise_key(self):
+        """Tudo de que os chunks dependem; se mudar, o cache é descartado"""
+        return (self.scale, self.octaves, self.persistence, self.lacunarity, 42,
+                self.chunk_size, self.erosion.key() if self.erosion is not None else None,
+                self.get_climate())
+
+    def get_climate(self):
+        """Parâmetros dos campos de temperatura e umidade, ou None sem biomas"""
+        if self.biomes is None:
+            return None
+        return tuple(sorted(self.biomes.climate.items()))
+
+    def get_palette_key(self):
+        return (tuple((t.minHeight, t.maxHeight, t.minColor, t.maxColor)
+                      for t in self.terrain_types()),
+                self.biomes.key() if self.biomes is not None else None)
+
+    def get_light_key(self):
+        return (self.light_angle, self.light_intensity, self.ambient_light)
 
     def generate_noise_texture(self):
-        tex_width = int(Window.width * self.tex_factor)
-        tex_height = int(Window.height * self.tex_factor)
-        
-        # Primeira passada: gerar height_map
-        self.height_map = []
-        for y in range(tex_height):
-            row = []
-            for x in range(tex_width):
-                noise_value = pnoise2(
-                    x * self.scale,
-                    y * self.scale,
-                    octaves=self.octaves,
-                    persistence=self.persistence,
-                    lacunarity=self.lacunarity,
-                    base=42
-                )
-                row.append(noise_value)
-            self.height_map.append(row)
-        
-        # Segunda passada: aplicar iluminação
-        pixels = []
-        self.texture = Texture.create(size=(tex_width, tex_height), colorfmt='rgb')
-        for y in range(tex_height):
-            for x in range(tex_width):
-                noise_value = self.height_map[y][x]
-                base_color = self.get_terrain_color(noise_value)
-                normal = self.calculate_normal(x, y)
-                shaded_color = self.apply_lighting(base_color, normal)
-                pixels.extend(shaded_color)
-        
-        self.texture.blit_buffer(bytes(pixels), colorfmt='rgb', bufferfmt='ubyte')
-        self.canvas.clear()
-        with self.canvas:
-            self.rect = Rectangle(texture=self.texture, pos=(0, 0), size=(Window.width, Window.height))
+        noise_key = self.get_noise_key()
+        if noise_key != self.noise_key:
+            # A geração em andamento usa os parâmetros antigos
+            self.worker.cancel()
+            self.chunk_cache.clear()
+            self.chunk_previews = {}
+            self.pending_chunks = set()
+            self.chunk_rects = {}
+            self.canvas.clear()
+            self.noise_key = noise_key
+        self.update_zoom()
+
+    def shutdown(self):
+        self.worker.shutdown()
+        self.generator.shutdown()
+        self.metrics.close()
+
+    def chunk_arguments(self, noise_key, chunk_x, chunk_y, lod, resolution=None):
+        """Argumentos de ``generate_chunk`` com os parâmetros de ``noise_key``, sem os caches"""
+        (scale, octaves, persistence, lacunarity, base, chunk_size, erosion_key,
+         climate) = noise_key
+        args = (chunk_x, chunk_y, lod, chunk_size, scale, octaves, persistence, lacunarity)
+        kwargs = {
+            'base': base,
+            'resolution': resolution,
+            'erosion': Erosion(*erosion_key) if erosion_key is not None else None,
+            'climate': dict(climate) if climate is not None else None,
+        }
+        return args, kwargs
+
+    def build_chunk(self, noise_key, chunk_x, chunk_y, lod, resolution=None):
+        """Gera um chunk com os parâmetros de ``noise_key`` (seguro fora da thread principal)"""
+        args, kwargs = self.chunk_arguments(noise_key, chunk_x, chunk_y, lod, resolution)
+        return generate_chunk(*args, generator=self.generator, metrics=self.metrics,
+                              disk_cache=self.disk_cache, octave_cache=self.octave_cache, **kwargs)
+
+    def get_chunk(self, chunk_x, chunk_y, lod):
+        """Chunk do cache, gerando-o na hora se ainda não existir"""
+        key = (chunk_x, chunk_y, lod)
+        chunk = self.chunk_cache.get(key)
+        if chunk is None:
+            chunk = self.build_chunk(self.noise_key, chunk_x, chunk_y, lod)
+            self.chunk_cache.put(chunk)
+        return chunk
+
+    def request_chunks(self, keys):
+        """Gera ``keys`` em segundo plano, substituindo o pedido anterior.
+
+        Prévias de resolução igual ou menor que a já mostrada não são pedidas
+        de novo.
+        """
+        self.pending_chunks = set(keys)
+        resolutions = self.preview_resolutions + (self.chunk_size,)
+        requests = [(resolution, key) for resolution in resolutions for key in keys
+                    if resolution > self.preview_resolution(key)]
+        self.worker.submit(self.generate_chunks, self.noise_key, requests)
+
+    def preview_resolution(self, key):
+        """Resolução da prévia mostrada para ``key``, ou 0 sem prévia"""
+        preview = self.chunk_previews.get(key)
+        return preview.height_map.shape[0] if preview is not None else 0
+
+    def generate_chunks(self, job, noise_key, requests):
+        """Tarefa de segundo plano: gera os (resolução, chunk) de ``requests``
+        em ordem, as prévias de todos os chunks antes da resolução cheia"""
+        chunk_size = noise_key[5]
+        if self.generator.workers > 1 and len({key for _, key in requests}) > 1:
+            self.generate_chunks_pooled(job, noise_key, requests)
+            return
+        for resolution, (chunk_x, chunk_y, lod) in requests:
+            job.check()
+            chunk = self.build_chunk(noise_key, chunk_x, chunk_y, lod, resolution)
+            # Entregue mesmo se outro pedido já substituiu este: com os
+            # mesmos parâmetros de ruído o chunk continua válido
+            self.worker.schedule(partial(self.on_chunk_ready, noise_key, chunk,
+                                         resolution == chunk_size))
+
+    def generate_chunks_pooled(self, job, noise_key, requests):
+        """Como ``generate_chunks``, com um chunk inteiro por tarefa do pool.
+
+        Faixas de um só chunk deixam a maior parte dos workers parada; com
+        vários chunks na fila todos trabalham. As prévias entram primeiro na
+        fila, então continuam chegando antes. Os workers escrevem os arrays em
+        memória compartilhada; os buffers de cor são criados aqui.
+        """
+        chunk_size = noise_key[5]
+        executor = self.generator.get_executor()
+        # Cada worker guarda uma parte do orçamento de camadas de octaves
+        octave_bytes = self.octave_cache.max_bytes // self.generator.workers
+        futures = {}
+        try:
+            for resolution, key in requests:
+                args, kwargs = self.chunk_arguments(noise_key, *key, resolution)
+                shared = SharedArrays(chunk_specs(resolution, kwargs['climate'] is not None))
+                try:
+                    future = executor.submit(generate_chunk_task, args, kwargs, shared.buffers,
+                                             self.disk_cache.directory, self.disk_cache.max_bytes,
+                                             octave_bytes)
+                except BaseException:
+                    shared.release()
+                    raise
+                futures[future] = (key, resolution == chunk_size, shared)
+            while futures:
+                job.check()
+                done, _ = wait(futures, timeout=0.05, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, complete, shared = futures.pop(future)
+                    try:
+                        records = future.result()
+                        chunk = assemble_chunk(key, shared.copy())
+                    finally:
+                        shared.release()
+                    for record in records:
+                        self.metrics.add(record)
+                    self.worker.schedule(partial(self.on_chunk_ready, noise_key, chunk, complete))
+        finally:
+            # Substituída: o que ainda está na fila do pool não é mais gerado, e
+            # a memória de uma tarefa já em execução é liberada quando ela acabar
+            for future, (_, _, shared) in futures.items():
+                future.cancel()
+                future.add_done_callback(lambda _, shared=shared: shared.release())
+
+    def on_chunk_ready(self, noise_key, chunk, complete):
+        if noise_key != self.noise_key or chunk.key in self.chunk_cache:
+            return
+        if complete:
+            self.chunk_cache.put(chunk)
+            self.chunk_previews.pop(chunk.key, None)
+            self.pending_chunks.discard(chunk.key)
+        elif chunk.height_map.shape[0] > self.preview_resolution(chunk.key):
+            # Uma prévia mais grosseira chegando depois não substitui a já mostrada
+            self.chunk_previews[chunk.key] = chunk
+        else:
+            return
         self.update_zoom()
 
+    def height_at(self, x, y):
+        """Altura do pixel (x, y) do mundo"""
+        size = self.chunk_size
+        chunk = self.get_chunk(x // size, y // size, 0)
+        return chunk.height_map[y % size][x % size]
+
+    def paint_chunk(self, chunk):
+        """Atualiza cor e iluminação do chunk se os parâmetros mudaram"""
+        palette_key = self.get_palette_key()
+        light_key = self.get_light_key()
+        if chunk.palette_key == palette_key and chunk.light_key == light_key:
+            return
+        pixels = chunk.height_map.size
+        if chunk.palette_key != palette_key:
+            if self.biomes is not None and chunk.climate is not None:
+                with self.metrics.stage('biomes', pixels=pixels, nbytes=chunk.biome_ids.nbytes):
+                    self.biomes.classify(chunk.height_map, *chunk.climate, self.sea_level,
+                                         out=chunk.biome_ids)
+                with self.metrics.stage('colorize', pixels=pixels, nbytes=chunk.base_colors.nbytes):
+                    self.biomes.colorize(chunk.height_map, chunk.biome_ids, self.sea_level,
+                                         out=chunk.base_colors)
+            else:
+                with self.metrics.stage('colorize', pixels=pixels, nbytes=chunk.base_colors.nbytes):
+                    Palette(self.terrain_types()).colorize(chunk.height_map, out=chunk.base_colors)
+            chunk.palette_key = palette_key
+        with self.metrics.stage('lighting', pixels=pixels) as record:
+            # Comparação em float64, como no caminho escalar
+            water = chunk.height_map < np.float64(self.waterTerrain.maxHeight)
+            total_light = light_map(chunk.normals[0], chunk.normals[1], self.get_light_vector(),
+                                    self.light_intensity, self.ambient_light, flat=water)
+            shade(chunk.base_colors, total_light, out=chunk.pixels)
+            # A máscara, a luz difusa e a luz total
+            record['nbytes'] = water.nbytes + 2 * total_light.nbytes
+        chunk.light_key = light_key
+        with self.metrics.stage('upload', pixels=pixels, nbytes=chunk.pixels.nbytes):
+            if chunk.texture is None:
+                height, width = chunk.height_map.shape
+                chunk.texture = Texture.create(size=(width, height), colorfmt='rgb')
+            # O buffer vai direto para a textura, sem cópia
+            chunk.texture.blit_buffer(chunk.pixels.ravel(), colorfmt='rgb', bufferfmt='ubyte')
+
     # Restante dos métodos do terrain...
     def on_touch_down(self, touch):
         if touch.is_mouse_scrolling:
             if touch.button == 'scrolldown':
-                self.zoom = max(self.zoom * 0.9, 1.0 / self.tex_factor)
+                self.zoom = max(self.zoom * 0.9, self.min_zoom)
             elif touch.button == 'scrollup':
-                self.zoom = min(self.zoom * 1.1, 10.0)
+                self.zoom = min(self.zoom * 1.1, self.max_zoom)
             self.update_zoom()
             return True
         else:
@@ -136,13 +328,8 @@ class Terrain(Widget):
         if self.last_touch_pos is not None:
             dx = touch.x - self.last_touch_pos[0]
             dy = touch.y - self.last_touch_pos[1]
-            default_range_x = float(Window.width) / self.texture.width
-            default_range_y = float(Window.height) / self.texture.height
-            new_range_x = default_range_x / self.zoom
-            new_range_y = default_range_y / self.zoom
-
-            self.offset_x -= dx * (new_range_x / Window.width)
-            self.offset_y -= dy * (new_range_y / Window.height)
+            self.view_x -= dx / self.zoom
+            self.view_y -= dy / self.zoom
             self.last_touch_pos = (touch.x, touch.y)
             self.update_zoom()
             return True
@@ -152,24 +339,60 @@ class Terrain(Widget):
         self.last_touch_pos = None
         return super().on_touch_up(touch)
 
+    def get_lod(self):
+        """Nível de detalhe com um pixel de chunk o mais perto possível de um pixel da tela"""
+        return round(-math.log2(self.zoom))
+
     def update_zoom(self):
-        default_range_x = float(Window.width) / self.texture.width
-        default_range_y = float(Window.height) / self.texture.height
-        new_range_x = default_range_x / self.zoom
-        new_range_y = default_range_y / self.zoom
-
-        min_offset_x = new_range_x / 2.0
-        max_offset_x = 1.0 - new_range_x / 2.0
-        min_offset_y = new_range_y / 2.0
-        max_offset_y = 1.0 - new_range_y / 2.0
-        self.offset_x = max(min(self.offset_x, max_offset_x), min_offset_x)
-        self.offset_y = max(min(self.offset_y, max_offset_y), min_offset_y)
-
-        u_min = self.offset_x - new_range_x / 2.0
-        u_max = self.offset_x + new_range_x / 2.0
-        v_min = self.offset_y - new_range_y / 2.0
-        v_max = self.offset_y + new_range_y / 2.0
-        self.rect.tex_coords = [u_min, v_min, u_max, v_min, u_max, v_max, u_min, v_max]
+        """Redesenha a vista; o tempo de cada quadro de pan/zoom vai para ``metrics``"""
+        with self.metrics.stage('frame', pixels=int(Window.width * Window.height)):
+            self.layout_chunks()
+
+    def layout_chunks(self):
+        """Posiciona os chunks visíveis, gerando só os que ainda não existem"""
+        self.lod = self.get_lod()
+        step = self.chunk_size * 2 ** self.lod  # pixels do mundo por chunk
+        left = self.view_x - Window.width / 2.0 / self.zoom
+        bottom = self.view_y - Window.height / 2.0 / self.zoom
+        right = self.view_x + Window.width / 2.0 / self.zoom
+        top = self.view_y + Window.height / 2.0 / self.zoom
+        
+        visible = {}
+        missing = []
+        for chunk_y in range(math.floor(bottom / step), math.floor(top / step) + 1):
+            for chunk_x in range(math.floor(left / step), math.floor(right / step) + 1):
+                key = (chunk_x, chunk_y, self.lod)
+                chunk = self.chunk_cache.get(key)
+                if chunk is None:
+                    missing.append(key)
+                    chunk = self.chunk_previews.get(key)
+                    if chunk is None:
+                        continue
+                self.paint_chunk(chunk)
+                rect = self.chunk_rects.pop(chunk.key, None)
+                if rect is None or rect.texture is not chunk.texture:
+                    if rect is not None:
+                        self.canvas.remove(rect)
+                    rect = Rectangle(texture=chunk.texture)
+                    self.canvas.add(rect)
+                rect.pos = ((chunk_x * step - left) * self.zoom, (chunk_y * step - bottom) * self.zoom)
+                rect.size = (step * self.zoom, step * self.zoom)
+                visible[chunk.key] = rect
+        
+        # Chunks que saíram da tela deixam de ser desenhados
+        for rect in self.chunk_rects.values():
+            self.canvas.remove(rect)
+        self.chunk_rects = visible
+        self.canvas.ask_update()
+        
+        # Os mais próximos do centro da vista primeiro
+        if missing and not self.pending_chunks.issuperset(missing):
+            missing.sort(key=lambda key: (key[0] * step - self.view_x) ** 2 + (key[1] * step - self.view_y) ** 2)
+            self.request_chunks(missing)
+        # Prévias de chunks que já saíram da tela não são mais necessárias
+        for key in list(self.chunk_previews):
+            if key not in visible:
+                del self.chunk_previews[key]
 
     def get_terrain_color(self, noise_value):
         if noise_value < self.waterTerrain.maxHeight:
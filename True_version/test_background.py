@@ -0,0 +1,72 @@
+"""Testes do ``BackgroundWorker``: só a tarefa mais nova chega ao fim."""
+import threading
+
+from background import BackgroundWorker
+
+
+def slow_task(job, name, started, release, log):
+    """Avisa que começou, espera ``release`` e entrega o nome, conferindo o cancelamento"""
+    started.set()
+    release.wait(5)
+    log.append(('checked', name))
+    job.check()
+    log.append(('finished', name))
+    job.deliver(log.append, ('delivered', name))
+
+
+def test_submit_supersedes_the_running_task():
+    scheduled = []
+    worker = BackgroundWorker(schedule=scheduled.append)
+    log = []
+    started, release = threading.Event(), threading.Event()
+    first = worker.submit(slow_task, 'first', started, release, log)
+    assert started.wait(5)
+    # Uma na fila e outra que a substitui antes de começar
+    queued = worker.submit(slow_task, 'queued', threading.Event(), release, log)
+    last = worker.submit(slow_task, 'last', threading.Event(), release, log)
+    release.set()
+    for future in (first, queued, last):
+        future.result(5)
+    assert log == [('checked', 'first'), ('checked', 'last'), ('finished', 'last')]
+    # A entrega só acontece na thread principal
+    for callback in scheduled:
+        callback()
+    assert log[-1] == ('delivered', 'last')
+    worker.shutdown()
+
+
+def test_delivery_is_dropped_when_superseded_before_it_runs():
+    scheduled = []
+    worker = BackgroundWorker(schedule=scheduled.append)
+    log = []
+    release = threading.Event()
+    release.set()
+    worker.submit(slow_task, 'old', threading.Event(), release, log).result(5)
+    assert len(scheduled) == 1
+    # O resultado já estava a caminho quando chegou um pedido novo
+    worker.cancel()
+    scheduled.pop()()
+    assert ('delivered', 'old') not in log
+    worker.shutdown()
+
+
+def test_cancel_stops_the_running_task_and_errors_do_not_stop_the_worker(capsys):
+    worker = BackgroundWorker()
+    log = []
+    started, release = threading.Event(), threading.Event()
+    running = worker.submit(slow_task, 'cancelled', started, release, log)
+    assert started.wait(5)
+    worker.cancel()
+    release.set()
+    running.result(5)
+    assert log == [('checked', 'cancelled')]
+
+    def failing(job):
+        raise RuntimeError('boom')
+
+    worker.submit(failing).result(5)
+    assert 'RuntimeError: boom' in capsys.readouterr().err
+    # Sem ``schedule``, a entrega é na própria thread de trabalho
+    worker.submit(slow_task, 'after', threading.Event(), release, log).result(5)
+    assert log[-1] == ('delivered', 'after')
+    worker.shutdown()
@@ -0,0 +1,58 @@
+"""Testes da classificação em biomas."""
+import numpy as np
+import pytest
+
+from biomes import Biome, BiomeTable, BinLookup
+from colorize import Palette, terrain_bands
+from heightmap import fbm_perlin
+
+
+@pytest.mark.parametrize('edges', [[-0.3, 0.0, 0.05, 0.3, 0.4, 0.55], [0.1], [],
+                                   # Limites próximos demais: usa o searchsorted
+                                   [0.0, 1e-9, 1.0]])
+def test_bin_lookup_matches_searchsorted(edges):
+    values = np.concatenate([np.linspace(-1.2, 1.2, 1001), edges,
+                             np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf)])
+    lookup = BinLookup(edges)
+    expected = np.searchsorted(np.asarray(edges, dtype=np.float64), values, side='right')
+    assert np.array_equal(lookup(values), expected)
+    assert np.array_equal(lookup(values.astype(np.float32)),
+                          np.searchsorted(np.asarray(edges, dtype=np.float64),
+                                          values.astype(np.float32), side='right'))
+
+
+def test_bin_lookup_rejects_unsorted_edges():
+    with pytest.raises(ValueError):
+        BinLookup([0.2, 0.1])
+
+
+def test_classify_matches_scalar_lookup():
+    table = BiomeTable.load()
+    sea_level = -0.15
+    height_map = fbm_perlin(31, 29, 0.05, 4, 0.5, 2.0) * np.float32(2)
+    temperature = fbm_perlin(31, 29, 0.02, 3, 0.5, 2.0, 7)
+    moisture = fbm_perlin(31, 29, 0.02, 3, 0.5, 2.0, 13)
+    ids = table.classify(height_map, temperature, moisture, sea_level)
+    edges = np.cumsum([sea_level] + table.height_steps)[1:]
+    lapse_rate = table.climate['lapse_rate']
+    for (y, x), value in np.ndenumerate(height_map):
+        zone = sum(float(value) >= edge for edge in edges)
+        warmth = float(temperature[y, x]) - lapse_rate * max(float(value) - sea_level, 0.0)
+        column = sum(warmth >= edge for edge in table.temperature.edges)
+        row = sum(float(moisture[y, x]) >= edge for edge in table.moisture.edges)
+        assert ids[y, x] == table.table[zone, column, row], (x, y)
+
+
+def test_single_climate_table_colors_like_the_palette():
+    # Uma faixa de temperatura e de umidade: só a altura decide, como no Palette
+    sea_level = -0.15
+    bands = terrain_bands(sea_level)
+    biomes = [Biome(f'band{index}', band.minColor, band.maxColor)
+              for index, band in enumerate(bands)]
+    table = BiomeTable(biomes, [0.0, 0.05, 0.25, 0.1, 0.15], [], [],
+                       np.arange(len(bands)).reshape(-1, 1, 1))
+    height_map = fbm_perlin(31, 29, 0.05, 4, 0.5, 2.0) * np.float32(2)
+    flat = np.zeros_like(height_map)
+    ids = table.classify(height_map, flat, flat, sea_level)
+    colors = table.colorize(height_map, ids, sea_level)
+    assert np.array_equal(colors, Palette(bands).colorize(height_map))
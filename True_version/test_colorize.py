@@ -0,0 +1,113 @@
+"""Testes da cor e da iluminação sobre arrays inteiros.
+
+A referência é o cálculo pixel a pixel original do ``Terrain``
+(``get_terrain_color``, ``calculate_normal`` e ``apply_lighting``), copiado
+aqui sem o Kivy para rodar em qualquer ambiente.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from colorize import Palette, RenderScratch, light_vector, render_pixels, terrain_bands
+from heightmap import fbm_perlin
+
+WIDTH, HEIGHT = 23, 17
+
+
+def reference_color(noise_value, bands):
+    """``get_terrain_color``: a primeira faixa com altura < maxHeight, a última para o resto"""
+    for terrain in bands[:-1]:
+        if noise_value < terrain.maxHeight:
+            break
+    else:
+        terrain = bands[-1]
+    if noise_value < terrain.minHeight:
+        return terrain.minColor
+    elif noise_value > terrain.maxHeight:
+        return terrain.maxColor
+    factor = (noise_value - terrain.minHeight) / (terrain.maxHeight - terrain.minHeight)
+    return tuple(int(terrain.minColor[i] + (terrain.maxColor[i] - terrain.minColor[i]) * factor)
+                 for i in range(3))
+
+
+def reference_normal(height_map, x, y, water_level, strength=50.0):
+    """``calculate_normal``, com a borda do mapa plana"""
+    if height_map[y][x] < water_level:
+        return (0, 0, 1)
+    if x <= 0 or x >= len(height_map[0]) - 1:
+        dx = 0
+    else:
+        dx = (height_map[y][x - 1] - height_map[y][x + 1]) * strength
+    if y <= 0 or y >= len(height_map) - 1:
+        dy = 0
+    else:
+        dy = (height_map[y - 1][x] - height_map[y + 1][x]) * strength
+    return (-dx, -dy, 1.0)
+
+
+def reference_lighting(color, normal, light_angle, light_intensity, ambient_light):
+    """``apply_lighting``"""
+    angle = math.radians(light_angle)
+    light_dir = (math.cos(angle), math.sin(angle), 0.5)
+    diffuse = max(0, sum(n * l for n, l in zip(normal, light_dir)))
+    diffuse = min(diffuse * light_intensity, 1.0)
+    total_light = ambient_light + (1 - ambient_light) * diffuse
+    return tuple(min(int(c * total_light), 255) for c in color)
+
+
+def sample_heights():
+    # Amplitude maior para passar por todas as faixas, da água à neve
+    return fbm_perlin(WIDTH, HEIGHT, 0.08, 3, 0.5, 2.0) * np.float32(3)
+
+
+@pytest.mark.parametrize('sea_level, light_angle, light_intensity, ambient_light',
+                         [(-0.15, 45.0, 0.8, 0.6), (-0.1, 35.0, 1.3, 0.25), (0.2, 200.0, 0.5, 0.0)])
+def test_render_pixels_matches_scalar_path(sea_level, light_angle, light_intensity, ambient_light):
+    height_map = sample_heights()
+    bands = terrain_bands(sea_level)
+    light = (light_vector(light_angle), light_intensity, ambient_light, bands[0].maxHeight)
+    pixels = render_pixels(height_map, Palette(bands), light)
+    heights = height_map.tolist()
+    for y in range(HEIGHT):
+        for x in range(WIDTH):
+            color = reference_color(heights[y][x], bands)
+            normal = reference_normal(heights, x, y, bands[0].maxHeight)
+            expected = reference_lighting(color, normal, light_angle, light_intensity,
+                                          ambient_light)
+            assert tuple(pixels[y, x]) == expected, (x, y)
+
+
+def test_colorize_matches_scalar_colors():
+    height_map = sample_heights()
+    bands = terrain_bands(-0.15)
+    colors = Palette(bands).colorize(height_map)
+    for (y, x), value in np.ndenumerate(height_map):
+        assert tuple(colors[y, x]) == reference_color(float(value), bands), (x, y)
+
+
+def test_render_pixels_scratch_matches_allocating_path():
+    height_map = sample_heights()
+    bands = terrain_bands(0.0)
+    palette = Palette(bands)
+    light = (light_vector(60.0), 1.0, 0.3, bands[0].maxHeight)
+    out = np.empty(height_map.shape + (3,), dtype=np.uint8)
+    scratch = RenderScratch(height_map.shape)
+    for _ in range(2):
+        render_pixels(height_map, palette, light, out=out, scratch=scratch)
+        assert np.array_equal(out, render_pixels(height_map, palette, light))
+
+
+def test_terrain_methods_match_reference():
+    pytest.importorskip('kivy')
+    from terrain import Terrain
+    terrain = Terrain.__new__(Terrain)
+    terrain.sea_level, terrain.light_angle = -0.1, 35.0
+    terrain.light_intensity, terrain.ambient_light = 1.3, 0.25
+    terrain.update_terrain_ranges()
+    bands = terrain_bands(terrain.sea_level)
+    for value in np.linspace(-1.0, 1.0, 201):
+        assert terrain.get_terrain_color(value) == reference_color(value, bands)
+    for normal in [(0, 0, 1), (0.3, -0.8, 1.0), (-2.0, 1.5, 1.0)]:
+        assert (terrain.apply_lighting((200, 120, 40), normal)
+                == reference_lighting((200, 120, 40), normal, 35.0, 1.3, 0.25))
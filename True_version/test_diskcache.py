@@ -0,0 +1,59 @@
+"""Testes do cache em disco."""
+import io
+import os
+
+import numpy as np
+
+from diskcache import DiskCache
+
+
+def test_put_then_get_returns_the_array(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    key = cache.key('perlin', 0.005, 8, 0.6, 2.0, 42)
+    assert cache.get(key) is None
+    cache.put(key, array)
+    cached = cache.get(key)
+    assert cached.dtype == array.dtype
+    assert np.array_equal(cached, array)
+    # Outra instância no mesmo diretório, como numa nova execução
+    assert np.array_equal(DiskCache(str(tmp_path)).get(key), array)
+
+
+def test_key_depends_on_every_parameter():
+    keys = {DiskCache.key('perlin', 0.005, 8), DiskCache.key('perlin', 0.005, 7),
+            DiskCache.key('perlin', 0.0050000001, 8), DiskCache.key('opensimplex', 0.005, 8)}
+    assert len(keys) == 4
+    assert DiskCache.key('perlin', 0.005, 8) == DiskCache.key('perlin', 0.005, 8)
+
+
+def test_evicts_least_recently_used_files(tmp_path):
+    array = np.zeros(1000, dtype=np.float32)
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    cache = DiskCache(str(tmp_path), max_bytes=3 * len(buffer.getvalue()))
+    keys = [cache.key(index) for index in range(4)]
+    for index, key in enumerate(keys):
+        cache.put(key, array)
+        # Datas de modificação distintas, na ordem de uso
+        os.utime(cache.path(key), (index, index))
+    assert not os.path.exists(cache.path(keys[0]))
+    # Ler marca o arquivo como usado agora
+    cache.get(keys[1])
+    cache.put(cache.key('new'), array)
+    assert cache.nbytes <= cache.max_bytes
+    remaining = [key for key in keys if os.path.exists(cache.path(key))]
+    assert remaining == [keys[1], keys[3]]
+
+
+def test_skips_files_removed_by_another_cache(tmp_path):
+    array = np.zeros(100, dtype=np.float32)
+    first = DiskCache(str(tmp_path))
+    second = DiskCache(str(tmp_path))
+    for index in range(3):
+        first.put(first.key(index), array)
+    second.clear()
+    # ``first`` ainda conta os arquivos que o outro apagou
+    first.evict()
+    first.clear()
+    assert first.entries() == [] and first.get(first.key(0)) is None
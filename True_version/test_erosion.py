@@ -0,0 +1,51 @@
+"""Testes da erosão: tiles e chunks dão o mesmo resultado do mapa inteiro."""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from chunks import generate_chunk
+from erosion import Erosion
+from heightmap import fbm_perlin
+
+
+def test_tiled_erosion_matches_whole_map():
+    erosion = Erosion(thermal_iterations=5, hydraulic_iterations=7)
+    height_map = fbm_perlin(45, 38, 0.03, 5, 0.6, 2.0)
+    expected = erosion.apply(height_map)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        tiled = erosion.apply(height_map, executor=executor, tile=16, exchange=3)
+    assert tiled.dtype == height_map.dtype
+    assert np.array_equal(tiled, expected)
+
+
+def test_thermal_erosion_moves_material_without_creating_it():
+    height_map = fbm_perlin(32, 32, 0.05, 5, 0.6, 2.0).astype(np.float64)
+    eroded = Erosion(thermal_iterations=10, hydraulic_iterations=0).apply(height_map)
+    assert not np.array_equal(eroded, height_map)
+    assert np.isclose(eroded.sum(), height_map.sum())
+    # Os declives ficam mais suaves
+    assert np.abs(np.diff(eroded, axis=1)).max() < np.abs(np.diff(height_map, axis=1)).max()
+
+
+def test_eroded_chunks_join_without_seams():
+    erosion = Erosion(thermal_iterations=3, hydraulic_iterations=3)
+    size, *params = (32, 0.01, 5, 0.6, 2.0)
+    left = generate_chunk(0, 0, 0, size, *params, erosion=erosion)
+    right = generate_chunk(1, 0, 0, size, *params, erosion=erosion)
+    above = generate_chunk(0, 1, 0, size, *params, erosion=erosion)
+    # Um chunk com o dobro do lado cobre os três: a erosão não vê as bordas
+    whole = generate_chunk(0, 0, 0, 2 * size, *params, erosion=erosion)
+    assert np.array_equal(left.height_map, whole.height_map[:size, :size])
+    assert np.array_equal(right.height_map, whole.height_map[:size, size:])
+    assert np.array_equal(above.height_map, whole.height_map[size:, :size])
+    for normal, whole_normal in zip(right.normals, whole.normals):
+        assert np.array_equal(normal, whole_normal[:size, size:])
+    plain = generate_chunk(1, 0, 0, size, *params)
+    assert not np.array_equal(plain.height_map, right.height_map)
+
+
+def test_previews_are_not_eroded():
+    erosion = Erosion(thermal_iterations=3, hydraulic_iterations=3)
+    preview = generate_chunk(2, 1, 0, 32, 0.01, 5, 0.6, 2.0, resolution=8, erosion=erosion)
+    plain = generate_chunk(2, 1, 0, 32, 0.01, 5, 0.6, 2.0, resolution=8)
+    assert np.array_equal(preview.height_map, plain.height_map)
@@ -0,0 +1,134 @@
+"""Testes do ``export.py``: as imagens e as malhas exportadas, decodificadas,
+voltam às alturas e normais do mundo."""
+import json
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import export
+import render
+from heightmap import fbm_perlin
+
+WIDTH, HEIGHT, TILE = 64, 32, 32
+X0, Y0 = -9, 21
+NOISE = ['--width', str(WIDTH), '--height', str(HEIGHT), '--x0', str(X0), '--y0', str(Y0),
+         '--scale', '0.02', '--octaves', '5', '--quiet']
+
+
+def read_png(path):
+    """Amostras de um PNG sem entrelaçamento e com filtro 0 (os do ``PNGWriter``)"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    position = 8
+    chunks = []
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        chunks.append((kind, data[position + 8:position + 8 + length]))
+        position += 12 + length
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', chunks[0][1][:10])
+    channels = {0: 1, 2: 3, 6: 4}[color_type]
+    raw = zlib.decompress(b''.join(body for kind, body in chunks if kind == b'IDAT'))
+    dtype = '>u2' if bit_depth == 16 else np.uint8
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, -1)
+    assert not rows[:, 0].any()
+    samples = rows[:, 1:].copy().view(dtype).reshape(height, width, channels)
+    return samples[..., 0] if channels == 1 else samples
+
+
+def read_glb(path):
+    """JSON e arrays (posições, normais, uv, triângulos) de um .glb do ``write_glb``"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, length = struct.unpack('<4sII', data[:12])
+    assert (magic, version, length) == (b'glTF', 2, len(data))
+    json_length, = struct.unpack('<I', data[12:16])
+    gltf = json.loads(data[20:20 + json_length])
+    binary = data[20 + json_length + 8:]
+    types = {export.FLOAT: '<f4', export.UNSIGNED_SHORT: '<u2', export.UNSIGNED_INT: '<u4'}
+    widths = {'VEC3': 3, 'VEC2': 2, 'SCALAR': 1}
+    arrays = []
+    for accessor in gltf['accessors']:
+        view = gltf['bufferViews'][accessor['bufferView']]
+        array = np.frombuffer(binary, dtype=types[accessor['componentType']],
+                              count=accessor['count'] * widths[accessor['type']],
+                              offset=view['byteOffset'])
+        arrays.append(array.reshape(accessor['count'], -1))
+    return gltf, arrays
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    output = tmp_path_factory.mktemp('export')
+    assert export.main([str(output), *NOISE, '--tile', str(TILE), '--lods', '2',
+                        '--meshes', 'glb', 'obj', '--workers', '1']) == 0
+    return output
+
+
+def world(width, height, x0, y0):
+    return fbm_perlin(width, height, 0.02, 5, 0.6, 2.0, 42, x0=x0, y0=y0)
+
+
+def test_heightmap_decodes_to_the_world_heights(exported):
+    heights = read_png(exported / 'heightmap.png').astype(np.float64) / 65535 * 2 - 1
+    # A linha 0 da imagem é o maior y
+    expected = world(WIDTH, HEIGHT, X0, Y0)[::-1]
+    assert np.abs(heights - expected).max() <= 1.0 / 65535 + 1e-9
+
+
+def test_normal_map_decodes_to_the_world_normals(exported):
+    normals = read_png(exported / 'normals.png').astype(np.float64) / 255 * 2 - 1
+    halo = world(WIDTH + 2, HEIGHT + 2, X0 - 1, Y0 - 1)
+    slope_x, slope_y = export.gradients(halo, 100.0, 1.0)
+    expected = np.stack([-slope_x, -slope_y, np.ones_like(slope_x)], axis=-1)
+    expected /= np.linalg.norm(expected, axis=-1, keepdims=True)
+    assert np.abs(normals - expected[::-1]).max() <= 1.0 / 255 + 1e-9
+
+
+def test_manifest_and_meshes(exported):
+    manifest = json.loads((exported / 'export.json').read_text())
+    assert manifest['tiles'] == [WIDTH // TILE, HEIGHT // TILE]
+    tile_x, tile_y = 1, 0
+    for lod in range(2):
+        step = 2 ** lod
+        gltf, (positions, normals, uv, triangles) = read_glb(
+            exported / manifest['meshes']['glb'].format(lod=lod, x=tile_x, y=tile_y))
+        size = TILE // step + 1
+        assert len(positions) == size * size
+        assert triangles.max() == len(positions) - 1 and triangles.size == 6 * (size - 1) ** 2
+        assert np.allclose(np.linalg.norm(normals, axis=1), 1.0, atol=1e-6)
+        # Altura dos vértices: as amostras do mundo a cada ``step`` pixels
+        samples = world(TILE + 1, TILE + 1, X0 + tile_x * TILE, Y0 + tile_y * TILE)
+        samples = samples[::step, ::step]
+        assert np.allclose(positions[:, 1], (samples * 50.0).ravel(), atol=1e-5)
+        assert np.array_equal(positions.min(axis=0), gltf['accessors'][0]['min'])
+
+        lines = (exported / manifest['meshes']['obj'].format(lod=lod, x=tile_x, y=tile_y)
+                 ).read_text().splitlines()
+        vertices = np.array([line.split()[1:] for line in lines if line.startswith('v ')],
+                            dtype=np.float64)
+        faces = [line for line in lines if line.startswith('f ')]
+        assert np.allclose(vertices, positions, atol=1e-4)
+        assert len(faces) == triangles.size // 3
+
+
+def test_saved_heightmap_exports_the_same_images(exported, tmp_path):
+    stored = tmp_path / 'map.npy'
+    render.main([str(tmp_path / 'map.raw'), *NOISE, '--save-heightmap', str(stored),
+                 '--workers', '1'])
+    output = tmp_path / 'stored'
+    export.main([str(output), '--heightmap', str(stored), '--tile', str(TILE), '--lods', '2',
+                 '--meshes', '--quiet'])
+    for name in ('heightmap.png', 'normals.png'):
+        assert np.array_equal(read_png(output / name), read_png(exported / name))
+
+
+@pytest.mark.parametrize('arguments', [['--tile', '0'], ['--tile', '24'], ['--lods', '0'],
+                                       ['--tile', '32', '--lods', '7'], ['--seed', '256']])
+def test_rejects_bad_tiling_as_usage_errors(tmp_path, capsys, arguments):
+    with pytest.raises(SystemExit):
+        export.main([str(tmp_path / 'out'), *NOISE, *arguments])
+    assert 'error:' in capsys.readouterr().err
+    assert not (tmp_path / 'out').exists()
@@ -0,0 +1,70 @@
+"""Testes do ``gradnoise`` contra o ``pnoise2``/``pnoise3`` e o ``opensimplex``."""
+import numpy as np
+import pytest
+
+from gradnoise import fbm_noise, opensimplex_noise, perlin_noise
+
+
+def random_points(count, dims, high=1024.0):
+    return np.random.default_rng(dims).uniform(0, high, (dims, count))
+
+
+@pytest.mark.parametrize('dims', [2, 3])
+def test_perlin_matches_the_noise_package(dims):
+    noise = pytest.importorskip('noise')
+    reference = noise.pnoise2 if dims == 2 else noise.pnoise3
+    # O pnoise arredonda as coordenadas para float32: usa pontos exatos em float32
+    points = random_points(2000, dims).astype(np.float32).astype(np.float64)
+    expected = [reference(*map(float, point)) for point in points.T]
+    assert np.allclose(perlin_noise(*points), expected, rtol=0, atol=2e-6)
+    assert np.allclose(perlin_noise(*points, dtype=np.float32), expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('dims', [2, 3])
+def test_opensimplex_matches_the_opensimplex_package(dims):
+    opensimplex = pytest.importorskip('opensimplex')
+    generator = opensimplex.OpenSimplex(1234)
+    reference = generator.noise2 if dims == 2 else generator.noise3
+    points = random_points(2000, dims, high=100.0)
+    values = opensimplex_noise(*points, seed=1234)
+    expected = [reference(*map(float, point)) for point in points.T]
+    # Em 3D o original deixa alguns vértices da borda do kernel de fora
+    assert np.allclose(values, expected, rtol=0, atol=1e-9 if dims == 2 else 2e-4)
+
+
+@pytest.mark.parametrize('noise', [perlin_noise, opensimplex_noise])
+def test_grid_matches_pointwise_evaluation(noise):
+    x = np.linspace(-3.7, 12.2, 41)
+    y = np.linspace(5.1, -8.3, 23)[:, None]
+    grid = noise(x, y, 0.75, seed=99)
+    xs, ys = np.broadcast_arrays(x, y)
+    points = noise(xs.ravel(), ys.ravel(), np.full(xs.size, 0.75), seed=99)
+    assert grid.shape == (23, 41)
+    assert np.allclose(grid.ravel(), points, rtol=0, atol=1e-12)
+    out = np.empty((23, 41))
+    assert noise(x, y, 0.75, seed=99, out=out) is out and np.array_equal(out, grid)
+
+
+def test_seeds_change_the_noise():
+    x, y = random_points(500, 2, high=50.0)
+    assert not np.allclose(perlin_noise(x, y, seed=1), perlin_noise(x, y, seed=2))
+    largest = 2 ** 63 - 1
+    assert np.array_equal(perlin_noise(x, y, seed=largest), perlin_noise(x, y, seed=largest))
+    with pytest.raises(ValueError):
+        perlin_noise(x, y, seed=2 ** 63)
+
+
+def test_fbm_sums_the_octaves():
+    x = np.linspace(0, 9, 31)
+    y = np.linspace(0, 5, 17)[:, None]
+    octaves, persistence, lacunarity = 4, 0.5, 2.0
+    expected = sum(persistence ** octave
+                   * perlin_noise(x * lacunarity ** octave, y * lacunarity ** octave,
+                                  0.3 * lacunarity ** octave, dtype=np.float64)
+                   for octave in range(octaves))
+    expected /= sum(persistence ** octave for octave in range(octaves))
+    values = fbm_noise(perlin_noise, x, y, 0.3, octaves, persistence, lacunarity,
+                       dtype=np.float64)
+    assert np.allclose(values, expected, rtol=0, atol=1e-12)
+    with pytest.raises(ValueError):
+        fbm_noise(perlin_noise, x, y, 0.3, 0, persistence, lacunarity)
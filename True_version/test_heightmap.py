@@ -0,0 +1,54 @@
+"""Testes do motor de heightmap em grades pequenas.
+
+Comparam as grades com ``noise.pnoise2`` e ``opensimplex.noise2`` pixel a
+pixel; cada comparação é pulada quando a biblioteca não está instalada.
+"""
+import numpy as np
+import pytest
+
+from heightmap import fbm_opensimplex, fbm_perlin
+
+WIDTH, HEIGHT = 23, 17
+PARAMS = (0.05, 4, 0.5, 2.0)
+
+
+def test_fbm_perlin_matches_pnoise2():
+    noise = pytest.importorskip('noise')
+    scale, octaves, persistence, lacunarity = PARAMS
+    x0, y0 = -5, 3
+    grid = fbm_perlin(WIDTH, HEIGHT, scale, octaves, persistence, lacunarity, base=42,
+                      x0=x0, y0=y0)
+    expected = np.array([[noise.pnoise2(x * scale, y * scale, octaves=octaves,
+                                        persistence=persistence, lacunarity=lacunarity,
+                                        base=42)
+                          for x in range(x0, x0 + WIDTH)]
+                         for y in range(y0, y0 + HEIGHT)], dtype=np.float32)
+    assert grid.dtype == np.float32
+    assert np.array_equal(grid, expected)
+
+
+def test_fbm_opensimplex_matches_noise2():
+    opensimplex = pytest.importorskip('opensimplex')
+    scale, octaves, persistence, lacunarity = PARAMS
+    x0, y0 = 4, -2
+    grid = fbm_opensimplex(WIDTH, HEIGHT, scale, octaves, persistence, lacunarity, seed=42,
+                           x0=x0, y0=y0)
+    generator = opensimplex.OpenSimplex(seed=42)
+    expected = np.empty((HEIGHT, WIDTH))
+    for row, y in enumerate(range(y0, y0 + HEIGHT)):
+        for column, x in enumerate(range(x0, x0 + WIDTH)):
+            # Como em MyWidget.generate_noise_texture
+            noise_value = 0
+            max_amplitude = 0
+            amplitude = 1.0
+            frequency = 1.0
+            for _ in range(octaves):
+                nx = x * scale * frequency
+                ny = y * scale * frequency
+                noise_value += generator.noise2(nx, ny) * amplitude
+                max_amplitude += amplitude
+                amplitude *= persistence
+                frequency *= lacunarity
+            expected[row, column] = noise_value / max_amplitude
+    assert grid.dtype == np.float32
+    np.testing.assert_allclose(grid, expected, rtol=0, atol=1e-6)
@@ -0,0 +1,28 @@
+"""Testes dos heightmaps guardados em ``.npy`` com borda."""
+import numpy as np
+import pytest
+
+from heightstore import BORDER, create_heightmap, heightmap_size, open_heightmap
+
+
+def test_create_adds_the_border(tmp_path):
+    path = str(tmp_path / 'map.npy')
+    store = create_heightmap(path, 12, 5)
+    assert store.shape == (5 + 2 * BORDER, 12 + 2 * BORDER)
+    store[...] = np.arange(store.size, dtype=np.float32).reshape(store.shape)
+    store.flush()
+    del store
+    height_map = open_heightmap(path)
+    assert heightmap_size(height_map) == (12, 5)
+    # Um .npy comum, que outras ferramentas abrem sem este módulo
+    assert np.array_equal(np.load(path), height_map)
+
+
+@pytest.mark.parametrize('array', [np.zeros((4, 4), dtype=np.float64),
+                                   np.zeros((2, 9), dtype=np.float32),
+                                   np.zeros(16, dtype=np.float32)])
+def test_open_rejects_other_arrays(tmp_path, array):
+    path = str(tmp_path / 'other.npy')
+    np.save(path, array)
+    with pytest.raises(ValueError):
+        open_heightmap(path)
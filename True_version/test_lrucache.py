@@ -0,0 +1,27 @@
+"""Testes do cache LRU limitado por bytes."""
+import numpy as np
+
+from lrucache import LRUCache
+
+
+def test_evicts_least_recently_used_values():
+    cache = LRUCache(30, size=len)
+    for key in 'abc':
+        cache.put(key, key * 10)
+    # Ler marca como usado agora
+    assert cache.get('a') == 'a' * 10
+    cache.put('d', 'd' * 10)
+    assert list(cache.items) == ['c', 'a', 'd']
+    assert cache.nbytes == 30 and 'b' not in cache and cache.get('b') is None
+
+
+def test_replacing_a_value_updates_the_size():
+    cache = LRUCache(1000)
+    cache.put('a', np.zeros(100, dtype=np.float32))
+    cache.put('a', np.zeros(10, dtype=np.float32))
+    assert (len(cache), cache.nbytes) == (1, 40)
+    # Um valor maior que o limite fica sozinho
+    cache.put('b', np.zeros(1000, dtype=np.float32))
+    assert list(cache.items) == ['b'] and cache.nbytes == 4000
+    cache.clear()
+    assert (len(cache), cache.nbytes) == (0, 0)
@@ -0,0 +1,46 @@
+"""Testes do cache de camadas de octaves."""
+import numpy as np
+import pytest
+
+from heightmap import fbm_opensimplex, fbm_perlin
+from octavecache import OctaveCache
+from parallel import ParallelGenerator
+
+WIDTH, HEIGHT = 23, 17
+
+
+@pytest.mark.parametrize('backend, fbm', [('perlin', fbm_perlin),
+                                          ('opensimplex', fbm_opensimplex)])
+def test_fbm_matches_direct_generation(backend, fbm):
+    cache = OctaveCache()
+    # Mudar persistence, octaves e detail_octaves reaproveita as camadas
+    for octaves, persistence, detail_octaves in ((4, 0.5, None), (4, 0.7, None), (4, 0.5, 2),
+                                                 (6, 0.5, None)):
+        grid = cache.fbm(backend, WIDTH, HEIGHT, 0.05, octaves, persistence, 2.0, 42,
+                         x0=3, y0=9, detail_octaves=detail_octaves)
+        expected = fbm(WIDTH, HEIGHT, 0.05, octaves, persistence, 2.0, 42, x0=3, y0=9,
+                       detail_octaves=detail_octaves)
+        assert np.array_equal(grid, expected)
+    assert len(cache) == 6
+
+
+def test_layers_from_a_parallel_generator_match():
+    cache = OctaveCache()
+    generator = ParallelGenerator(workers=2, use_processes=False, band_rows=4)
+    try:
+        grid = cache.fbm('perlin', WIDTH, HEIGHT, 0.05, 4, 0.5, 2.0, 42, generator=generator)
+    finally:
+        generator.shutdown()
+    assert np.array_equal(grid, fbm_perlin(WIDTH, HEIGHT, 0.05, 4, 0.5, 2.0, 42))
+
+
+def test_evicts_least_recently_used_layers():
+    layer_bytes = WIDTH * HEIGHT * 4
+    cache = OctaveCache(max_bytes=3 * layer_bytes)
+    cache.fbm('perlin', WIDTH, HEIGHT, 0.05, 3, 0.5, 2.0, 42)
+    cache.fbm('perlin', WIDTH, HEIGHT, 0.05, 4, 0.5, 2.0, 42)
+    assert len(cache) == 3
+    assert cache.nbytes == 3 * layer_bytes
+    # A octave 0 foi a menos usada e saiu; a 3 acabou de entrar
+    assert ('perlin', WIDTH, HEIGHT, 0.05, 0, 2.0, 42, 0, 0) not in cache
+    assert ('perlin', WIDTH, HEIGHT, 0.05, 3, 2.0, 42, 0, 0) in cache
@@ -0,0 +1,57 @@
+"""Testes da geração em paralelo: o resultado é o mesmo de um único processo."""
+import numpy as np
+import pytest
+
+from chunks import assemble_chunk, chunk_arrays, chunk_specs, generate_chunk, generate_chunk_task
+from colorize import Palette, light_vector, render_pixels, terrain_bands
+from heightmap import fbm_perlin
+from parallel import ParallelGenerator, SharedArrays
+
+WIDTH, HEIGHT = 23, 17
+PARAMS = (0.05, 4, 0.5, 2.0)
+
+
+@pytest.mark.parametrize('band_rows', [5, None])
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_heightmap_matches_single_process(band_rows, use_processes):
+    expected = fbm_perlin(WIDTH, HEIGHT, *PARAMS, 42, x0=7, y0=-11)
+    generator = ParallelGenerator(workers=2, use_processes=use_processes, band_rows=band_rows)
+    try:
+        grid = generator.heightmap(fbm_perlin, WIDTH, HEIGHT, *PARAMS, 42, x0=7, y0=-11)
+    finally:
+        generator.shutdown()
+    assert np.array_equal(grid, expected)
+
+
+def test_render_matches_single_process():
+    bands = terrain_bands(-0.15)
+    palette = Palette(bands)
+    light = (light_vector(45.0), 0.8, 0.6, bands[0].maxHeight)
+    expected = fbm_perlin(WIDTH, HEIGHT, *PARAMS, 42)
+    generator = ParallelGenerator(workers=2, band_rows=4)
+    try:
+        grid, pixels = generator.render(fbm_perlin, WIDTH, HEIGHT, *PARAMS, 42, palette=palette,
+                                        light=light)
+    finally:
+        generator.shutdown()
+    assert np.array_equal(grid, expected)
+    # Cada faixa calcula as normais com uma linha de borda dos vizinhos
+    assert np.array_equal(pixels, render_pixels(expected, palette, light))
+
+
+@pytest.mark.parametrize('climate', [None, {'scale': 0.5}])
+def test_chunk_task_writes_the_chunk_arrays(climate):
+    args = (1, -2, 0, 32, 0.01, 5, 0.6, 2.0)
+    kwargs = {'resolution': 16, 'climate': climate}
+    expected = generate_chunk(*args, **kwargs)
+    shared = SharedArrays(chunk_specs(16, climate is not None))
+    try:
+        records = generate_chunk_task(args, kwargs, shared.buffers)
+        chunk = assemble_chunk(expected.key, shared.copy())
+    finally:
+        shared.release()
+    assert {record['stage'] for record in records} >= {'noise', 'normals'}
+    for array, reference in zip(chunk_arrays(chunk), chunk_arrays(expected), strict=True):
+        assert array.dtype == reference.dtype
+        assert np.array_equal(array, reference)
+    assert chunk.base_colors.shape == (16, 16, 3)
@@ -0,0 +1,51 @@
+"""Testes do ``render.py``: a imagem não depende das faixas, e o heightmap
+salvo com ``--save-heightmap`` recolorido com ``--heightmap`` dá a mesma imagem."""
+import numpy as np
+import pytest
+
+import render
+from colorize import Palette, light_vector, render_pixels, terrain_bands
+from heightmap import fbm_perlin
+from heightstore import heightmap_size, open_heightmap
+
+WIDTH, HEIGHT = 37, 29
+NOISE = ['--width', str(WIDTH), '--height', str(HEIGHT), '--x0', '-5', '--y0', '11',
+         '--scale', '0.03', '--octaves', '5', '--quiet']
+
+
+def expected_image():
+    """A imagem inteira de uma vez, de cima para baixo, com os vizinhos reais na borda"""
+    halo = fbm_perlin(WIDTH + 2, HEIGHT + 2, 0.03, 5, 0.6, 2.0, 42, x0=-6, y0=10)
+    bands = terrain_bands(-0.15)
+    light = (light_vector(45), 0.8, 0.6, bands[0].maxHeight)
+    return halo, render_pixels(halo, Palette(bands), light)[-2:0:-1, 1:-1]
+
+
+@pytest.mark.parametrize('strip_rows, workers', [(64, 1), (7, 2), (1, 1)])
+def test_strips_match_the_whole_image(tmp_path, strip_rows, workers):
+    output = tmp_path / 'map.raw'
+    assert render.main([str(output), *NOISE, '--strip-rows', str(strip_rows),
+                        '--workers', str(workers)]) == 0
+    _, expected = expected_image()
+    assert output.read_bytes() == expected.tobytes()
+
+
+def test_saved_heightmap_round_trip(tmp_path):
+    generated, stored, recolored = (tmp_path / name for name in ('a.raw', 'map.npy', 'b.raw'))
+    render.main([str(generated), *NOISE, '--strip-rows', '8', '--workers', '1',
+                 '--save-heightmap', str(stored)])
+    halo, _ = expected_image()
+    height_map = open_heightmap(str(stored))
+    # O arquivo guarda também a borda de 1 pixel em volta do mapa
+    assert heightmap_size(height_map) == (WIDTH, HEIGHT)
+    assert np.array_equal(height_map, halo)
+    del height_map
+    render.main([str(recolored), '--heightmap', str(stored), '--strip-rows', '5', '--quiet'])
+    assert recolored.read_bytes() == generated.read_bytes()
+
+
+def test_rejects_seeds_outside_the_pnoise2_range(capsys):
+    for seed in ('256', '-1'):
+        with pytest.raises(SystemExit):
+            render.main(['unused.raw', *NOISE, '--seed', seed])
+        assert '--seed' in capsys.readouterr().err
@@ -0,0 +1,89 @@
+"""Testes do servidor de tiles: pedidos simultâneos do mesmo tile geram uma vez só."""
+import asyncio
+import io
+from http import HTTPStatus
+
+import numpy as np
+
+from chunks import generate_chunk
+from tileserver import TileServer, parse_parameters
+
+TILE_SIZE, MAX_ZOOM = 16, 2
+
+
+def run(server, coroutine):
+    """Roda ``coroutine`` e espera as gravações em disco e o pool terminarem"""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_coalesced(tmp_path):
+    server = TileServer(workers=1, cache_dir=str(tmp_path), max_zoom=MAX_ZOOM,
+                        tile_size=TILE_SIZE)
+    params = parse_parameters('octaves=4')
+    key = ('npy', 1, 3, 0, params)
+
+    async def requests():
+        results = await asyncio.gather(*(server.get_tile(key) for _ in range(5)))
+        return results + [await server.get_tile(key)]
+
+    results = run(server, requests())
+    sources = [source for _, source in results]
+    assert sorted(sources[:5]) == ['coalesced'] * 4 + ['generated']
+    assert sources[5] == 'memory'
+    assert len({data for data, _ in results}) == 1
+    assert not server.pending
+
+    # y dos tiles cresce para baixo; o arquivo guarda as linhas de cima para baixo
+    seed, scale, octaves, persistence, lacunarity, *_ = params
+    chunk = generate_chunk(3, -1, MAX_ZOOM - 1, TILE_SIZE, scale, octaves, persistence,
+                           lacunarity, base=seed)
+    assert np.array_equal(np.load(io.BytesIO(results[0][0])), chunk.height_map[::-1])
+
+    # Um novo servidor no mesmo diretório acha o tile no disco
+    restarted = TileServer(workers=1, cache_dir=str(tmp_path), max_zoom=MAX_ZOOM,
+                           tile_size=TILE_SIZE)
+    data, source = run(restarted, restarted.get_tile(key))
+    assert (data, source) == (results[0][0], 'disk')
+
+
+def test_memory_cache_keeps_the_recent_tiles(tmp_path):
+    server = TileServer(workers=1, memory_bytes=1, cache_dir=str(tmp_path), max_zoom=MAX_ZOOM,
+                        tile_size=TILE_SIZE)
+    params = parse_parameters('')
+    keys = [('npy', MAX_ZOOM, x, 0, params) for x in range(3)]
+
+    async def requests():
+        first, _ = await server.get_tile(keys[0])
+        # Tiles .npy têm todos o mesmo tamanho: cabem dois
+        server.memory.max_bytes = 2 * len(first)
+        for key in keys[1:]:
+            await server.get_tile(key)
+        cached = [key in server.memory for key in keys]
+        await asyncio.gather(*server.writes)
+        _, source = await server.get_tile(keys[0])
+        return cached, source
+
+    cached, source = run(server, requests())
+    assert cached == [False, True, True]
+    # O mais antigo volta do disco, e tira o menos usado da memória
+    assert source == 'disk'
+    assert [key in server.memory for key in keys] == [True, False, True]
+
+
+def test_invalid_requests_are_rejected(tmp_path):
+    server = TileServer(workers=1, cache_dir=str(tmp_path), max_zoom=MAX_ZOOM,
+                        tile_size=TILE_SIZE)
+
+    async def responses():
+        return [(await server.respond('GET', target))[0] for target in
+                ('/tiles/0/0/0.png?seed=256', '/tiles/9/0/0.png', '/tiles/0/0/0.png?foo=1',
+                 '/tiles/0/0/0.gif', '/elsewhere')]
+
+    statuses = run(server, responses())
+    assert statuses == [HTTPStatus.BAD_REQUEST] * 3 + [HTTPStatus.NOT_FOUND] * 2
+    assert server.counters['generated'] == 0
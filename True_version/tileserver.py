@@ -0,0 +1,309 @@
+"""Servidor HTTP local de tiles do terreno, no estilo dos mapas em tiles (slippy map).
+
+Exemplo:
+    python tileserver.py --port 8080 --workers 4
+    curl -o tile.png 'http://127.0.0.1:8080/tiles/8/3/5.png?seed=42&octaves=6'
+
+Rotas:
+    GET /tiles/{z}/{x}/{y}.png   tile colorido e iluminado, como no ``Terrain``
+    GET /tiles/{z}/{x}/{y}.npy   alturas float32 do mesmo tile
+    GET /stats                   contadores, caches e percentis de latência (JSON)
+
+Parâmetros (query string): seed, scale, octaves, persistence, lacunarity,
+sea_level, light_angle e biomes (0 ou 1). No zoom ``--max-zoom`` um pixel do
+tile é um pixel do mundo; cada zoom a menos dobra a área. Como nos mapas, o
+y dos tiles cresce para baixo, e a linha 0 das imagens é a de cima.
+
+Os tiles são gerados com ``generate_chunk`` num pool de processos. Pedidos
+simultâneos do mesmo tile esperam uma única geração, e os prontos ficam num
+cache LRU em memória e num em disco (``DiskCache``), que sobrevive entre
+execuções.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from biomes import BiomeTable
+from chunks import generate_chunk
+from colorize import Palette, light_map, light_vector, shade, terrain_bands
+from diskcache import DiskCache, default_cache_dir
+from lrucache import LRUCache
+from metrics import Metrics
+from parallel import process_context
+from pngstream import encode_png
+
+# Nome, tipo e valor padrão de cada parâmetro da query string
+PARAMETERS = (
+    ('seed', int, 42),
+    ('scale', float, 0.005),
+    ('octaves', int, 8),
+    ('persistence', float, 0.6),
+    ('lacunarity', float, 2.0),
+    ('sea_level', float, -0.15),
+    ('light_angle', float, 45.0),
+    ('biomes', int, 0),
+)
+
+CONTENT_TYPES = {'png': 'image/png', 'npy': 'application/octet-stream'}
+
+
+def parse_parameters(query):
+    """Parâmetros da query string, com os padrões; ValueError se algum for inválido"""
+    values = dict(parse_qsl(query, keep_blank_values=True))
+    types = {name: kind for name, kind, _ in PARAMETERS}
+    unknown = set(values) - set(types)
+    if unknown:
+        raise ValueError(f"Expected parameters among {sorted(types)}, got {sorted(unknown)}")
+    params = []
+    for name, kind, default in PARAMETERS:
+        try:
+            params.append(kind(values[name]) if name in values else default)
+        except ValueError:
+            raise ValueError(f"Expected {kind.__name__} for {name}, got {values[name]!r}") from None
+    seed, scale, octaves, persistence, lacunarity, _, _, biomes = params
+    # O seed é a base do pnoise2, que só tem 256 permutações
+    if not 0 <= seed < 256:
+        raise ValueError(f"Expected seed in [0, 256), got {seed}")
+    if not 1 <= octaves <= 16:
+        raise ValueError(f"Expected octaves in [1, 16], got {octaves}")
+    if not (scale > 0 and persistence > 0 and lacunarity > 0):
+        raise ValueError("Expected positive scale, persistence and lacunarity")
+    if biomes not in (0, 1):
+        raise ValueError(f"Expected biomes 0 or 1, got {biomes}")
+    return tuple(params)
+
+
+@lru_cache(maxsize=1)
+def default_biomes():
+    return BiomeTable.load()
+
+
+def render_tile(tile_format, z, x, y, params, max_zoom, tile_size):
+    """Worker: bytes do tile (PNG ou .npy), com a mesma geração e cor do ``Terrain``"""
+    seed, scale, octaves, persistence, lacunarity, sea_level, light_angle, biomes = params
+    table = default_biomes() if biomes else None
+    # y dos tiles cresce para baixo, o do mundo para cima
+    chunk = generate_chunk(x, -1 - y, max_zoom - z, tile_size, scale, octaves, persistence,
+                           lacunarity, base=seed,
+                           climate=table.climate if table is not None else None)
+    height_map = chunk.height_map
+    if tile_format == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(height_map[::-1]))
+        return buffer.getvalue()
+    if table is not None:
+        table.classify(height_map, *chunk.climate, sea_level, out=chunk.biome_ids)
+        table.colorize(height_map, chunk.biome_ids, sea_level, out=chunk.base_colors)
+    else:
+        Palette(terrain_bands(sea_level)).colorize(height_map, out=chunk.base_colors)
+    # Mesma luz padrão do Terrain
+    total_light = light_map(chunk.normals[0], chunk.normals[1], light_vector(light_angle), 0.8,
+                            0.6, flat=height_map < np.float64(sea_level))
+    shade(chunk.base_colors, total_light, out=chunk.pixels)
+    return encode_png(chunk.pixels[::-1], level=1)
+
+
+class TileServer:
+    """Tiles por HTTP: cache em memória, cache em disco e geração num pool de processos"""
+
+    def __init__(self, workers=None, memory_bytes=64 * 1024 * 1024, cache_dir=None,
+                 disk_bytes=1024 * 1024 * 1024, max_zoom=8, tile_size=256):
+        # Os workers nascem no primeiro tile, com as threads do executor padrão
+        # já rodando: sem fork, como no ParallelGenerator
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=process_context())
+        # Bytes dos tiles prontos
+        self.memory = LRUCache(memory_bytes, size=len)
+        self.disk = DiskCache(cache_dir or os.path.join(default_cache_dir(), 'tiles'), disk_bytes)
+        self.max_zoom = max_zoom
+        self.tile_size = tile_size
+        # Gerações em andamento, que novos pedidos do mesmo tile aguardam
+        self.pending = {}
+        # Gravações em disco em segundo plano
+        self.writes = set()
+        self.counters = Counter()
+        self.metrics = Metrics(capacity=10000)
+
+    async def get_tile(self, key):
+        """Bytes do tile ``key`` = (formato, z, x, y, parâmetros) e de onde vieram"""
+        data = self.memory.get(key)
+        if data is not None:
+            return data, 'memory'
+        task = self.pending.get(key)
+        source = 'coalesced'
+        if task is None:
+            task = asyncio.ensure_future(self.load_tile(key))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+            source = None
+        # Quem desiste do pedido não cancela a geração dos outros
+        data, loaded_from = await asyncio.shield(task)
+        return data, source or loaded_from
+
+    async def load_tile(self, key):
+        loop = asyncio.get_running_loop()
+        disk_key = self.disk.key('tile', self.tile_size, self.max_zoom, *key)
+        # Leitura e escrita de arquivos fora do loop de eventos
+        data = await loop.run_in_executor(None, self.disk.get, disk_key)
+        if data is not None:
+            data, source = data.tobytes(), 'disk'
+        else:
+            tile_format, z, x, y, params = key
+            with self.metrics.stage('generate', pixels=self.tile_size ** 2):
+                data = await loop.run_in_executor(self.executor, render_tile, tile_format, z, x, y,
+                                                  params, self.max_zoom, self.tile_size)
+            source = 'generated'
+            write = loop.run_in_executor(None, self.disk.put, disk_key,
+                                         np.frombuffer(data, dtype=np.uint8))
+            self.writes.add(write)
+            write.add_done_callback(self.writes.discard)
+        self.memory.put(key, data)
+        return data, source
+
+    def stats(self):
+        return {
+            'counters': dict(self.counters),
+            'latency': self.metrics.summary(),
+            'memory_cache': {'tiles': len(self.memory), 'bytes': self.memory.nbytes},
+            'disk_cache': {'bytes': self.disk.nbytes},
+            'pending': len(self.pending),
+        }
+
+    def parse_tile(self, path, query):
+        """Chave do tile de ``/tiles/{z}/{x}/{y}.{formato}``, ou None se não for um tile"""
+        parts = path.strip('/').split('/')
+        if len(parts) != 4 or parts[0] != 'tiles':
+            return None
+        name, _, tile_format = parts[3].partition('.')
+        if tile_format not in CONTENT_TYPES:
+            return None
+        try:
+            z, x, y = int(parts[1]), int(parts[2]), int(name)
+        except ValueError:
+            return None
+        if not 0 <= z <= self.max_zoom:
+            raise ValueError(f"Expected zoom in [0, {self.max_zoom}], got {z}")
+        return tile_format, z, x, y, parse_parameters(query)
+
+    async def respond(self, method, target):
+        """(status, tipo, corpo) da resposta a ``method target``"""
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b'Only GET is supported\n'
+        url = urlsplit(target)
+        if url.path == '/stats':
+            return HTTPStatus.OK, 'application/json', json.dumps(self.stats(), indent=2).encode()
+        try:
+            key = self.parse_tile(url.path, url.query)
+        except ValueError as error:
+            return HTTPStatus.BAD_REQUEST, 'text/plain', f"{error}\n".encode()
+        if key is None:
+            return HTTPStatus.NOT_FOUND, 'text/plain', b'Expected /tiles/{z}/{x}/{y}.png or .npy\n'
+        with self.metrics.stage('request', pixels=self.tile_size ** 2) as record:
+            data, source = await self.get_tile(key)
+            record['nbytes'] = len(data)
+        self.counters[source] += 1
+        return HTTPStatus.OK, CONTENT_TYPES[key[0]], data
+
+    async def handle(self, reader, writer):
+        """Uma conexão; com HTTP/1.1 ela continua aberta para os próximos pedidos"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    status, content_type, body = HTTPStatus.BAD_REQUEST, 'text/plain', b''
+                    version = 'HTTP/1.0'
+                    target = ''
+                else:
+                    self.counters['requests'] += 1
+                    try:
+                        status, content_type, body = await self.respond(method, target)
+                    except Exception as error:
+                        status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain'
+                        body = f"{type(error).__name__}: {error}\n".encode()
+                if status != HTTPStatus.OK:
+                    self.counters['errors'] += 1
+                headers = {name.lower(): value.strip() for name, _, value in
+                           (line.partition(':') for line in lines[1:] if line)}
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: {content_type}\r\n"
+                             f"Content-Length: {len(body)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                             f"\r\n".encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self.writes:
+            await asyncio.gather(*self.writes, return_exceptions=True)
+        self.executor.shutdown()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve terrain tiles over HTTP on localhost.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--memory-mb', type=int, default=64, help="in-memory tile cache size")
+    parser.add_argument('--cache-dir', help="on-disk tile cache (default: the user cache directory)")
+    parser.add_argument('--disk-mb', type=int, default=1024, help="on-disk tile cache size")
+    parser.add_argument('--max-zoom', type=int, default=8, help="zoom with one world pixel per tile pixel")
+    parser.add_argument('--tile-size', type=int, default=256)
+    return parser
+
+
+async def serve(args):
+    server = TileServer(workers=args.workers, memory_bytes=args.memory_mb * 1024 * 1024,
+                        cache_dir=args.cache_dir, disk_bytes=args.disk_mb * 1024 * 1024,
+                        max_zoom=args.max_zoom, tile_size=args.tile_size)
+    listener = await asyncio.start_server(server.handle, args.host, args.port)
+    print(f"Serving tiles on http://{args.host}:{args.port}/tiles/{{z}}/{{x}}/{{y}}.png",
+          file=sys.stderr, flush=True)
+    serving = asyncio.ensure_future(listener.serve_forever())
+    try:
+        # SIGTERM para como o Ctrl+C, fechando o pool e esperando as gravações
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+    except NotImplementedError:
+        pass
+    try:
+        async with listener:
+            await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())